@@ -0,0 +1,174 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from commonwealth.mavlink_comm.MavlinkComm import MavlinkMessenger
+from commonwealth.mavlink_comm.MessageCache import MavlinkMessageCache, MessageKey
+
+DEFAULT_ACK_TIMEOUT = 1.0
+DEFAULT_MAX_RETRIES = 3
+# Delay before the first retry of a temporarily rejected command, doubled on each following retry
+DEFAULT_RETRY_BACKOFF = 0.2
+
+MAV_RESULT_ACCEPTED = "MAV_RESULT_ACCEPTED"
+MAV_RESULT_TEMPORARILY_REJECTED = "MAV_RESULT_TEMPORARILY_REJECTED"
+MAV_RESULT_IN_PROGRESS = "MAV_RESULT_IN_PROGRESS"
+
+# (target system ID, command name)
+CommandKey = Tuple[int, str]
+
+
+@dataclass
+class CommandResult:
+    command: str
+    # MAV_RESULT name from COMMAND_ACK, None if the command was not acknowledged
+    result: Optional[str]
+    attempts: int
+    # Message requested by the command (e.g. with MAV_CMD_REQUEST_MESSAGE), if any was received
+    reply: Optional[Dict[str, Any]] = None
+
+    @property
+    def acknowledged(self) -> bool:
+        return self.result is not None
+
+    @property
+    def accepted(self) -> bool:
+        return self.result == MAV_RESULT_ACCEPTED
+
+
+class MavlinkCommandTracker:
+    """Send COMMAND_LONG messages and match them with the COMMAND_ACK and reply messages sent back by the vehicle.
+
+    Acknowledgements and replies are received through the messenger stream (subscription or UDP backend), so several
+    different commands can be waiting for their answers at the same time. As COMMAND_ACK only identifies the command,
+    commands of the same type to the same system are sent one at a time. Temporarily rejected commands are retried
+    with exponential back-off. If messages are not streamed yet, commands are sent without confirmation.
+    """
+
+    def __init__(
+        self,
+        messenger: MavlinkMessenger,
+        ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+    ) -> None:
+        self.messenger = messenger
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._pending_acks: Dict[CommandKey, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._pending_replies: Dict[MessageKey, List["asyncio.Future[Dict[str, Any]]"]] = {}
+        self._locks: Dict[CommandKey, asyncio.Lock] = {}
+        messenger.subscribe(["COMMAND_ACK"])
+        messenger.add_message_listener(self._on_message)
+
+    def _on_message(self, key: MessageKey, entry: Dict[str, Any]) -> None:
+        vehicle, _, message_name = key
+        message = entry["message"]
+        if message_name == "COMMAND_ACK":
+            # Acknowledgements addressed to other systems (e.g. a GCS) are of no interest
+            target_system = message.get("target_system", 0)
+            target_component = message.get("target_component", 0)
+            if target_system not in (0, self.messenger.system_id):
+                return
+            if target_component not in (0, self.messenger.component_id):
+                return
+            # Commands in progress will be acknowledged again once they finish
+            if message["result"]["type"] == MAV_RESULT_IN_PROGRESS:
+                return
+            ack = self._pending_acks.get((vehicle, message["command"]["type"]))
+            if ack is not None and not ack.done():
+                ack.set_result(message)
+        for reply in self._pending_replies.pop(key, []):
+            if not reply.done():
+                reply.set_result(entry)
+
+    def _lock(self, key: CommandKey) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def _expect_reply(self, key: MessageKey) -> "asyncio.Future[Dict[str, Any]]":
+        reply: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self._pending_replies.setdefault(key, []).append(reply)
+        return reply
+
+    def _forget_reply(self, key: MessageKey, reply: "asyncio.Future[Dict[str, Any]]") -> None:
+        replies = self._pending_replies.get(key, [])
+        if reply in replies:
+            replies.remove(reply)
+        if not replies:
+            self._pending_replies.pop(key, None)
+
+    async def _send_and_wait_ack(self, key: CommandKey, message: Dict[str, Any], timeout: float) -> Optional[str]:
+        ack: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self._pending_acks[key] = ack
+        try:
+            await self.messenger.send_mavlink_message(message)
+            return str((await asyncio.wait_for(ack, timeout))["result"]["type"])
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._pending_acks.pop(key, None)
+
+    async def send_command(
+        self,
+        message: Dict[str, Any],
+        reply_message: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> CommandResult:
+        """Send a COMMAND_LONG message and wait for its COMMAND_ACK.
+
+        Args:
+            message: COMMAND_LONG message, in Mavlink2Rest format.
+            reply_message: Name of a message the command makes the vehicle send, waited for after the command is
+                accepted, e.g. AUTOPILOT_VERSION for a MAV_CMD_REQUEST_MESSAGE.
+            timeout: Maximum time to wait for each acknowledgement and for the reply.
+        """
+        command = str(message["command"]["type"])
+        target_system = int(message["target_system"])
+        # Broadcast commands are expected to be answered by the autopilot
+        reply_component = int(message.get("target_component", 0)) or 1
+        wait_timeout = timeout or self.ack_timeout
+        if reply_message:
+            self.messenger.subscribe([reply_message])
+
+        if not self.messenger.is_streamed("COMMAND_ACK"):
+            logger.debug(f"COMMAND_ACK is not streamed yet, sending {command} without confirmation.")
+            await self.messenger.send_mavlink_message(message)
+            return CommandResult(command=command, result=None, attempts=1)
+
+        key = (target_system, command)
+        async with self._lock(key):
+            reply_key = MavlinkMessageCache.key(target_system, reply_component, reply_message or "")
+            reply = self._expect_reply(reply_key) if reply_message else None
+            try:
+                attempts = 0
+                result: Optional[str] = None
+                base_confirmation = int(message.get("confirmation", 0))
+                while True:
+                    # The confirmation field tells the vehicle this is a retransmission of the same command
+                    attempt_message = {**message, "confirmation": (base_confirmation + attempts) % 256}
+                    result = await self._send_and_wait_ack(key, attempt_message, wait_timeout)
+                    attempts += 1
+                    if result != MAV_RESULT_TEMPORARILY_REJECTED or attempts > self.max_retries:
+                        break
+                    backoff = self.retry_backoff * 2 ** (attempts - 1)
+                    logger.debug(f"{command} temporarily rejected, retrying in {backoff} seconds.")
+                    await asyncio.sleep(backoff)
+
+                reply_entry = None
+                if reply is not None and result in (None, MAV_RESULT_ACCEPTED):
+                    try:
+                        reply_entry = await asyncio.wait_for(reply, wait_timeout)
+                    except asyncio.TimeoutError:
+                        logger.debug(f"No {reply_message} received after {command}.")
+            finally:
+                if reply is not None:
+                    self._forget_reply(reply_key, reply)
+
+        if result is None:
+            logger.warning(f"{command} was not acknowledged.")
+        return CommandResult(command=command, result=result, attempts=attempts, reply=reply_entry)
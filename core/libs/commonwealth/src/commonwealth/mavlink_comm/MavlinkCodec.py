@@ -0,0 +1,370 @@
+"""
+Minimal in-process MAVLink v2 codec.
+
+Only the messages used by BlueOS services are supported. Messages are represented with the same JSON format used by
+Mavlink2Rest, where enums are {"type": NAME}, bitmasks are {"bits": value} and the MAVLink "type" field is "mavtype".
+"""
+
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from commonwealth.mavlink_comm.exceptions import MavlinkCodecError
+from commonwealth.mavlink_comm.typedefs import MavlinkVehicleType
+
+MAVLINK_V2_STX = 0xFD
+MAVLINK_V2_HEADER_LENGTH = 10
+MAVLINK_V2_CHECKSUM_LENGTH = 2
+MAVLINK_V2_SIGNATURE_LENGTH = 13
+MAVLINK_IFLAG_SIGNED = 0x01
+
+
+def _enum(*names: str, start: int = 0) -> Dict[str, int]:
+    return {name: value for value, name in enumerate(names, start)}
+
+
+# MavlinkVehicleType follows MAV_TYPE order
+MAV_TYPE = {vehicle_type.name: value for value, vehicle_type in enumerate(MavlinkVehicleType)}
+
+MAV_AUTOPILOT = _enum(
+    "MAV_AUTOPILOT_GENERIC",
+    "MAV_AUTOPILOT_RESERVED",
+    "MAV_AUTOPILOT_SLUGS",
+    "MAV_AUTOPILOT_ARDUPILOTMEGA",
+    "MAV_AUTOPILOT_OPENPILOT",
+    "MAV_AUTOPILOT_GENERIC_WAYPOINTS_ONLY",
+    "MAV_AUTOPILOT_GENERIC_WAYPOINTS_AND_SIMPLE_NAVIGATION_ONLY",
+    "MAV_AUTOPILOT_GENERIC_MISSION_FULL",
+    "MAV_AUTOPILOT_INVALID",
+    "MAV_AUTOPILOT_PPZ",
+    "MAV_AUTOPILOT_UDB",
+    "MAV_AUTOPILOT_FP",
+    "MAV_AUTOPILOT_PX4",
+    "MAV_AUTOPILOT_SMACCMPILOT",
+    "MAV_AUTOPILOT_AUTOQUAD",
+    "MAV_AUTOPILOT_ARMAZILA",
+    "MAV_AUTOPILOT_AEROB",
+    "MAV_AUTOPILOT_ASLUAV",
+    "MAV_AUTOPILOT_SMARTAP",
+    "MAV_AUTOPILOT_AIRRAILS",
+    "MAV_AUTOPILOT_REFLEX",
+)
+
+MAV_STATE = _enum(
+    "MAV_STATE_UNINIT",
+    "MAV_STATE_BOOT",
+    "MAV_STATE_CALIBRATING",
+    "MAV_STATE_STANDBY",
+    "MAV_STATE_ACTIVE",
+    "MAV_STATE_CRITICAL",
+    "MAV_STATE_EMERGENCY",
+    "MAV_STATE_POWEROFF",
+    "MAV_STATE_FLIGHT_TERMINATION",
+)
+
+MAV_RESULT = _enum(
+    "MAV_RESULT_ACCEPTED",
+    "MAV_RESULT_TEMPORARILY_REJECTED",
+    "MAV_RESULT_DENIED",
+    "MAV_RESULT_UNSUPPORTED",
+    "MAV_RESULT_FAILED",
+    "MAV_RESULT_IN_PROGRESS",
+    "MAV_RESULT_CANCELLED",
+)
+
+MAV_DISTANCE_SENSOR = _enum(
+    "MAV_DISTANCE_SENSOR_LASER",
+    "MAV_DISTANCE_SENSOR_ULTRASOUND",
+    "MAV_DISTANCE_SENSOR_INFRARED",
+    "MAV_DISTANCE_SENSOR_RADAR",
+    "MAV_DISTANCE_SENSOR_UNKNOWN",
+)
+
+MAV_SENSOR_ORIENTATION = {
+    **_enum(
+        "MAV_SENSOR_ROTATION_NONE",
+        "MAV_SENSOR_ROTATION_YAW_45",
+        "MAV_SENSOR_ROTATION_YAW_90",
+        "MAV_SENSOR_ROTATION_YAW_135",
+        "MAV_SENSOR_ROTATION_YAW_180",
+        "MAV_SENSOR_ROTATION_YAW_225",
+        "MAV_SENSOR_ROTATION_YAW_270",
+        "MAV_SENSOR_ROTATION_YAW_315",
+    ),
+    **_enum("MAV_SENSOR_ROTATION_PITCH_90", "MAV_SENSOR_ROTATION_PITCH_270", start=24),
+}
+
+# Only the commands sent by BlueOS services
+MAV_CMD = {
+    "MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN": 246,
+    "MAV_CMD_COMPONENT_ARM_DISARM": 400,
+    "MAV_CMD_REQUEST_MESSAGE": 512,
+    "MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES": 520,
+}
+
+
+@dataclass
+class MavlinkField:
+    name: str
+    # struct format of the field, including array length, e.g: "I" or "4f"
+    fmt: str
+    enum: Optional[Dict[str, int]] = None
+    bitmask: bool = False
+
+    @property
+    def json_name(self) -> str:
+        # Mavlink2Rest renames "type" fields to avoid conflicts with the message type
+        return "mavtype" if self.name == "type" else self.name
+
+    @property
+    def size(self) -> int:
+        return struct.calcsize(f"<{self.fmt}")
+
+    @property
+    def is_array(self) -> bool:
+        return self.fmt[0].isdigit()
+
+    def encode(self, value: Any) -> List[Any]:
+        if self.is_array:
+            length = int(self.fmt[:-1])
+            values = list(value or [])[:length]
+            return values + [0] * (length - len(values))
+        if isinstance(value, dict):
+            value = value.get("bits", value.get("type", 0))
+        if isinstance(value, str):
+            if self.enum is None or value not in self.enum:
+                raise MavlinkCodecError(f"Unknown value {value} for field {self.name}.")
+            value = self.enum[value]
+        return [float(value or 0) if self.fmt in "fd" else int(value or 0)]
+
+    def decode(self, values: Tuple[Any, ...]) -> Any:
+        if self.is_array:
+            return list(values)
+        value = values[0]
+        if self.bitmask:
+            return {"bits": value}
+        if self.enum is not None:
+            names = {enum_value: name for name, enum_value in self.enum.items()}
+            return {"type": names.get(value, value)}
+        return value
+
+
+@dataclass
+class MavlinkMessageDefinition:
+    name: str
+    id: int
+    crc_extra: int
+    # Fields in wire order, extension fields last
+    fields: List[MavlinkField] = field(default_factory=list)
+
+    @property
+    def length(self) -> int:
+        return sum(message_field.size for message_field in self.fields)
+
+
+MESSAGES: Dict[str, MavlinkMessageDefinition] = {
+    definition.name: definition
+    for definition in [
+        MavlinkMessageDefinition(
+            "HEARTBEAT",
+            0,
+            50,
+            [
+                MavlinkField("custom_mode", "I"),
+                MavlinkField("type", "B", enum=MAV_TYPE),
+                MavlinkField("autopilot", "B", enum=MAV_AUTOPILOT),
+                MavlinkField("base_mode", "B", bitmask=True),
+                MavlinkField("system_status", "B", enum=MAV_STATE),
+                MavlinkField("mavlink_version", "B"),
+            ],
+        ),
+        MavlinkMessageDefinition(
+            "COMMAND_LONG",
+            76,
+            152,
+            [
+                *[MavlinkField(f"param{index}", "f") for index in range(1, 8)],
+                MavlinkField("command", "H", enum=MAV_CMD),
+                MavlinkField("target_system", "B"),
+                MavlinkField("target_component", "B"),
+                MavlinkField("confirmation", "B"),
+            ],
+        ),
+        MavlinkMessageDefinition(
+            "COMMAND_ACK",
+            77,
+            143,
+            [
+                MavlinkField("command", "H", enum=MAV_CMD),
+                MavlinkField("result", "B", enum=MAV_RESULT),
+                MavlinkField("progress", "B"),
+                MavlinkField("result_param2", "i"),
+                MavlinkField("target_system", "B"),
+                MavlinkField("target_component", "B"),
+            ],
+        ),
+        MavlinkMessageDefinition(
+            "DISTANCE_SENSOR",
+            132,
+            85,
+            [
+                MavlinkField("time_boot_ms", "I"),
+                MavlinkField("min_distance", "H"),
+                MavlinkField("max_distance", "H"),
+                MavlinkField("current_distance", "H"),
+                MavlinkField("type", "B", enum=MAV_DISTANCE_SENSOR),
+                MavlinkField("id", "B"),
+                MavlinkField("orientation", "B", enum=MAV_SENSOR_ORIENTATION),
+                MavlinkField("covariance", "B"),
+                MavlinkField("horizontal_fov", "f"),
+                MavlinkField("vertical_fov", "f"),
+                MavlinkField("quaternion", "4f"),
+                MavlinkField("signal_quality", "B"),
+            ],
+        ),
+        MavlinkMessageDefinition(
+            "AUTOPILOT_VERSION",
+            148,
+            178,
+            [
+                MavlinkField("capabilities", "Q", bitmask=True),
+                MavlinkField("uid", "Q"),
+                MavlinkField("flight_sw_version", "I"),
+                MavlinkField("middleware_sw_version", "I"),
+                MavlinkField("os_sw_version", "I"),
+                MavlinkField("board_version", "I"),
+                MavlinkField("vendor_id", "H"),
+                MavlinkField("product_id", "H"),
+                MavlinkField("flight_custom_version", "8B"),
+                MavlinkField("middleware_custom_version", "8B"),
+                MavlinkField("os_custom_version", "8B"),
+                MavlinkField("uid2", "18B"),
+            ],
+        ),
+        MavlinkMessageDefinition(
+            "GPS_INPUT",
+            232,
+            151,
+            [
+                MavlinkField("time_usec", "Q"),
+                MavlinkField("time_week_ms", "I"),
+                MavlinkField("lat", "i"),
+                MavlinkField("lon", "i"),
+                MavlinkField("alt", "f"),
+                MavlinkField("hdop", "f"),
+                MavlinkField("vdop", "f"),
+                MavlinkField("vn", "f"),
+                MavlinkField("ve", "f"),
+                MavlinkField("vd", "f"),
+                MavlinkField("speed_accuracy", "f"),
+                MavlinkField("horiz_accuracy", "f"),
+                MavlinkField("vert_accuracy", "f"),
+                MavlinkField("ignore_flags", "H", bitmask=True),
+                MavlinkField("time_week", "H"),
+                MavlinkField("gps_id", "B"),
+                MavlinkField("fix_type", "B"),
+                MavlinkField("satellites_visible", "B"),
+                MavlinkField("yaw", "H"),
+            ],
+        ),
+    ]
+}
+MESSAGES_BY_ID = {definition.id: definition for definition in MESSAGES.values()}
+
+
+def is_supported(message_name: str) -> bool:
+    return message_name.upper() in MESSAGES
+
+
+def x25_crc(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/MCRF4XX used by MAVLink."""
+    for byte in data:
+        tmp = (byte ^ crc) & 0xFF
+        tmp = (tmp ^ (tmp << 4)) & 0xFF
+        crc = ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+    return crc
+
+
+def encode(message: Dict[str, Any], system_id: int, component_id: int, sequence: int) -> bytes:
+    """Encode a Mavlink2Rest-like message into a MAVLink v2 frame."""
+    definition = MESSAGES.get(message["type"].upper())
+    if definition is None:
+        raise MavlinkCodecError(f"Message {message['type']} is not supported.")
+
+    payload = b"".join(
+        struct.pack(f"<{message_field.fmt}", *message_field.encode(message.get(message_field.json_name)))
+        for message_field in definition.fields
+    )
+    # MAVLink v2 truncates trailing zeros of the payload, keeping at least one byte
+    payload = payload.rstrip(b"\x00") or b"\x00"
+
+    header = struct.pack(
+        "<BBBBBBBHB",
+        MAVLINK_V2_STX,
+        len(payload),
+        0,  # incompatibility flags
+        0,  # compatibility flags
+        sequence & 0xFF,
+        system_id,
+        component_id,
+        definition.id & 0xFFFF,
+        definition.id >> 16,
+    )
+    checksum = x25_crc(bytes([definition.crc_extra]), x25_crc(header[1:] + payload))
+    return header + payload + struct.pack("<H", checksum)
+
+
+def decode(payload: bytes, message_id: int) -> Dict[str, Any]:
+    definition = MESSAGES_BY_ID.get(message_id)
+    if definition is None:
+        raise MavlinkCodecError(f"Message ID {message_id} is not supported.")
+
+    # Restore the trailing zeros removed by the sender
+    payload = payload.ljust(definition.length, b"\x00")
+    message: Dict[str, Any] = {"type": definition.name}
+    offset = 0
+    for message_field in definition.fields:
+        values = struct.unpack_from(f"<{message_field.fmt}", payload, offset)
+        message[message_field.json_name] = message_field.decode(values)
+        offset += message_field.size
+    return message
+
+
+def parse_frames(data: bytes) -> Iterator[Dict[str, Any]]:
+    """Parse all supported MAVLink v2 frames in a datagram into Mavlink2Rest-like packages (header + message).
+    Unsupported messages, MAVLink v1 frames and corrupted frames are skipped."""
+    offset = 0
+    while offset + MAVLINK_V2_HEADER_LENGTH + MAVLINK_V2_CHECKSUM_LENGTH <= len(data):
+        if data[offset] != MAVLINK_V2_STX:
+            offset += 1
+            continue
+
+        payload_length, incompat_flags, _, sequence, system_id, component_id, id_low, id_high = struct.unpack_from(
+            "<BBBBBBHB", data, offset + 1
+        )
+        message_id = id_low | (id_high << 16)
+        frame_end = offset + MAVLINK_V2_HEADER_LENGTH + payload_length + MAVLINK_V2_CHECKSUM_LENGTH
+        if incompat_flags & MAVLINK_IFLAG_SIGNED:
+            frame_end += MAVLINK_V2_SIGNATURE_LENGTH
+        if frame_end > len(data):
+            return
+
+        definition = MESSAGES_BY_ID.get(message_id)
+        if definition is None:
+            offset = frame_end
+            continue
+
+        payload_start = offset + MAVLINK_V2_HEADER_LENGTH
+        payload = data[payload_start : payload_start + payload_length]
+        (checksum,) = struct.unpack_from("<H", data, payload_start + payload_length)
+        expected_checksum = x25_crc(bytes([definition.crc_extra]), x25_crc(data[offset + 1 : payload_start] + payload))
+        if checksum != expected_checksum:
+            # Not a valid frame, look for the next start byte
+            offset += 1
+            continue
+
+        yield {
+            "header": {"system_id": system_id, "component_id": component_id, "sequence": sequence},
+            "message": decode(payload, message_id),
+        }
+        offset = frame_end
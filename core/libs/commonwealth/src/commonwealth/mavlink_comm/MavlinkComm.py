@@ -1,28 +1,92 @@
 import asyncio
 import json
 import os
-import re
 import time
-from datetime import datetime
-from typing import Any, Dict, Optional
+from types import TracebackType
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Type
+from urllib.parse import urlencode
 
 import aiohttp
 from loguru import logger
 
+from commonwealth.mavlink_comm import MavlinkCodec
 from commonwealth.mavlink_comm.exceptions import (
     FetchUpdatedMessageFail,
+    MavlinkCodecError,
     MavlinkMessageReceiveFail,
     MavlinkMessageSendFail,
 )
-from commonwealth.mavlink_comm.typedefs import MavlinkVehicleType
+from commonwealth.mavlink_comm.MessageCache import MavlinkMessageCache, MessageKey
+from commonwealth.mavlink_comm.OutboundQueue import MavlinkOutboundQueue
+from commonwealth.mavlink_comm.typedefs import MavlinkBackend
+from commonwealth.mavlink_comm.UdpTransport import MavlinkUdpTransport
+from commonwealth.mavlink_comm.VehicleDirectory import (
+    MavlinkVehicleDirectory,
+    parse_mavlink2rest_time,
+)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_REQUEST_TIMEOUT = 1.0
+KEEPALIVE_TIMEOUT = 30.0
+SUBSCRIPTION_RECONNECT_DELAY = 1.0
+DEFAULT_UDP_ADDRESS = "127.0.0.1:14002"
+# Time without heartbeats after which the vehicle directory is refreshed from the complete Mavlink2Rest tree
+DIRECTORY_MAX_AGE = 5.0
+
+ONBOARD_COMPUTER_HEARTBEAT = {
+    "type": "HEARTBEAT",
+    "custom_mode": 0,
+    "mavtype": {"type": "MAV_TYPE_ONBOARD_CONTROLLER"},
+    "autopilot": {"type": "MAV_AUTOPILOT_INVALID"},
+    "base_mode": {"bits": 0},
+    "system_status": {"type": "MAV_STATE_STANDBY"},
+    "mavlink_version": 3,
+}
 
 
 class MavlinkMessenger:
-    def __init__(self) -> None:
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, request_timeout: float = DEFAULT_REQUEST_TIMEOUT) -> None:
         self.system_id = int(os.environ.get("MAV_SYSTEM_ID", 1))
         self.component_id = int(os.environ.get("MAV_COMPONENT_ID_ONBOARD_COMPUTER4", 194))
         self.sequence = 0
         self.m2r_address = "localhost:6040"
+        # Messages not supported by the UDP backend codec are still exchanged through Mavlink2Rest
+        self.backend = MavlinkBackend(os.environ.get("MAVLINK_BACKEND", MavlinkBackend.REST.value))
+        self.udp_address = os.environ.get("MAVLINK_UDP_ADDRESS", DEFAULT_UDP_ADDRESS)
+        self._udp_transport: Optional[MavlinkUdpTransport] = None
+        self._udp_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        # The HTTP session is created lazily, as messengers are usually instantiated before the event loop exists
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Subscription mode, messages are pushed by Mavlink2Rest websocket and kept in a local cache
+        self._cache = MavlinkMessageCache()
+        self._subscribed_messages: Set[str] = set()
+        self._subscription_task: Optional["asyncio.Task[None]"] = None
+        self._subscription_connected = False
+        # Known systems and components, updated by every HEARTBEAT we get
+        self.directory = MavlinkVehicleDirectory()
+        self._cache.add_listener(self._on_cached_message)
+        # Messages queued by high-rate producers, sent in the background
+        self.outbound_queue = MavlinkOutboundQueue(lambda message: self.send_mavlink_message(message))
+
+    async def __aenter__(self) -> "MavlinkMessenger":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+    def _on_cached_message(self, key: MessageKey, entry: Dict[str, Any]) -> None:
+        vehicle, component, message_name = key
+        if message_name == "HEARTBEAT":
+            last_update = parse_mavlink2rest_time(entry["status"]["time"]["last_update"])
+            self.directory.update_heartbeat(vehicle, component, entry["message"], last_update)
 
     def set_system_id(self, system_id: int) -> None:
         logger.info(f"system_id set to: {system_id}")
@@ -39,68 +103,238 @@ class MavlinkMessenger:
             raise ValueError("Invalid address. Valid address should follow the format 'localhost:6040'.")
         self.m2r_address = address
 
+    def set_backend(self, backend: MavlinkBackend) -> None:
+        logger.info(f"Mavlink backend set to: {backend.value}")
+        self.backend = backend
+
+    def set_udp_address(self, address: str) -> None:
+        if len(address.split(":")) != 2:
+            raise ValueError("Invalid address. Valid address should follow the format '127.0.0.1:14002'.")
+        self.udp_address = address
+        self._close_udp_transport()
+
+    def set_pool_size(self, pool_size: int) -> None:
+        """Set the maximum number of simultaneous connections to mavlink2rest.
+        The new size is used the next time the connection pool is created, e.g. after calling `close`."""
+        if pool_size < 1:
+            raise ValueError("Pool size should be at least 1.")
+        self.pool_size = pool_size
+
+    def set_request_timeout(self, request_timeout: float) -> None:
+        if request_timeout <= 0:
+            raise ValueError("Request timeout should be a positive number.")
+        self.request_timeout = request_timeout
+
+    @staticmethod
+    def _loop_changed(loop: Optional[asyncio.AbstractEventLoop]) -> bool:
+        return loop is not None and loop is not asyncio.get_running_loop()
+
+    def _session_loop_changed(self) -> bool:
+        return self._loop_changed(self._session_loop)
+
+    def _discard_session(self) -> None:
+        """Close the session without waiting, as when it belongs to a previous event loop."""
+        session, loop = self._session, self._session_loop
+        self._session = None
+        self._session_loop = None
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_running():
+            # Sessions can only be closed from their own loop
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        elif session.connector is not None:
+            # Closing the connector releases the connections even if its loop is not running anymore
+            session.connector.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed or self._session_loop_changed():
+            self._discard_session()
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = asyncio.get_running_loop()
+        return self._session
+
+    async def close(self) -> None:
+        """Close the connection pool. A new one is created on demand if the messenger is used again."""
+        await self.outbound_queue.close()
+        await self._stop_subscription()
+        self._close_udp_transport()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    def _uses_udp(self, message_name: str) -> bool:
+        return self.backend == MavlinkBackend.UDP and MavlinkCodec.is_supported(message_name)
+
+    async def _get_udp_transport(self) -> MavlinkUdpTransport:
+        if self._udp_transport is None or self._udp_transport.closed or self._loop_changed(self._udp_loop):
+            self._close_udp_transport()
+            self._udp_transport = MavlinkUdpTransport(self.udp_address, self._cache)
+            await self._udp_transport.connect()
+            # The router only learns our address after receiving something from us
+            self._udp_transport.send(ONBOARD_COMPUTER_HEARTBEAT, self.system_id, self.component_id)
+            self._udp_loop = asyncio.get_running_loop()
+        return self._udp_transport
+
+    def _close_udp_transport(self) -> None:
+        if self._udp_transport is not None:
+            self._udp_transport.close()
+        self._udp_transport = None
+        self._udp_loop = None
+
     @property
     def m2r_rest_url(self) -> str:
         return f"http://{self.m2r_address}/mavlink"
 
-    async def get_all_mavlink(self) -> Any:
-        request_timeout = 1.0
-        async with aiohttp.ClientSession() as session:
+    @property
+    def m2r_ws_url(self) -> str:
+        return f"ws://{self.m2r_address}/ws/mavlink"
+
+    def subscribe(self, message_names: Iterable[str]) -> None:
+        """Receive the given messages through a Mavlink2Rest websocket stream instead of polling the REST API.
+        The stream is opened on the next request made by the messenger and kept open until `close` is called."""
+        new_messages = {name.upper() for name in message_names} - self._subscribed_messages
+        if not new_messages:
+            return
+        self._subscribed_messages.update(new_messages)
+        # Filter changed, the stream will be reopened on demand
+        if self._subscription_task is not None:
+            self._subscription_task.cancel()
+            self._subscription_task = None
+
+    def is_subscribed(self, message_name: str) -> bool:
+        return message_name.upper() in self._subscribed_messages
+
+    def _ensure_subscription(self) -> None:
+        if not self._subscribed_messages:
+            return
+        if self._subscription_task is None or self._subscription_task.done() or self._session_loop_changed():
+            self._subscription_connected = False
+            self._subscription_task = asyncio.create_task(self._subscription_loop())
+
+    def _is_cached(self, message_name: str) -> bool:
+        self._ensure_subscription()
+        return self._subscription_connected and self.is_subscribed(message_name)
+
+    def is_streamed(self, message_name: str) -> bool:
+        """Check if a message is pushed to us as it is received (UDP backend or subscription), instead of polled."""
+        return self._uses_udp(message_name) or self._is_cached(message_name)
+
+    def add_message_listener(self, listener: Callable[[MessageKey, Dict[str, Any]], None]) -> None:
+        """Register a callback called with every streamed message, see `MavlinkMessageCache.add_listener`."""
+        self._cache.add_listener(listener)
+
+    async def _subscription_loop(self) -> None:
+        message_filter = f"^({'|'.join(sorted(self._subscribed_messages))})$"
+        url = f"{self.m2r_ws_url}?{urlencode({'filter': message_filter})}"
+        while True:
             try:
-                async with session.get(self.m2r_rest_url, timeout=request_timeout) as response:
-                    if not response.status == 200:
-                        raise MavlinkMessageReceiveFail(f"Received status code of {response.status}.")
-                    message = await response.json()
-            except asyncio.exceptions.TimeoutError as error:
-                raise MavlinkMessageReceiveFail(f"Request timed out after {request_timeout} second.") from error
+                async with self._get_session().ws_connect(url, heartbeat=KEEPALIVE_TIMEOUT) as websocket:
+                    logger.info(f"Subscribed to Mavlink2Rest messages: {message_filter}")
+                    self._subscription_connected = True
+                    async for ws_message in websocket:
+                        if ws_message.type == aiohttp.WSMsgType.TEXT:
+                            self._cache.update(json.loads(ws_message.data))
+                        elif ws_message.type == aiohttp.WSMsgType.ERROR:
+                            break
+            except asyncio.CancelledError:
+                self._subscription_connected = False
+                raise
+            except Exception as error:
+                logger.warning(f"Mavlink2Rest subscription failed: {error}")
+            self._subscription_connected = False
+            await asyncio.sleep(SUBSCRIPTION_RECONNECT_DELAY)
+
+    async def _stop_subscription(self) -> None:
+        task = self._subscription_task
+        self._subscription_task = None
+        self._subscription_connected = False
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def get_all_mavlink(self, timeout: Optional[float] = None) -> Any:
+        if self.backend == MavlinkBackend.UDP:
+            await self._get_udp_transport()
+            return self._cache.to_mavlink2rest()
+
+        request_timeout = timeout or self.request_timeout
+        session = self._get_session()
+        try:
+            async with session.get(self.m2r_rest_url, timeout=aiohttp.ClientTimeout(total=request_timeout)) as response:
+                if not response.status == 200:
+                    raise MavlinkMessageReceiveFail(f"Received status code of {response.status}.")
+                message = await response.json()
+        except asyncio.exceptions.TimeoutError as error:
+            raise MavlinkMessageReceiveFail(f"Request timed out after {request_timeout} second.") from error
         return message
 
     async def get_mavlink_message(
-        self, message_name: Optional[str] = None, vehicle: Optional[int] = None, component: Optional[int] = 1
+        self,
+        message_name: Optional[str] = None,
+        vehicle: Optional[int] = None,
+        component: Optional[int] = 1,
+        timeout: Optional[float] = None,
     ) -> Any:
+        if message_name and self._uses_udp(message_name):
+            return await self._get_udp_message(message_name, vehicle or self.system_id, component or 1, timeout)
+
+        if message_name and self._is_cached(message_name):
+            cached_message = self._cache.get(vehicle or self.system_id, component or 1, message_name)
+            if cached_message is not None:
+                return cached_message
+
         request_url = f"{self.m2r_rest_url}/vehicles/{vehicle or self.system_id}/components/{component}/messages"
         if message_name:
             request_url += f"/{message_name.upper()}"
 
-        request_timeout = 1.0
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(request_url, timeout=request_timeout) as response:
-                    if not response.status == 200:
-                        raise MavlinkMessageReceiveFail(f"Received status code of {response.status}.")
-                    # if message is "None", try re-detecting systemid
-                    if await response.text() == "None":
-                        self.set_system_id(await self.get_most_recent_vehicle_id())
-                        raise MavlinkMessageReceiveFail("Received empty response")
-                    message = await response.json()
-            except asyncio.exceptions.TimeoutError as error:
-                raise MavlinkMessageReceiveFail(f"Request timed out after {request_timeout} second.") from error
+        request_timeout = timeout or self.request_timeout
+        session = self._get_session()
+        try:
+            async with session.get(request_url, timeout=aiohttp.ClientTimeout(total=request_timeout)) as response:
+                if not response.status == 200:
+                    raise MavlinkMessageReceiveFail(f"Received status code of {response.status}.")
+                # if message is "None", try re-detecting systemid
+                if await response.text() == "None":
+                    self.set_system_id(await self.get_most_recent_vehicle_id())
+                    raise MavlinkMessageReceiveFail("Received empty response")
+                message = await response.json()
+                if message_name and message_name.upper() == "HEARTBEAT":
+                    last_update = parse_mavlink2rest_time(message["status"]["time"]["last_update"])
+                    self.directory.update_heartbeat(
+                        vehicle or self.system_id, component or 1, message["message"], last_update
+                    )
+        except asyncio.exceptions.TimeoutError as error:
+            raise MavlinkMessageReceiveFail(f"Request timed out after {request_timeout} second.") from error
 
         return message
 
+    async def _get_udp_message(
+        self, message_name: str, vehicle: int, component: int, timeout: Optional[float] = None
+    ) -> Any:
+        await self._get_udp_transport()
+        message = self._cache.get(vehicle, component, message_name)
+        if message is not None:
+            return message
+        request_timeout = timeout or self.request_timeout
+        try:
+            return await self._cache.wait_for_update(vehicle, component, message_name, request_timeout)
+        except asyncio.TimeoutError as error:
+            raise MavlinkMessageReceiveFail(f"No {message_name} received after {request_timeout} second.") from error
+
     async def get_most_recent_vehicle_id(self) -> int:
-        json_data = await self.get_all_mavlink()
-        most_recent_timestamp = datetime.min
-        most_recent_vehicle_id = None
-        for vehicle_id, vehicle in json_data["vehicles"].items():
-
-            for component in vehicle["components"].values():
-                if "HEARTBEAT" in component["messages"]:
-                    message = component["messages"]["HEARTBEAT"]
-                    # we are looking for vehicles, not GCSs or other components
-                    if not MavlinkVehicleType[message["message"]["mavtype"]["type"]].is_actually_a_vehicle():
-                        continue
-                    last_update_str = message["status"]["time"]["last_update"]
-                    # drop sub-microsecond precision as it is not supported by datetime.fromisoformat
-                    last_update_str = re.sub(r"(\.\d{6})\d+Z?", r"\1", last_update_str)
-                    last_update = datetime.fromisoformat(last_update_str)
-
-                    if last_update > most_recent_timestamp:
-                        most_recent_timestamp = last_update
-                        most_recent_vehicle_id = vehicle_id
-        if most_recent_vehicle_id:
-            logger.debug(f"{most_recent_vehicle_id} (detected)")
-            return int(most_recent_vehicle_id)
+        # The directory is kept updated by received heartbeats, the complete tree is only needed when it is outdated
+        if self.directory.age() > DIRECTORY_MAX_AGE:
+            self.directory.update_from_mavlink2rest(await self.get_all_mavlink())
+        vehicle = self.directory.most_recent_vehicle()
+        if vehicle:
+            logger.debug(f"{vehicle.system_id} (detected)")
+            return vehicle.system_id
         logger.debug("no vehicle ID detected - using default (1)")
         return 1
 
@@ -111,6 +345,18 @@ class MavlinkMessenger:
         component: int = 1,
         timeout: float = 10.0,
     ) -> Any:
+        if self._uses_udp(message_name):
+            await self._get_udp_transport()
+        if self._uses_udp(message_name) or self._is_cached(message_name):
+            try:
+                return await self._cache.wait_for_update(
+                    vehicle or self.system_id, component, message_name, timeout / 2
+                )
+            except asyncio.TimeoutError as error:
+                logger.warning(f"no new messages after {timeout/2} seconds, triggering system-id detection")
+                self.set_system_id(await self.get_most_recent_vehicle_id())
+                raise FetchUpdatedMessageFail(f"Did not receive an updated {message_name} before timeout.") from error
+
         first_message = await self.get_mavlink_message(message_name, vehicle or self.system_id, component)
         first_message_counter = first_message["status"]["time"]["counter"]
         t0 = time.time()
@@ -127,20 +373,38 @@ class MavlinkMessenger:
 
         return new_message
 
-    async def send_mavlink_message(self, message: Dict[str, Any]) -> None:
+    async def send_mavlink_message(self, message: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        if self._uses_udp(message["type"]):
+            transport = await self._get_udp_transport()
+            try:
+                transport.send(message, self.system_id, self.component_id)
+                return
+            except MavlinkCodecError as error:
+                logger.debug(f"Could not encode {message['type']} locally, sending through Mavlink2Rest. {error}")
+
         mavlink2rest_package = {
             "header": {"system_id": self.system_id, "component_id": self.component_id, "sequence": self.sequence},
             "message": message,
         }
 
-        request_timeout = 1.0
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    self.m2r_rest_url, data=json.dumps(mavlink2rest_package), timeout=request_timeout
-                ) as response:
-                    if not response.status == 200:
-                        logger.warning(await response.text())
-                        raise MavlinkMessageSendFail(f"Received status code of {response.status}.")
-            except asyncio.exceptions.TimeoutError as error:
-                raise MavlinkMessageSendFail(f"Request timed out after {request_timeout} second.") from error
+        request_timeout = timeout or self.request_timeout
+        session = self._get_session()
+        try:
+            async with session.post(
+                self.m2r_rest_url,
+                data=json.dumps(mavlink2rest_package),
+                timeout=aiohttp.ClientTimeout(total=request_timeout),
+            ) as response:
+                if not response.status == 200:
+                    logger.warning(await response.text())
+                    raise MavlinkMessageSendFail(f"Received status code of {response.status}.")
+        except asyncio.exceptions.TimeoutError as error:
+            raise MavlinkMessageSendFail(f"Request timed out after {request_timeout} second.") from error
+
+    def queue_mavlink_message(self, message: Dict[str, Any], key: Optional[Hashable] = None) -> None:
+        """Queue a message to be sent in the background, without waiting for Mavlink2Rest.
+        If a message with the same key is still waiting to be sent, it is replaced by the new one. By default, messages
+        are replaced by the ones of the same type and instance `id`, like readings of the same distance sensor."""
+        if key is None:
+            key = (message["type"], self.component_id, message.get("id"))
+        self.outbound_queue.put(key, message)
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# (vehicle ID, component ID, message name)
+MessageKey = Tuple[int, int, str]
+
+
+class MavlinkMessageCache:
+    """Local copy of the most recent Mavlink messages received from a Mavlink2Rest stream.
+
+    Entries follow the same format used by Mavlink2Rest REST API, with the message content under "message" and
+    reception information (counter, first/last update and frequency) under "status".
+    """
+
+    def __init__(self) -> None:
+        self._messages: Dict[MessageKey, Dict[str, Any]] = {}
+        self._waiters: Dict[MessageKey, List["asyncio.Future[Dict[str, Any]]"]] = {}
+        self._listeners: List[Callable[[MessageKey, Dict[str, Any]], None]] = []
+
+    def add_listener(self, listener: Callable[[MessageKey, Dict[str, Any]], None]) -> None:
+        """Register a callback called with the key and the new entry every time a message is received."""
+        self._listeners.append(listener)
+
+    @staticmethod
+    def key(vehicle: int, component: int, message_name: str) -> MessageKey:
+        return (int(vehicle), int(component), message_name.upper())
+
+    def update(self, package: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a Mavlink2Rest package (header + message) and wake up everyone waiting for it."""
+        header = package["header"]
+        message = package["message"]
+        key = self.key(header["system_id"], header["component_id"], message["type"])
+
+        # Timestamps are kept naive (UTC) to be comparable with the ones parsed from Mavlink2Rest
+        now = datetime.utcnow()
+        previous = self._messages.get(key)
+        if previous is None:
+            counter = 0
+            first_update = now
+        else:
+            counter = previous["status"]["time"]["counter"] + 1
+            first_update = datetime.fromisoformat(previous["status"]["time"]["first_update"])
+        elapsed = (now - first_update).total_seconds()
+
+        entry = {
+            "message": message,
+            "status": {
+                "time": {
+                    "counter": counter,
+                    "first_update": first_update.isoformat(),
+                    "last_update": now.isoformat(),
+                    "frequency": counter / elapsed if elapsed > 0 else 0.0,
+                }
+            },
+        }
+        self._messages[key] = entry
+
+        for listener in self._listeners:
+            try:
+                listener(key, entry)
+            except Exception as error:
+                logger.warning(f"Failed to process {key}: {error}")
+        for waiter in self._waiters.pop(key, []):
+            if not waiter.done():
+                waiter.set_result(entry)
+        return entry
+
+    def get(self, vehicle: int, component: int, message_name: str) -> Optional[Dict[str, Any]]:
+        return self._messages.get(self.key(vehicle, component, message_name))
+
+    async def wait_for_update(self, vehicle: int, component: int, message_name: str, timeout: float) -> Dict[str, Any]:
+        """Wait for the next reception of a message.
+
+        Raises:
+            asyncio.TimeoutError: If the message is not received before timeout.
+        """
+        key = self.key(vehicle, component, message_name)
+        waiter: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            waiters = self._waiters.get(key, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(key, None)
+
+    def to_mavlink2rest(self) -> Dict[str, Any]:
+        """All cached messages, with the same structure returned by Mavlink2Rest '/mavlink' endpoint."""
+        vehicles: Dict[str, Any] = {}
+        for (vehicle, component, message_name), entry in self._messages.items():
+            components = vehicles.setdefault(str(vehicle), {"components": {}})["components"]
+            components.setdefault(str(component), {"messages": {}})["messages"][message_name] = entry
+        return {"vehicles": vehicles}
+
+    def clear(self) -> None:
+        self._messages.clear()
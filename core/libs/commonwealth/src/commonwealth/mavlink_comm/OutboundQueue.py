@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from loguru import logger
+
+DEFAULT_MAX_DEPTH = 32
+DEFAULT_BATCH_SIZE = 8
+# Weight of the newest sample on the queue latency moving average
+LATENCY_SMOOTHING = 0.1
+
+
+@dataclass
+class OutboundQueueStats:
+    queued: int = 0
+    sent: int = 0
+    failed: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    depth: int = 0
+    latency_avg_ms: float = 0.0
+    latency_max_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MavlinkOutboundQueue:
+    """Bounded queue of Mavlink messages waiting to be sent.
+
+    Messages are coalesced by key, if a message with the same key is still waiting, it is replaced by the new one
+    (latest value wins) while keeping its place in the queue. When the queue is full the oldest message is dropped.
+    Messages are flushed in batches of concurrent sends by a task that only lives while there is something to send.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        self._send = send
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        # key -> (message, time it was first queued)
+        self._pending: "OrderedDict[Hashable, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._stats = OutboundQueueStats()
+
+    def set_max_depth(self, max_depth: int) -> None:
+        if max_depth < 1:
+            raise ValueError("Queue depth should be at least 1.")
+        self.max_depth = max_depth
+
+    def set_batch_size(self, batch_size: int) -> None:
+        if batch_size < 1:
+            raise ValueError("Batch size should be at least 1.")
+        self.batch_size = batch_size
+
+    def put(self, key: Hashable, message: Dict[str, Any]) -> None:
+        """Queue a message to be sent, must be called from inside the event loop."""
+        self._stats.queued += 1
+        if key in self._pending:
+            _, queued_time = self._pending[key]
+            self._pending[key] = (message, queued_time)
+            self._stats.coalesced += 1
+        else:
+            while len(self._pending) >= self.max_depth:
+                self._pending.popitem(last=False)
+                self._stats.dropped += 1
+            self._pending[key] = (message, time.monotonic())
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch = [self._pending.popitem(last=False)[1] for _ in range(min(self.batch_size, len(self._pending)))]
+            results = await asyncio.gather(*[self._send(message) for message, _ in batch], return_exceptions=True)
+
+            now = time.monotonic()
+            errors = [result for result in results if isinstance(result, Exception)]
+            self._stats.failed += len(errors)
+            self._stats.sent += len(batch) - len(errors)
+            for _, queued_time in batch:
+                latency_ms = (now - queued_time) * 1000
+                self._stats.latency_max_ms = max(self._stats.latency_max_ms, latency_ms)
+                self._stats.latency_avg_ms += LATENCY_SMOOTHING * (latency_ms - self._stats.latency_avg_ms)
+            if errors:
+                logger.warning(f"Failed to send {len(errors)} of {len(batch)} queued messages: {errors[0]}")
+
+    async def close(self) -> None:
+        """Stop flushing and discard pending messages."""
+        task = self._flush_task
+        self._flush_task = None
+        self._stats.dropped += len(self._pending)
+        self._pending.clear()
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> OutboundQueueStats:
+        return OutboundQueueStats(**{**self._stats.to_dict(), "depth": len(self._pending)})
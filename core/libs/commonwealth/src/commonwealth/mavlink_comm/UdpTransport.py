@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from commonwealth.mavlink_comm import MavlinkCodec
+from commonwealth.mavlink_comm.exceptions import MavlinkMessageSendFail
+from commonwealth.mavlink_comm.MessageCache import MavlinkMessageCache
+
+
+class _MavlinkDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, cache: MavlinkMessageCache) -> None:
+        self.cache = cache
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        for package in MavlinkCodec.parse_frames(data):
+            self.cache.update(package)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning(f"MAVLink UDP transport error: {exc}")
+
+
+def _is_running_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+class MavlinkUdpTransport:
+    """Exchange MAVLink v2 frames directly with a router UDP endpoint, bypassing Mavlink2Rest.
+
+    The router endpoint should be a UDP server (e.g. 'udpin:127.0.0.1:14002'), it learns our address from the first
+    frame we send. Received frames of supported messages are stored in the given cache.
+    """
+
+    def __init__(self, address: str, cache: MavlinkMessageCache) -> None:
+        host, port = address.split(":")
+        self.remote_address = (host, int(port))
+        self.cache = cache
+        self.sequence = 0
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def closed(self) -> bool:
+        return self._transport is None or self._transport.is_closing()
+
+    async def connect(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _MavlinkDatagramProtocol(self.cache), remote_addr=self.remote_address
+        )
+        logger.info(f"MAVLink UDP transport connected to {self.remote_address[0]}:{self.remote_address[1]}.")
+
+    def send(self, message: Dict[str, Any], system_id: int, component_id: int) -> None:
+        if self._transport is None or self._transport.is_closing():
+            raise MavlinkMessageSendFail("MAVLink UDP transport is not connected.")
+        frame = MavlinkCodec.encode(message, system_id, component_id, self.sequence)
+        self.sequence = (self.sequence + 1) % 256
+        self._transport.sendto(frame)
+
+    def close(self) -> None:
+        transport, loop = self._transport, self._loop
+        self._transport = None
+        self._loop = None
+        if transport is None:
+            return
+        if loop is not None and loop.is_running() and not _is_running_loop(loop):
+            # Transports can only be closed from the thread of their loop
+            loop.call_soon_threadsafe(transport.close)
+            return
+        try:
+            transport.close()
+        except RuntimeError:
+            # The loop is closed and can not run the closing scheduled by the transport, so it is finished here to
+            # release the socket
+            transport._call_connection_lost(None)  # type: ignore[attr-defined]
@@ -0,0 +1,94 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from commonwealth.mavlink_comm.typedefs import MavlinkVehicleType
+
+
+@dataclass
+class MavlinkComponentInfo:
+    system_id: int
+    component_id: int
+    vehicle_type: str
+    autopilot: str
+    last_heartbeat: datetime
+
+    def is_vehicle(self) -> bool:
+        try:
+            return MavlinkVehicleType[self.vehicle_type].is_actually_a_vehicle()
+        except KeyError:
+            return False
+
+
+def parse_mavlink2rest_time(timestamp: str) -> datetime:
+    """Parse a Mavlink2Rest timestamp into a naive UTC datetime."""
+    # drop sub-microsecond precision as it is not supported by datetime.fromisoformat
+    parsed = datetime.fromisoformat(re.sub(r"(\.\d{6})\d+", r"\1", timestamp).removesuffix("Z"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class MavlinkVehicleDirectory:
+    """Systems and components known from their HEARTBEAT messages, updated as heartbeats are received."""
+
+    def __init__(self) -> None:
+        self._components: Dict[Tuple[int, int], MavlinkComponentInfo] = {}
+        self._most_recent_vehicle: Optional[MavlinkComponentInfo] = None
+        self._last_update = 0.0
+
+    def update_heartbeat(self, system_id: int, component_id: int, message: Dict[str, Any], timestamp: datetime) -> None:
+        """Register a HEARTBEAT (in Mavlink2Rest format) received at the given time."""
+        key = (int(system_id), int(component_id))
+        info = self._components.get(key)
+        if info is None:
+            info = MavlinkComponentInfo(
+                system_id=key[0],
+                component_id=key[1],
+                vehicle_type=message["mavtype"]["type"],
+                autopilot=message["autopilot"]["type"],
+                last_heartbeat=timestamp,
+            )
+            self._components[key] = info
+            self._last_update = time.monotonic()
+        elif timestamp >= info.last_heartbeat:
+            info.vehicle_type = message["mavtype"]["type"]
+            info.autopilot = message["autopilot"]["type"]
+            # Polling the same heartbeat again does not make the directory any more up to date
+            if timestamp > info.last_heartbeat:
+                self._last_update = time.monotonic()
+            info.last_heartbeat = timestamp
+
+        if not info.is_vehicle():
+            if self._most_recent_vehicle is info:
+                self._most_recent_vehicle = None
+            return
+        if self._most_recent_vehicle is None or info.last_heartbeat >= self._most_recent_vehicle.last_heartbeat:
+            self._most_recent_vehicle = info
+
+    def update_from_mavlink2rest(self, data: Dict[str, Any]) -> None:
+        """Register all heartbeats from a complete Mavlink2Rest '/mavlink' tree."""
+        for vehicle_id, vehicle in data["vehicles"].items():
+            for component_id, component in vehicle["components"].items():
+                heartbeat = component["messages"].get("HEARTBEAT")
+                if heartbeat is None:
+                    continue
+                last_update = parse_mavlink2rest_time(heartbeat["status"]["time"]["last_update"])
+                self.update_heartbeat(int(vehicle_id), int(component_id), heartbeat["message"], last_update)
+        self._last_update = time.monotonic()
+
+    def age(self) -> float:
+        """Seconds since a new heartbeat was received or the directory was updated from a complete tree."""
+        return time.monotonic() - self._last_update
+
+    def most_recent_vehicle(self) -> Optional[MavlinkComponentInfo]:
+        """Vehicle component (not GCSs or other components) with the most recent heartbeat."""
+        return self._most_recent_vehicle
+
+    def get(self, system_id: int, component_id: int) -> Optional[MavlinkComponentInfo]:
+        return self._components.get((system_id, component_id))
+
+    def components(self) -> List[MavlinkComponentInfo]:
+        return list(self._components.values())
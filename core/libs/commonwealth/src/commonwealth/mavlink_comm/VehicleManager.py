@@ -3,6 +3,10 @@ from typing import Any, Dict, List
 
 from loguru import logger
 
+from commonwealth.mavlink_comm.CommandTracker import (
+    CommandResult,
+    MavlinkCommandTracker,
+)
 from commonwealth.mavlink_comm.exceptions import VehicleDisarmFail
 from commonwealth.mavlink_comm.MavlinkComm import MavlinkMessenger
 from commonwealth.mavlink_comm.typedefs import (
@@ -18,11 +22,20 @@ MAV_MODE_FLAG_SAFETY_ARMED = 128
 class VehicleManager:
     def __init__(self) -> None:
         self.mavlink2rest = MavlinkMessenger()
+        # HEARTBEAT is used to check vehicle state, keep it updated locally instead of polling for it.
+        # Command acknowledgements and replies are subscribed together to avoid reopening the stream later.
+        self.mavlink2rest.subscribe(
+            [MavlinkMessageId.HEARTBEAT.name, "COMMAND_ACK", MavlinkMessageId.AUTOPILOT_VERSION.name]
+        )
+        self.command_tracker = MavlinkCommandTracker(self.mavlink2rest)
 
         self.target_system = 1
         self.target_component = 1
         self.confirmation = 0
 
+    async def close(self) -> None:
+        await self.mavlink2rest.close()
+
     def set_target_system(self, target_system: int) -> None:
         logger.info(f"setting target system to: {target_system}")
         self.target_system = target_system
@@ -66,17 +79,20 @@ class VehicleManager:
             await self.mavlink2rest.send_mavlink_message(heartbeat_message)
             await asyncio.sleep(0.1)
 
-    async def request_message(self, message_id: int) -> None:
+    async def request_message(self, message_id: int) -> CommandResult:
         message = self.command_long_message("MAV_CMD_REQUEST_MESSAGE", [message_id])
-        await self.mavlink2rest.send_mavlink_message(message)
+        try:
+            reply_message = MavlinkMessageId(message_id).name
+        except ValueError:
+            reply_message = None
+        return await self.command_tracker.send_command(message, reply_message)
 
     async def get_firmware_info(self) -> FirmwareInfo:
-        request_message = self.command_long_message(
-            "MAV_CMD_REQUEST_MESSAGE", [MavlinkMessageId.AUTOPILOT_VERSION.value]
-        )
-        await self.mavlink2rest.send_mavlink_message(request_message)
+        result = await self.request_message(MavlinkMessageId.AUTOPILOT_VERSION.value)
         try:
-            autopilot_version = await self.mavlink2rest.get_mavlink_message(MavlinkMessageId.AUTOPILOT_VERSION.name)
+            autopilot_version = result.reply
+            if autopilot_version is None:
+                autopilot_version = await self.mavlink2rest.get_mavlink_message(MavlinkMessageId.AUTOPILOT_VERSION.name)
             flight_sw_version_raw = autopilot_version["message"]["flight_sw_version"]
             major, minor, patch, version_type_raw = flight_sw_version_raw.to_bytes(4, byteorder="big")
             firmware_version = f"{major}.{minor}.{patch}"
@@ -99,11 +115,15 @@ class VehicleManager:
 
     async def reboot_vehicle(self) -> None:
         message = self.command_long_message("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN", [1.0])
-        await self.mavlink2rest.send_mavlink_message(message)
+        result = await self.command_tracker.send_command(message)
+        if result.acknowledged and not result.accepted:
+            logger.warning(f"Vehicle reboot was not accepted: {result.result}")
 
     async def shutdown_vehicle(self) -> None:
         shutdown_message = self.command_long_message("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN", [2.0])
-        await self.mavlink2rest.send_mavlink_message(shutdown_message)
+        result = await self.command_tracker.send_command(shutdown_message)
+        if result.acknowledged and not result.accepted:
+            logger.warning(f"Vehicle shutdown was not accepted: {result.result}")
 
     async def is_heart_beating(self) -> bool:
         try:
@@ -129,7 +149,12 @@ class VehicleManager:
 
         disarm_message = self.command_long_message("MAV_CMD_COMPONENT_ARM_DISARM", [])
 
-        await self.mavlink2rest.send_mavlink_message(disarm_message)
+        result = await self.command_tracker.send_command(disarm_message)
+        if result.acknowledged:
+            if not result.accepted:
+                raise VehicleDisarmFail(f"Vehicle refused to disarm ({result.result}). Please try a manual disarm.")
+            return
+        # No acknowledgement received, fallback to check the vehicle state
         if await self.is_vehicle_armed():
             raise VehicleDisarmFail("Failed to disarm vehicle. Please try a manual disarm.")
 
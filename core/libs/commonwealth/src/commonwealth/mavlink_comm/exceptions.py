@@ -17,3 +17,7 @@ class FetchUpdatedMessageFail(RuntimeError):
 
 class VehicleDisarmFail(RuntimeError):
     """Could not disarm vehicle."""
+
+
+class MavlinkCodecError(ValueError):
+    """Mavlink message could not be encoded or decoded."""
@@ -0,0 +1,65 @@
+import pytest
+
+from .. import MavlinkCodec
+from ..exceptions import MavlinkCodecError
+
+# HEARTBEAT from an ArduSub vehicle (system 1, component 1), as sent by the autopilot
+ARDUSUB_HEARTBEAT_FRAME = bytes.fromhex("fd090000000101000000130000000c03d1040310ac")
+
+
+def test_decode_heartbeat() -> None:
+    packages = list(MavlinkCodec.parse_frames(b"noise" + ARDUSUB_HEARTBEAT_FRAME + b"\xfd\x09"))
+    assert len(packages) == 1
+    assert packages[0]["header"] == {"system_id": 1, "component_id": 1, "sequence": 0}
+    assert packages[0]["message"] == {
+        "type": "HEARTBEAT",
+        "custom_mode": 19,
+        "mavtype": {"type": "MAV_TYPE_SUBMARINE"},
+        "autopilot": {"type": "MAV_AUTOPILOT_ARDUPILOTMEGA"},
+        "base_mode": {"bits": 209},
+        "system_status": {"type": "MAV_STATE_ACTIVE"},
+        "mavlink_version": 3,
+    }
+
+
+def test_encode_heartbeat() -> None:
+    message = list(MavlinkCodec.parse_frames(ARDUSUB_HEARTBEAT_FRAME))[0]["message"]
+    assert MavlinkCodec.encode(message, system_id=1, component_id=1, sequence=0) == ARDUSUB_HEARTBEAT_FRAME
+
+
+def test_encode_decode_round_trip() -> None:
+    message = {
+        "type": "DISTANCE_SENSOR",
+        "time_boot_ms": 1234,
+        "min_distance": 20,
+        "max_distance": 12000,
+        "current_distance": 150,
+        "mavtype": {"type": "MAV_DISTANCE_SENSOR_ULTRASOUND"},
+        "id": 0,
+        "orientation": {"type": "MAV_SENSOR_ROTATION_PITCH_270"},
+        "covariance": 255,
+        "horizontal_fov": 0.5,
+        "vertical_fov": 0.5,
+        "quaternion": [0, 0, 0, 0],
+        "signal_quality": 0,
+    }
+    frame = MavlinkCodec.encode(message, system_id=1, component_id=194, sequence=42)
+    package = list(MavlinkCodec.parse_frames(frame))[0]
+    assert package["header"] == {"system_id": 1, "component_id": 194, "sequence": 42}
+    assert package["message"] == message
+
+    # Corrupted frames are ignored
+    assert not list(MavlinkCodec.parse_frames(frame[:-1] + b"\x00"))
+
+
+def test_encode_unsupported() -> None:
+    assert not MavlinkCodec.is_supported("SYS_STATUS")
+    with pytest.raises(MavlinkCodecError):
+        MavlinkCodec.encode({"type": "SYS_STATUS"}, system_id=1, component_id=194, sequence=0)
+    with pytest.raises(MavlinkCodecError):
+        MavlinkCodec.encode(
+            {"type": "COMMAND_LONG", "command": {"type": "MAV_CMD_DO_SOMETHING"}},
+            system_id=1,
+            component_id=194,
+            sequence=0,
+        )
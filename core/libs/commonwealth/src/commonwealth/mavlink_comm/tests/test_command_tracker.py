@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from ..CommandTracker import MavlinkCommandTracker
+from ..MavlinkComm import MavlinkMessenger
+
+
+class FakeVehicle:
+    """Answer commands sent by a messenger through its message cache, as Mavlink2Rest stream would."""
+
+    def __init__(self, messenger: MavlinkMessenger, results: Dict[str, List[str]]) -> None:
+        self.messenger = messenger
+        self.results = results
+        self.sent: List[Dict[str, Any]] = []
+
+    def receive(self, message: Dict[str, Any]) -> None:
+        self.messenger._cache.update(  # pylint: disable=protected-access
+            {"header": {"system_id": 1, "component_id": 1, "sequence": 0}, "message": message}
+        )
+
+    async def send_mavlink_message(self, message: Dict[str, Any], timeout: Any = None) -> None:
+        self.sent.append(message)
+        command = message["command"]["type"]
+        results = self.results.get(command)
+        if not results:
+            return
+        ack = {
+            "type": "COMMAND_ACK",
+            "command": {"type": command},
+            "result": {"type": results.pop(0)},
+            "target_system": self.messenger.system_id,
+            "target_component": self.messenger.component_id,
+        }
+        loop = asyncio.get_running_loop()
+        loop.call_soon(self.receive, ack)
+        if command == "MAV_CMD_REQUEST_MESSAGE":
+            loop.call_soon(self.receive, {"type": "AUTOPILOT_VERSION", "flight_sw_version": 67306240})
+
+
+def command(command_type: str) -> Dict[str, Any]:
+    return {"type": "COMMAND_LONG", "command": {"type": command_type}, "target_system": 1, "target_component": 1}
+
+
+@pytest.mark.asyncio
+async def test_command_tracker() -> None:
+    messenger = MavlinkMessenger()
+    vehicle = FakeVehicle(
+        messenger,
+        {
+            "MAV_CMD_COMPONENT_ARM_DISARM": ["MAV_RESULT_TEMPORARILY_REJECTED", "MAV_RESULT_ACCEPTED"],
+            "MAV_CMD_REQUEST_MESSAGE": ["MAV_RESULT_ACCEPTED"],
+            "MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN": ["MAV_RESULT_DENIED"],
+        },
+    )
+    messenger.send_mavlink_message = vehicle.send_mavlink_message  # type: ignore
+    messenger.is_streamed = lambda message_name: True  # type: ignore
+    tracker = MavlinkCommandTracker(messenger, ack_timeout=0.5, retry_backoff=0.01)
+
+    disarm, firmware, reboot = await asyncio.gather(
+        tracker.send_command(command("MAV_CMD_COMPONENT_ARM_DISARM")),
+        tracker.send_command(command("MAV_CMD_REQUEST_MESSAGE"), "AUTOPILOT_VERSION"),
+        tracker.send_command(command("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN")),
+    )
+    # Temporarily rejected commands are retried, with a new confirmation number
+    assert disarm.accepted and disarm.attempts == 2
+    assert [message["confirmation"] for message in vehicle.sent if message["command"]["type"] == disarm.command] == [
+        0,
+        1,
+    ]
+    assert firmware.accepted
+    assert firmware.reply is not None and firmware.reply["message"]["flight_sw_version"] == 67306240
+    assert reboot.acknowledged and not reboot.accepted and reboot.result == "MAV_RESULT_DENIED"
+
+    # Commands without acknowledgement time out
+    unanswered = await tracker.send_command(command("MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES"), timeout=0.05)
+    assert not unanswered.acknowledged and unanswered.attempts == 1
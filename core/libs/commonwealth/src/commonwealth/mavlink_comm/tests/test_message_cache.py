@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Dict
+
+import pytest
+
+from ..MessageCache import MavlinkMessageCache
+
+
+def heartbeat_package(system_id: int = 1, component_id: int = 1) -> Dict[str, Any]:
+    return {
+        "header": {"system_id": system_id, "component_id": component_id, "sequence": 0},
+        "message": {"type": "HEARTBEAT", "base_mode": {"bits": 0}},
+    }
+
+
+def test_cache_update_counter() -> None:
+    cache = MavlinkMessageCache()
+    assert cache.get(1, 1, "HEARTBEAT") is None
+
+    for expected_counter in range(3):
+        cache.update(heartbeat_package())
+        entry = cache.get(1, 1, "heartbeat")
+        assert entry is not None
+        assert entry["status"]["time"]["counter"] == expected_counter
+        assert entry["message"]["type"] == "HEARTBEAT"
+
+    # Different components are stored independently
+    assert cache.get(1, 2, "HEARTBEAT") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_wait_for_update() -> None:
+    cache = MavlinkMessageCache()
+    waiter = asyncio.create_task(cache.wait_for_update(1, 1, "HEARTBEAT", timeout=1.0))
+    await asyncio.sleep(0)
+    cache.update(heartbeat_package())
+    entry = await waiter
+    assert entry["status"]["time"]["counter"] == 0
+
+    with pytest.raises(asyncio.TimeoutError):
+        await cache.wait_for_update(1, 1, "HEARTBEAT", timeout=0.05)
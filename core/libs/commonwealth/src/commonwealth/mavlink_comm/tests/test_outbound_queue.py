@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from ..MavlinkComm import MavlinkMessenger
+from ..OutboundQueue import MavlinkOutboundQueue
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_coalescing() -> None:
+    sent: List[Dict[str, Any]] = []
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    queue = MavlinkOutboundQueue(send, max_depth=2, batch_size=2)
+    # Same key, only the latest value should be sent
+    for value in range(5):
+        queue.put("DISTANCE_SENSOR", {"type": "DISTANCE_SENSOR", "value": value})
+    # Queue is full, oldest message is dropped
+    queue.put("GPS_INPUT", {"type": "GPS_INPUT"})
+    queue.put("HEARTBEAT", {"type": "HEARTBEAT"})
+    assert queue.stats().depth == 2
+
+    await asyncio.sleep(0.05)
+    assert [message["type"] for message in sent] == ["GPS_INPUT", "HEARTBEAT"]
+
+    stats = queue.stats()
+    assert stats.queued == 7
+    assert stats.coalesced == 4
+    assert stats.dropped == 1
+    assert stats.sent == 2
+    assert stats.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_failures() -> None:
+    async def send(_message: Dict[str, Any]) -> None:
+        raise RuntimeError("Mavlink2Rest is not available")
+
+    queue = MavlinkOutboundQueue(send)
+    queue.put("HEARTBEAT", {"type": "HEARTBEAT"})
+    await asyncio.sleep(0.05)
+    assert queue.stats().failed == 1
+    assert queue.stats().sent == 0
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_queued_messages_of_different_instances() -> None:
+    messenger = MavlinkMessenger()
+    sent: List[Dict[str, Any]] = []
+
+    async def send(message: Dict[str, Any], timeout: Any = None) -> None:
+        sent.append(message)
+
+    messenger.send_mavlink_message = send  # type: ignore
+    # Readings of different sensors are all sent, only the latest one of each sensor
+    for distance in range(3):
+        for sensor_id in (1, 2):
+            messenger.queue_mavlink_message({"type": "DISTANCE_SENSOR", "id": sensor_id, "current_distance": distance})
+    messenger.queue_mavlink_message({"type": "HEARTBEAT", "value": 0}, key="heartbeat")
+    messenger.queue_mavlink_message({"type": "HEARTBEAT", "value": 1}, key="heartbeat")
+
+    await asyncio.sleep(0.05)
+    assert sorted(
+        (message["type"], message.get("id"), message.get("current_distance"))
+        for message in sent
+        if message["type"] == "DISTANCE_SENSOR"
+    ) == [
+        ("DISTANCE_SENSOR", 1, 2),
+        ("DISTANCE_SENSOR", 2, 2),
+    ]
+    assert [message["value"] for message in sent if message["type"] == "HEARTBEAT"] == [1]
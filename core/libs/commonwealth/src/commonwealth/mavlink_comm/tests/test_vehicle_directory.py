@@ -0,0 +1,106 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import pytest
+
+from ..MavlinkComm import MavlinkMessenger
+from ..VehicleDirectory import MavlinkVehicleDirectory, parse_mavlink2rest_time
+
+
+def heartbeat(vehicle_type: str) -> Dict[str, Any]:
+    return {
+        "type": "HEARTBEAT",
+        "mavtype": {"type": vehicle_type},
+        "autopilot": {"type": "MAV_AUTOPILOT_ARDUPILOTMEGA"},
+    }
+
+
+def test_most_recent_vehicle() -> None:
+    directory = MavlinkVehicleDirectory()
+    assert directory.most_recent_vehicle() is None
+
+    now = datetime.utcnow()
+    directory.update_heartbeat(1, 1, heartbeat("MAV_TYPE_SUBMARINE"), now)
+    # GCSs are not vehicles, even if more recent
+    directory.update_heartbeat(255, 190, heartbeat("MAV_TYPE_GCS"), now + timedelta(seconds=1))
+    vehicle = directory.most_recent_vehicle()
+    assert vehicle is not None and vehicle.system_id == 1
+
+    directory.update_heartbeat(2, 1, heartbeat("MAV_TYPE_SURFACE_BOAT"), now + timedelta(seconds=2))
+    vehicle = directory.most_recent_vehicle()
+    assert vehicle is not None and vehicle.system_id == 2
+    assert vehicle.vehicle_type == "MAV_TYPE_SURFACE_BOAT"
+    assert len(directory.components()) == 3
+
+
+def test_update_from_mavlink2rest() -> None:
+    def heartbeat_entry(vehicle_type: str, last_update: str) -> Dict[str, Any]:
+        return {"message": heartbeat(vehicle_type), "status": {"time": {"last_update": last_update}}}
+
+    directory = MavlinkVehicleDirectory()
+    directory.update_from_mavlink2rest(
+        {
+            "vehicles": {
+                "1": {
+                    "components": {
+                        "1": {
+                            "messages": {
+                                "HEARTBEAT": heartbeat_entry("MAV_TYPE_SUBMARINE", "2024-01-01T10:00:00.123456789Z")
+                            }
+                        }
+                    }
+                },
+                "3": {
+                    "components": {
+                        "1": {
+                            "messages": {
+                                "HEARTBEAT": heartbeat_entry("MAV_TYPE_QUADROTOR", "2024-01-01T10:00:01.123456Z")
+                            }
+                        }
+                    }
+                },
+                "4": {"components": {"1": {"messages": {}}}},
+            }
+        }
+    )
+    vehicle = directory.most_recent_vehicle()
+    assert vehicle is not None and vehicle.system_id == 3
+    assert directory.age() < 1.0
+
+
+def test_parse_mavlink2rest_time() -> None:
+    expected = datetime(2024, 1, 1, 10, 0, 0, 123456)
+    assert parse_mavlink2rest_time("2024-01-01T10:00:00.123456789Z") == expected
+    assert parse_mavlink2rest_time("2024-01-01T10:00:00.123456") == expected
+    assert parse_mavlink2rest_time("2024-01-01T12:00:00.123456+02:00") == expected
+
+
+@pytest.mark.asyncio
+async def test_stale_heartbeat_triggers_complete_update(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("commonwealth.mavlink_comm.MavlinkComm.DIRECTORY_MAX_AGE", 0.05)
+    messenger = MavlinkMessenger()
+    fetches: List[float] = []
+
+    async def get_all_mavlink(timeout: Any = None) -> Dict[str, Any]:
+        fetches.append(time.monotonic())
+        return {"vehicles": {}}
+
+    messenger.get_all_mavlink = get_all_mavlink  # type: ignore
+    last_heartbeat = datetime.utcnow()
+    messenger.directory.update_heartbeat(1, 1, heartbeat("MAV_TYPE_SUBMARINE"), last_heartbeat)
+    assert await messenger.get_most_recent_vehicle_id() == 1
+    assert not fetches
+
+    # The vehicle is gone, but its last heartbeat keeps being polled
+    for _ in range(10):
+        messenger.directory.update_heartbeat(1, 1, heartbeat("MAV_TYPE_SUBMARINE"), last_heartbeat)
+        await asyncio.sleep(0.01)
+    await messenger.get_most_recent_vehicle_id()
+    assert len(fetches) == 1
+
+    # New heartbeats keep it up to date
+    messenger.directory.update_heartbeat(1, 1, heartbeat("MAV_TYPE_SUBMARINE"), last_heartbeat + timedelta(seconds=1))
+    await messenger.get_most_recent_vehicle_id()
+    assert len(fetches) == 1
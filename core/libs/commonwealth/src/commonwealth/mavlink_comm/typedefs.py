@@ -23,6 +23,13 @@ class FirmwareVersionType(str, Enum):
         return FirmwareVersionType.DEV
 
 
+class MavlinkBackend(str, Enum):
+    # JSON messages exchanged with Mavlink2Rest REST API
+    REST = "rest"
+    # MAVLink v2 frames exchanged directly with a router UDP endpoint
+    UDP = "udp"
+
+
 class MavlinkVehicleType(str, Enum):
     MAV_TYPE_GENERIC = "Generic"
     MAV_TYPE_FIXED_WING = "Fixed Wing"
@@ -13,6 +13,7 @@ from commonwealth.settings.exceptions import (
     MigrationFail,
     SettingsFromTheFuture,
 )
+from commonwealth.settings.persistence import atomic_write
 
 
 class PydanticSettings(BaseModel):
@@ -106,11 +107,8 @@ class PydanticSettings(BaseModel):
             # We call this to allow users to initialize the settings from another source if needed
             self.on_settings_created(file_path)
 
-        with open(file_path, "w", encoding="utf-8") as settings_file:
-            logger.debug(f"Saving settings on: {file_path}")
-
-            json_data = self.dict()
-            json.dump(json_data, settings_file, indent=4)
+        logger.debug(f"Saving settings on: {file_path}")
+        atomic_write(file_path, json.dumps(self.dict(), indent=4))
 
     def reset(self) -> None:
         """Reset internal data to default values"""
@@ -13,6 +13,7 @@ from commonwealth.settings.exceptions import (
     MigrationFail,
     SettingsFromTheFuture,
 )
+from commonwealth.settings.persistence import atomic_write
 
 
 class PyksonSettings(pykson.JsonObject):
@@ -90,9 +91,8 @@ class PyksonSettings(pykson.JsonObject):
         parent_path = file_path.parent.absolute()
         parent_path.mkdir(parents=True, exist_ok=True)
 
-        with open(file_path, "w", encoding="utf-8") as settings_file:
-            logger.debug(f"Saving settings on: {file_path}")
-            settings_file.write(json.dumps(json.loads(Pykson().to_json(self)), indent=4))
+        logger.debug(f"Saving settings on: {file_path}")
+        atomic_write(file_path, json.dumps(json.loads(Pykson().to_json(self)), indent=4))
 
     def reset(self) -> None:
         """Reset internal data to default values"""
@@ -1,12 +1,14 @@
 import pathlib
 import re
-from typing import Any, Optional, Type
+from typing import Any, Callable, Dict, List, Optional, Type
 
 import appdirs
 from loguru import logger
 
 from commonwealth.settings.bases.pykson_base import PyksonSettings
 from commonwealth.settings.exceptions import SettingsFromTheFuture
+from commonwealth.settings.persistence import WriteBehind
+from commonwealth.settings.watcher import SettingsFolderWatcher
 
 
 class PyksonManager:
@@ -18,6 +20,7 @@ class PyksonManager:
         settings_type: Type[PyksonSettings],
         config_folder: Optional[pathlib.Path] = None,
         load: bool = True,
+        write_delay: Optional[float] = None,
     ) -> None:
         assert project_name, "project_name should be not empty"
         assert issubclass(settings_type, PyksonSettings), "settings_type should use PyksonSettings as subclass"
@@ -30,7 +33,11 @@ class PyksonManager:
         )
         self.config_folder.mkdir(parents=True, exist_ok=True)
         self.settings_type = settings_type
-        self._settings = None
+        self._settings: Optional[PyksonSettings] = None
+        # With a write delay, changes are saved in the background and bursts of changes result in a single write
+        self._write_behind = WriteBehind(self._write, write_delay) if write_delay else None
+        self._watcher = SettingsFolderWatcher(self.config_folder, PyksonManager.SETTINGS_NAME_PREFIX)
+        self._subscribers: List[Callable[[Any], None]] = []
         logger.debug(
             f"Starting {project_name} settings with {settings_type.__name__}, configuration path: {config_folder}"
         )
@@ -92,13 +99,40 @@ class PyksonManager:
 
         return settings_data
 
-    def save(self) -> None:
-        """Save settings"""
+    def _write(self) -> None:
         self.settings.save(self.settings_file_path())
+        # Our own changes do not need to be reloaded
+        self._watcher.reset()
+
+    def save(self) -> None:
+        """Save settings, or schedule it when a write delay is configured"""
+        if self._write_behind:
+            self._write_behind.schedule()
+            return
+        self._write()
+
+    def flush(self) -> None:
+        """Write pending settings changes"""
+        if self._write_behind:
+            self._write_behind.flush()
+
+    def write_stats(self) -> Dict[str, int]:
+        """Number of settings writes and of changes coalesced into them"""
+        if self._write_behind:
+            return self._write_behind.stats()
+        return {"writes": 0, "coalesced": 0, "failed": 0}
 
     def load(self) -> None:
         """Load settings"""
-
+        # Changes not written yet would be lost otherwise
+        self.flush()
+        try:
+            self._load()
+        finally:
+            # Loading may create the settings file, which is not a change to be reloaded later
+            self._watcher.reset()
+
+    def _load(self) -> None:
         def get_settings_version_from_filename(filename: pathlib.Path) -> int:
             result = re.search(f"{PyksonManager.SETTINGS_NAME_PREFIX}(\\d+)", filename.name)
             assert result
@@ -124,3 +158,28 @@ class PyksonManager:
                 logger.debug("Invalid settings, going to try another file:", exception)
 
         self._settings = PyksonManager.load_from_file(self.settings_type, self.settings_file_path())
+
+    def subscribe(self, callback: Callable[[Any], None]) -> None:
+        """Register a callback called with the new settings every time `reload` finds changed settings files
+
+        Args:
+            callback (Callable[[Any], None]): Function receiving the new settings
+        """
+        self._subscribers.append(callback)
+
+    def reload(self) -> bool:
+        """Load settings only if the settings files changed since they were last loaded or saved
+
+        Returns:
+            bool: True if the settings were loaded again
+        """
+        if self._settings and not self._watcher.has_changed():
+            return False
+
+        self.load()
+        for callback in self._subscribers:
+            try:
+                callback(self._settings)
+            except Exception as exception:
+                logger.warning(f"Failed to notify settings change: {exception}")
+        return True
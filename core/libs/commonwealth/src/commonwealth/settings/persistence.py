@@ -0,0 +1,89 @@
+import atexit
+import os
+import pathlib
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+
+
+def atomic_write(file_path: pathlib.Path, content: str) -> None:
+    """Replace the content of a file in a way that it is never left partially written, even on power loss.
+
+    The content is written to a temporary file in the same folder, synced to disk and renamed over the original file.
+
+    Args:
+        file_path (pathlib.Path): Path for the file
+        content (str): New content of the file
+    """
+    # The temporary file name should not match the settings files pattern, so it is never loaded
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as temporary_file:
+            temporary_file.write(content)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        pathlib.Path(temporary_path).unlink(missing_ok=True)
+        raise
+
+    # Sync the folder as well, otherwise the rename itself may be lost
+    folder_descriptor = os.open(file_path.parent, os.O_RDONLY)
+    try:
+        os.fsync(folder_descriptor)
+    finally:
+        os.close(folder_descriptor)
+
+
+class WriteBehind:
+    """Delay writes, so a burst of changes results in a single write.
+
+    The first change schedules a write after the configured delay, following changes before it happens are coalesced
+    into it. Pending writes are flushed when the process exits.
+    """
+
+    def __init__(self, write: Callable[[], None], delay: float) -> None:
+        self._write = write
+        self.delay = delay
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self._writes = 0
+        self._coalesced = 0
+        self._failed = 0
+        atexit.register(self.flush)
+
+    def schedule(self) -> None:
+        """Register a change to be written."""
+        with self._lock:
+            if self._timer is not None:
+                self._coalesced += 1
+                return
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Write pending changes now."""
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            try:
+                self._write()
+                self._writes += 1
+            except Exception as exception:
+                self._failed += 1
+                logger.error(f"Failed to write settings: {exception}")
+
+    @property
+    def pending(self) -> bool:
+        return self._timer is not None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"writes": self._writes, "coalesced": self._coalesced, "failed": self._failed}
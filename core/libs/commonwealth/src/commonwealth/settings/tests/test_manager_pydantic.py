@@ -1,7 +1,8 @@
 import os
 import pathlib
 import tempfile
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List
 
 from ..bases.pydantic_base import PydanticSettings
 from ..managers.pydantic_manager import PydanticManager
@@ -173,3 +174,55 @@ def test_fallback_settings_save_load() -> None:
     assert settings_manager.settings.version_2_variable == 2
     assert settings_manager.settings.version_3_variable == 3
     assert settings_manager.settings.version_12_variable == 12
+
+
+def test_write_behind_settings_save() -> None:
+    temporary_folder = tempfile.mkdtemp()
+    config_path = pathlib.Path(temporary_folder)
+
+    settings_manager = PydanticManager("ManagerTest", SettingsV1, config_path, write_delay=0.2)
+    for value in range(10):
+        settings_manager.settings.version_1_variable = value
+        settings_manager.save()
+
+    # Nothing is written before the delay, and all changes are written together after it
+    assert PydanticManager("ManagerTest", SettingsV1, config_path).settings.version_1_variable == 42
+    time.sleep(0.4)
+    assert PydanticManager("ManagerTest", SettingsV1, config_path).settings.version_1_variable == 9
+    assert settings_manager.write_stats() == {"writes": 1, "coalesced": 9, "failed": 0}
+
+    # Pending changes can be written on demand, without leaving temporary files behind
+    settings_manager.settings.version_1_variable = 2022
+    settings_manager.save()
+    settings_manager.flush()
+    assert PydanticManager("ManagerTest", SettingsV1, config_path).settings.version_1_variable == 2022
+    assert os.listdir(config_path.joinpath("managertest")) == ["settings-1.json"]
+
+
+def test_settings_reload_on_change() -> None:
+    for use_inotify in [True, False]:
+        temporary_folder = tempfile.mkdtemp()
+        config_path = pathlib.Path(temporary_folder)
+
+        settings_manager = PydanticManager("ManagerTest", SettingsV1, config_path)
+        if not use_inotify:
+            settings_manager._watcher.close()  # pylint: disable=protected-access
+        changes: List[int] = []
+        settings_manager.subscribe(lambda settings: changes.append(settings.version_1_variable))
+
+        # Nothing changed, and our own saves are not considered changes
+        assert not settings_manager.reload()
+        settings_manager.settings.version_1_variable = 1
+        settings_manager.save()
+        assert not settings_manager.reload()
+
+        # Changes made by somebody else are loaded and notified
+        other_manager = PydanticManager("ManagerTest", SettingsV1, config_path)
+        other_manager.settings.version_1_variable = 2
+        # Ensure a different modification time for the polling fallback
+        time.sleep(0.01)
+        other_manager.save()
+        assert settings_manager.reload()
+        assert settings_manager.settings.version_1_variable == 2
+        assert changes == [2]
+        assert not settings_manager.reload()
@@ -0,0 +1,118 @@
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import struct
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+# Events after which the folder is not watched anymore
+WATCH_LOST_MASK = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+# struct inotify_event: wd, mask, cookie, len, followed by the NUL padded name
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class SettingsFolderWatcher:
+    """Detect changes on the settings files of a folder.
+
+    Uses inotify when available, otherwise compares the modification time and size of the files.
+    """
+
+    def __init__(self, folder: pathlib.Path, prefix: str) -> None:
+        self.folder = folder
+        self.prefix = prefix
+        self._inotify_fd: Optional[int] = None
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._start_inotify()
+        self.reset()
+
+    def _start_inotify(self) -> None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if inotify_fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            if libc.inotify_add_watch(inotify_fd, str(self.folder).encode(), WATCH_MASK) < 0:
+                os.close(inotify_fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            self._inotify_fd = inotify_fd
+        except (OSError, AttributeError) as error:
+            logger.debug(f"inotify not available for {self.folder}, falling back to polling: {error}")
+
+    def _stop_inotify(self) -> None:
+        if self._inotify_fd is None:
+            return
+        os.close(self._inotify_fd)
+        self._inotify_fd = None
+        # From now on changes are detected by polling
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith(self.prefix):
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def _read_events(self) -> bool:
+        assert self._inotify_fd is not None
+        changed = False
+        while True:
+            try:
+                data = os.read(self._inotify_fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + name_length].rstrip(b"\0").decode(errors="replace")
+                offset += name_length
+                if mask & (WATCH_LOST_MASK | IN_Q_OVERFLOW):
+                    changed = True
+                    if mask & WATCH_LOST_MASK:
+                        logger.debug(f"Lost inotify watch of {self.folder}, falling back to polling.")
+                        self._stop_inotify()
+                        return changed
+                elif name.startswith(self.prefix):
+                    changed = True
+
+    def has_changed(self) -> bool:
+        """Check if settings files were changed since the last check or reset."""
+        if self._inotify_fd is not None:
+            return self._read_events()
+        snapshot = self._take_snapshot()
+        changed = snapshot != self._snapshot
+        self._snapshot = snapshot
+        return changed
+
+    def reset(self) -> None:
+        """Consider the current state of the settings files as known."""
+        if self._inotify_fd is not None:
+            self._read_events()
+        if self._inotify_fd is None:
+            self._snapshot = self._take_snapshot()
+
+    def close(self) -> None:
+        self._stop_inotify()
+
+    def __del__(self) -> None:
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
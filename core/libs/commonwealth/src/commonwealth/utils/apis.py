@@ -1,25 +1,89 @@
+import hashlib
 import json
-from typing import Any, Callable, Coroutine, Dict, Optional
+import secrets
+from dataclasses import asdict
+from typing import Any, Callable, Coroutine, Dict, List, Optional, TypeVar
+from urllib.parse import parse_qsl
 
-from fastapi import HTTPException, Request, Response, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 from fastapi.routing import APIRoute
 from loguru import logger
 from starlette.responses import Response as StarletteResponse
+from starlette.types import Receive, Scope, Send
 
+from commonwealth.utils.decorators import cache_stats
 from commonwealth.utils.logs import stack_trace_message
+from commonwealth.utils.loop_monitor import loop_monitor_stats
+from commonwealth.utils.stream_stats import streaming_stats
+
+try:
+    import orjson
+except ImportError:
+    # orjson is a dependency, the standard library is only used where its wheels are not available
+    orjson = None  # type: ignore[assignment]
+
+# Query parameter used to ask for an indented response, e.g. '/web_services?pretty'
+PRETTY_QUERY_PARAMETER = "pretty"
+# Endpoint attribute holding the StateVersion its response depends on
+STATE_VERSION_ATTRIBUTE = "_state_version"
+
+EndpointT = TypeVar("EndpointT", bound=Callable[..., Any])
+
+
+def _dumps_pretty(content: Any) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=2,
+        separators=(", ", ": "),
+    ).encode("utf-8")
 
 
 class PrettyJSONResponse(StarletteResponse):
     media_type = "application/json"
 
     def render(self, content: Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=2,
-            separators=(", ", ": "),
-        ).encode(self.charset)
+        return _dumps_pretty(content)
+
+
+def _dumps_compact(content: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Content orjson is stricter about (e.g. integers above 64 bits), the standard library can still handle it
+            pass
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _wants_pretty(scope: Scope) -> bool:
+    for name, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True):
+        if name == PRETTY_QUERY_PARAMETER:
+            return value.lower() in ("", "1", "true", "yes")
+    return False
+
+
+class FastJSONResponse(StarletteResponse):
+    """Compact JSON response, serialized with orjson when available.
+
+    Indented output, like the one of PrettyJSONResponse, can be requested with the 'pretty' query parameter.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        self._content = content
+        return _dumps_compact(content)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if _wants_pretty(scope):
+            self.body = _dumps_pretty(self._content)
+            self.raw_headers = [
+                (name, str(len(self.body)).encode("latin-1") if name == b"content-length" else value)
+                for name, value in self.raw_headers
+            ]
+        await super().__call__(scope, receive, send)
 
 
 class GenericErrorHandlingRoute(APIRoute):
@@ -41,6 +105,98 @@ class GenericErrorHandlingRoute(APIRoute):
         return custom_route_handler
 
 
+class StateVersion:
+    """Version counter of a state object, to be bumped every time the state changes.
+
+    Endpoints decorated with `conditional` answer conditional requests from the version alone, without being called.
+    """
+
+    def __init__(self) -> None:
+        # Counters restart with the service, the token keeps entity tags of different runs apart
+        self._token = secrets.token_hex(4)
+        self.value = 0
+
+    def bump(self) -> None:
+        self.value += 1
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self._token}-{self.value}"'
+
+
+def conditional(state_version: StateVersion) -> Callable[[EndpointT], EndpointT]:
+    """Use a state version as entity tag of an endpoint served by ConditionalRoute."""
+
+    def decorator(endpoint: EndpointT) -> EndpointT:
+        setattr(endpoint, STATE_VERSION_ATTRIBUTE, state_version)
+        return endpoint
+
+    return decorator
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # Weak comparison, as required for If-None-Match
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+class ConditionalRoute(GenericErrorHandlingRoute):
+    """Route with entity tags on GET responses, answering requests with a matching If-None-Match with 304.
+
+    The tag is a hash of the response body, or the StateVersion given with `conditional`. In the latter case unchanged
+    states are answered without calling the endpoint at all.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_route_handler = super().get_route_handler()
+        state_version: Optional[StateVersion] = getattr(self.endpoint, STATE_VERSION_ATTRIBUTE, None)
+
+        async def conditional_route_handler(request: Request) -> Response:
+            if request.method != "GET":
+                return await original_route_handler(request)
+
+            # Taken before calling the endpoint, a change during the call will only cost an extra request later
+            etag = state_version.etag if state_version is not None else None
+            if etag is not None and _etag_matches(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+            response = await original_route_handler(request)
+            body = getattr(response, "body", None)
+            # Streaming and file responses have no body to be tagged
+            if response.status_code != status.HTTP_200_OK or body is None:
+                return response
+            if etag is None:
+                etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            if _etag_matches(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+            return response
+
+        return conditional_route_handler
+
+
 class StackedHTTPException(HTTPException):
     def __init__(self, status_code: int, error: BaseException, headers: Optional[Dict[str, Any]] = None) -> None:
         super().__init__(status_code=status_code, detail=stack_trace_message(error), headers=headers)
+
+
+# Internal service state, to be included in the unversioned service application
+debug_router = APIRouter(prefix="/debug", tags=["debug"], default_response_class=FastJSONResponse)
+
+
+@debug_router.get("/caches", summary="Usage statistics of the service caches.")
+def debug_caches() -> List[Dict[str, Any]]:
+    return [stats.to_dict() for stats in cache_stats()]
+
+
+@debug_router.get("/loop", summary="Event loop lag and code blocking it, when the loop is monitored.")
+def debug_loop() -> Optional[Dict[str, Any]]:
+    return loop_monitor_stats()
+
+
+@debug_router.get("/streams", summary="Usage statistics of the service streaming responses.")
+def debug_streams() -> Dict[str, Any]:
+    return asdict(streaming_stats())
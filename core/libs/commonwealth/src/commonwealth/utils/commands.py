@@ -1,32 +1,73 @@
+import asyncio
 import os
+import re
+import secrets
 import subprocess
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 from loguru import logger
 
+SSH_KEY_FILE = "/root/.config/.ssh/id_rsa"
+# Host connections are kept open and shared by the following commands (SSH ControlMaster), so only the first command
+# pays for the handshake and key exchange
+SSH_CONTROL_FOLDER = Path("/tmp/blueos_ssh")
+SSH_CONTROL_PERSIST_SECONDS = 600
+# Persistent connections used by the async API, the synchronous one always uses the first. Each process has its own
+# connections, so the sessions limit below holds even with every service running commands at once
+SSH_CHANNELS = 2
+# OpenSSH servers accept up to 10 sessions per connection by default (MaxSessions)
+SSH_SESSIONS_PER_CHANNEL = 10
+# Exit status of ssh itself when the connection fails, but also of commands that exit with it
+SSH_CONNECTION_ERROR = 255
+
 
 class KeyNotFound(Exception):
     """Raised when the SSH key is not found."""
 
 
-def run_command_with_password(command: str, check: bool = True) -> "subprocess.CompletedProcess['str']":
-    # attempt to run the command with sshpass
-    # used as a fallback if the ssh key is not found
+def ssh_options(channel: int = 0) -> List[str]:
+    SSH_CONTROL_FOLDER.mkdir(mode=0o700, exist_ok=True)
+    return [
+        "-o",
+        "StrictHostKeyChecking=no",
+        "-o",
+        "ControlMaster=auto",
+        "-o",
+        f"ControlPath={SSH_CONTROL_FOLDER}/%C-{os.getpid()}-{channel}",
+        "-o",
+        f"ControlPersist={SSH_CONTROL_PERSIST_SECONDS}",
+    ]
+
+
+def ssh_host() -> str:
     user = os.environ.get("SSH_USER", "pi")
+    return f"{user}@localhost"
+
+
+def ssh_with_password(channel: int = 0) -> List[str]:
+    # used as a fallback if the ssh key is not found
     password = os.environ.get("SSH_PASSWORD", "raspberry")
+    return ["sshpass", "-p", password, "ssh", *ssh_options(channel), ssh_host()]
 
+
+def ssh_with_key(channel: int = 0) -> List[str]:
+    if not Path(SSH_KEY_FILE).exists():
+        raise KeyNotFound
+    # never prompt for a password, batches of commands are sent through the standard input
+    return ["ssh", "-i", SSH_KEY_FILE, "-o", "BatchMode=yes", *ssh_options(channel), ssh_host()]
+
+
+def ssh_check_connection(channel: int = 0) -> List[str]:
+    # exits with 0 if the persistent connection of the channel is up
+    return ["ssh", *ssh_options(channel), "-O", "check", ssh_host()]
+
+
+def run_command_with_password(command: str, check: bool = True) -> "subprocess.CompletedProcess['str']":
+    # attempt to run the command with sshpass
     return subprocess.run(
-        [
-            "sshpass",
-            "-p",
-            password,
-            "ssh",
-            "-o",
-            "StrictHostKeyChecking=no",
-            f"{user}@localhost",
-            command,
-        ],
+        [*ssh_with_password(), command],
         check=check,
         text=True,
         stdout=subprocess.PIPE,
@@ -36,22 +77,8 @@ def run_command_with_password(command: str, check: bool = True) -> "subprocess.C
 
 def run_command_with_ssh_key(command: str, check: bool = True) -> "subprocess.CompletedProcess['str']":
     # attempt to run the command with the ssh key
-    user = os.environ.get("SSH_USER", "pi")
-    id_file = "/root/.config/.ssh/id_rsa"
-    if not Path(id_file).exists():
-        raise KeyNotFound
-
     return subprocess.run(
-        [
-            "sshpass",
-            "ssh",
-            "-i",
-            id_file,
-            "-o",
-            "StrictHostKeyChecking=no",
-            f"{user}@localhost",
-            command,
-        ],
+        [*ssh_with_key(), command],
         check=check,
         text=True,
         stdout=subprocess.PIPE,
@@ -59,6 +86,16 @@ def run_command_with_ssh_key(command: str, check: bool = True) -> "subprocess.Co
     )
 
 
+def log_command_result(command: str, ret: "subprocess.CompletedProcess['str']", log_output: bool = True) -> None:
+    logger.info(f"Host: '{command}' : returned {ret.returncode}")
+    if not log_output:
+        return
+    if ret.stdout:
+        logger.info(f"stdout: {ret.stdout}")
+    if ret.stderr:
+        logger.error(f"stderr: {ret.stderr}")
+
+
 def run_command(command: str, check: bool = True, log_output: bool = True) -> "subprocess.CompletedProcess['str']":
     # runs the given command on the host computer.
     # we first try with the ssh key, which is the default behavior.
@@ -70,16 +107,163 @@ def run_command(command: str, check: bool = True, log_output: bool = True) -> "s
     except Exception as error:
         logger.warning(f"Failed to run command with SSH key. {error}, trying with sshpass:\n{command}")
         ret = run_command_with_password(command, check)
-    logger.info(f"Host: '{command}' : returned {ret.returncode}")
-    if not log_output:
-        return ret
-    if ret.stdout:
-        logger.info(f"stdout: {ret.stdout}")
-    if ret.stderr:
-        logger.error(f"stderr: {ret.stderr}")
+    log_command_result(command, ret, log_output)
+    return ret
+
+
+def batch_script(commands: List[str], marker: str) -> str:
+    # each command runs in its own subshell, followed by a marker line on both outputs with its exit status.
+    # the script itself is the standard input of the shell, so commands read from /dev/null instead of consuming it
+    return "".join(
+        f"(\n{command}\n) < /dev/null\nprintf '\\n{marker} %d\\n' $?\nprintf '\\n{marker}\\n' >&2\n"
+        for command in commands
+    )
+
+
+def split_batch_output(
+    commands: List[str], marker: str, ret: "subprocess.CompletedProcess['str']"
+) -> List["subprocess.CompletedProcess['str']"]:
+    stdout_parts = re.split(rf"\n{marker} (\d+)\n", ret.stdout)
+    stderr_parts = ret.stderr.split(f"\n{marker}\n")
+    results = []
+    for index, command in enumerate(commands):
+        if 2 * index + 1 < len(stdout_parts):
+            returncode = int(stdout_parts[2 * index + 1])
+            stdout = stdout_parts[2 * index]
+            stderr = stderr_parts[index] if index < len(stderr_parts) else ""
+        else:
+            # the batch was interrupted (e.g. by a connection failure) before running this command
+            returncode = ret.returncode or SSH_CONNECTION_ERROR
+            stdout = ""
+            stderr = stderr_parts[-1]
+        results.append(subprocess.CompletedProcess(command, returncode, stdout, stderr))
+    return results
+
+
+def batch_results(
+    commands: List[str], marker: str, ret: "subprocess.CompletedProcess['str']", check: bool, log_output: bool
+) -> List["subprocess.CompletedProcess['str']"]:
+    results = split_batch_output(commands, marker, ret)
+    for result in results:
+        log_command_result(str(result.args), result, log_output)
+        if check:
+            result.check_returncode()
+    return results
+
+
+def run_commands(
+    commands: List[str], check: bool = True, log_output: bool = True
+) -> List["subprocess.CompletedProcess['str']"]:
+    """Run a sequence of commands on the host in a single SSH session.
+
+    Commands run one after the other, even if some of them fail, each one having its own result.
+    """
+    marker = f"__blueos_batch_{secrets.token_hex(8)}__"
+    script = batch_script(commands, marker)
+    # unlike run_command, the password is only tried when the key is missing or the connection failed before the
+    # first command ended, so commands are never run twice
+    try:
+        ret = subprocess.run(
+            [*ssh_with_key(), "sh"],
+            input=script,
+            check=False,
+            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if ret.returncode != SSH_CONNECTION_ERROR or marker in ret.stdout:
+            return batch_results(commands, marker, ret, check, log_output)
+        logger.warning(f"Failed to connect with SSH key. {ret.stderr}, trying with sshpass.")
+    except KeyNotFound:
+        logger.warning("SSH key not found, falling back to password authentication")
+    ret = subprocess.run(
+        [*ssh_with_password(), "sh"],
+        input=script,
+        check=False,
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return batch_results(commands, marker, ret, check, log_output)
+
+
+class SessionPool:
+    """Multiplexed SSH sessions over a few persistent host connections, balanced by number of active sessions."""
+
+    def __init__(self, channels: int = SSH_CHANNELS, sessions_per_channel: int = SSH_SESSIONS_PER_CHANNEL) -> None:
+        self._active_sessions = [0] * channels
+        self._limit = channels * sessions_per_channel
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[int]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._limit)
+        async with self._semaphore:
+            channel = self._active_sessions.index(min(self._active_sessions))
+            self._active_sessions[channel] += 1
+            try:
+                yield channel
+            finally:
+                self._active_sessions[channel] -= 1
+
+
+SESSION_POOL = SessionPool()
+
+
+async def run_process(args: List[str], input_text: Optional[str] = None) -> "subprocess.CompletedProcess['str']":
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=subprocess.PIPE if input_text is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(input_text.encode("utf-8") if input_text is not None else None)
+    assert process.returncode is not None
+    return subprocess.CompletedProcess(
+        args, process.returncode, stdout.decode("utf-8", errors="replace"), stderr.decode("utf-8", errors="replace")
+    )
+
+
+async def run_on_host_async(
+    arguments: List[str], input_text: Optional[str] = None
+) -> "subprocess.CompletedProcess['str']":
+    # unlike the synchronous API, the password is only tried when the key is missing or the connection fails, so a
+    # failing command is never run twice
+    async with SESSION_POOL.session() as channel:
+        try:
+            ret = await run_process([*ssh_with_key(channel), *arguments], input_text)
+            if ret.returncode != SSH_CONNECTION_ERROR:
+                return ret
+            # the command itself may have exited with 255, which only happens with a working connection
+            if (await run_process(ssh_check_connection(channel))).returncode == 0:
+                return ret
+            logger.warning(f"Failed to connect with SSH key. {ret.stderr}, trying with sshpass.")
+        except KeyNotFound:
+            logger.warning("SSH key not found, falling back to password authentication")
+        return await run_process([*ssh_with_password(channel), *arguments], input_text)
+
+
+async def run_command_async(
+    command: str, check: bool = True, log_output: bool = True
+) -> "subprocess.CompletedProcess['str']":
+    """Async version of `run_command`, sessions are spread over the persistent connections of SESSION_POOL."""
+    ret = await run_on_host_async([command])
+    log_command_result(command, ret, log_output)
+    if check:
+        ret.check_returncode()
     return ret
 
 
+async def run_commands_async(
+    commands: List[str], check: bool = True, log_output: bool = True
+) -> List["subprocess.CompletedProcess['str']"]:
+    """Async version of `run_commands`."""
+    marker = f"__blueos_batch_{secrets.token_hex(8)}__"
+    ret = await run_on_host_async(["sh"], batch_script(commands, marker))
+    return batch_results(commands, marker, ret, check, log_output)
+
+
 def upload_file_with_password(
     source: str, destination: str, check: bool = True
 ) -> "subprocess.CompletedProcess['str']":
@@ -94,8 +278,7 @@ def upload_file_with_password(
             "-p",
             password,
             "scp",
-            "-o",
-            "StrictHostKeyChecking=no",
+            *ssh_options(),
             source,
             f"{user}@localhost:{destination}",
         ],
@@ -109,17 +292,15 @@ def upload_file_with_password(
 def upload_file_with_ssh_key(source: str, destination: str, check: bool = True) -> "subprocess.CompletedProcess['str']":
     # attempt to upload the file with the ssh key
     user = os.environ.get("SSH_USER", "pi")
-    id_file = "/root/.config/.ssh/id_rsa"
-    if not Path(id_file).exists():
+    if not Path(SSH_KEY_FILE).exists():
         raise KeyNotFound
 
     return subprocess.run(
         [
             "scp",
             "-i",
-            id_file,
-            "-o",
-            "StrictHostKeyChecking=no",
+            SSH_KEY_FILE,
+            *ssh_options(),
             source,
             f"{user}@localhost:{destination}",
         ],
@@ -1,41 +1,340 @@
+import asyncio
 import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
 from functools import wraps
-from threading import Lock
-from typing import TypeVar
-from typing import Any, Callable, Dict
+from threading import Event, Lock
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from loguru import logger
 
 F = TypeVar("F", bound=Callable[..., Any])
 
+DEFAULT_CACHE_SIZE = 128
+
+# Separates positional from keyword arguments in cache keys
+_KWARGS_MARK = object()
+
+
+def _make_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Hashable:
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+
+
+@dataclass
+class CacheStats:
+    name: str
+    ttl_seconds: float
+    max_size: int
+    size: int = 0
+    hits: int = 0
+    # Outdated values returned while being refreshed in background
+    stale_hits: int = 0
+    misses: int = 0
+    # Misses that waited for a computation already in progress instead of starting a new one
+    coalesced: int = 0
+    evictions: int = 0
+    computations: int = 0
+    compute_time_total_ms: float = 0.0
+    compute_time_max_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        requests = self.hits + self.stale_hits + self.misses
+        return {
+            **asdict(self),
+            "hit_rate": (self.hits + self.stale_hits) / requests if requests else 0.0,
+            "compute_time_avg_ms": self.compute_time_total_ms / self.computations if self.computations else 0.0,
+        }
+
+
+class _InstrumentedCache:
+    """LRU storage shared by the cache decorators, keeping usage statistics."""
+
+    def __init__(self, function: Callable[..., Any], ttl_seconds: float, max_size: int) -> None:
+        self.function = function
+        self.max_size = max_size
+        # key -> (time information, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._stats = CacheStats(
+            name=f"{function.__module__}.{function.__qualname__}", ttl_seconds=ttl_seconds, max_size=max_size
+        )
+        _CACHES.append(self)
+
+    def _evict(self, keys: List[Hashable]) -> None:
+        for key in keys:
+            del self._entries[key]
+        self._stats.evictions += len(keys)
+
+    def _evict_least_recently_used(self) -> None:
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def _record_computation(self, started: float) -> None:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self._stats.computations += 1
+        self._stats.compute_time_total_ms += elapsed_ms
+        self._stats.compute_time_max_ms = max(self._stats.compute_time_max_ms, elapsed_ms)
+
+    def stats(self) -> CacheStats:
+        return replace(self._stats, size=len(self._entries))
+
+
+_CACHES: List[_InstrumentedCache] = []
+
+
+def cache_stats() -> List[CacheStats]:
+    """Usage statistics of every function decorated with `temporary_cache` or `async_cache`."""
+    return [cache.stats() for cache in _CACHES]
+
+
+class _Flight:
+    """Computation of a cache value, shared by every caller that missed the same key."""
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _TemporaryCache(_InstrumentedCache):
+    """Thread-safe LRU cache where each value expires after a fixed time."""
+
+    def __init__(self, function: Callable[..., Any], timeout_seconds: float, max_size: int) -> None:
+        super().__init__(function, timeout_seconds, max_size)
+        # Entries are (expiration time, value)
+        self.timeout_seconds = timeout_seconds
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = Lock()
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        self._evict([key for key, (expiration, _) in self._entries.items() if expiration <= now])
+        self._entries[key] = (now + self.timeout_seconds, value)
+        self._entries.move_to_end(key)
+        self._evict_least_recently_used()
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        key = _make_key(args, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                return entry[1]
+
+            self._stats.misses += 1
+            # Somebody else is already computing this value, wait for it instead of computing it again
+            flight = self._flights.get(key)
+            is_owner = flight is None
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self._stats.coalesced += 1
+
+        if not is_owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.monotonic()
+        try:
+            flight.value = self.function(*args, **kwargs)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                self._record_computation(started)
+                if flight.error is None:
+                    self._store(key, flight.value)
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
 
-def temporary_cache(timeout_seconds: float = 10) -> Callable[[F], F]:
+def temporary_cache(timeout_seconds: float = 10, max_size: int = DEFAULT_CACHE_SIZE) -> Callable[[F], F]:
     """Decorator that creates a cache for specific inputs with a configured timeout in seconds.
 
+    The cache is thread-safe and holds at most `max_size` values, discarding the least recently used ones.
+    Concurrent calls with the same inputs wait for a single call of the decorated function. Exceptions are not cached.
+
     Args:
         timeout_seconds (float, optional): Timeout to be used for cache invalidation. Defaults to 10.
+        max_size (int, optional): Maximum number of cached inputs. Defaults to 128.
 
     Returns:
         Any: Return of the decorated function
     """
-    cache: Dict[Any, Any] = {}
-    last_sample_time: Dict[Any, float] = {}
 
     def inner_function(function: F) -> F:
+        cache = _TemporaryCache(function, timeout_seconds, max_size)
+
         @wraps(function)
-        def wrapper(*args: Any) -> Any:
-            nonlocal last_sample_time
-            current_time = time.time()
-            cache_is_valid = args in last_sample_time and current_time - last_sample_time[args] < timeout_seconds
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return cache(*args, **kwargs)
+
+        wrapper.cache_clear = cache.clear  # type: ignore
+        wrapper.cache_stats = cache.stats  # type: ignore
+        return wrapper  # type: ignore
+
+    return inner_function
+
+
+class _AsyncCache(_InstrumentedCache):
+    """LRU cache of coroutine results, serving stale values while a background task refreshes them."""
+
+    def __init__(
+        self,
+        function: Callable[..., Awaitable[Any]],
+        ttl_seconds: float,
+        stale_seconds: float,
+        refresh_ahead_seconds: float,
+        max_size: int,
+    ) -> None:
+        super().__init__(function, ttl_seconds, max_size)
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        # Entries are (time it was computed, value)
+        self._tasks: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        # Keys being refreshed in background, without callers waiting for them
+        self._background: Set[Hashable] = set()
+        # Incremented when the cache is cleared, so computations started before are not stored
+        self._generation = 0
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        max_age = self.ttl_seconds + self.stale_seconds
+        self._evict([key for key, (computed, _) in self._entries.items() if now - computed >= max_age])
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        self._evict_least_recently_used()
+
+    async def _compute(self, key: Hashable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        generation = self._generation
+        task = asyncio.current_task()
+        try:
+            value = await self.function(*args, **kwargs)
+            if generation == self._generation:
+                self._store(key, value)
+            return value
+        finally:
+            self._record_computation(started)
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+                self._background.discard(key)
+
+    @staticmethod
+    def _retrieve_error(task: "asyncio.Task[Any]") -> None:
+        # Shared computations may fail after every caller waiting for them was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def _refresh(self, key: Hashable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> "asyncio.Task[Any]":
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, args, kwargs))
+            task.add_done_callback(self._retrieve_error)
+            self._tasks[key] = task
+        return task
+
+    def _refresh_in_background(self, key: Hashable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+        if key in self._tasks:
+            return
+
+        def log_failure(task: "asyncio.Task[Any]") -> None:
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Failed to refresh cached {self.function.__qualname__}: {task.exception()}")
+
+        self._refresh(key, args, kwargs).add_done_callback(log_failure)
+        self._background.add(key)
 
-            # The cache is still valid and we can return the value if exists
-            if cache_is_valid and args in cache:
-                return cache[args]
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        key = _make_key(args, kwargs)
+        entry = self._entries.get(key)
+        if entry is not None:
+            computed, value = entry
+            age = time.monotonic() - computed
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._entries.move_to_end(key)
+                if age >= self.ttl_seconds:
+                    self._stats.stale_hits += 1
+                else:
+                    self._stats.hits += 1
+                if age >= self.ttl_seconds - self.refresh_ahead_seconds:
+                    self._refresh_in_background(key, args, kwargs)
+                return value
 
-            # The cache is invalid or argument does not exist in cache, update it!
-            last_sample_time[args] = current_time
-            function_return = function(*args)
-            cache[args] = function_return
-            return function_return
+        self._stats.misses += 1
+        if key in self._tasks:
+            self._stats.coalesced += 1
+        # Somebody is waiting for it now, it can not be cancelled by a clear anymore
+        self._background.discard(key)
+        # Shielded, so a cancelled caller does not cancel the computation shared with other callers
+        return await asyncio.shield(self._refresh(key, args, kwargs))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generation += 1
+        # Nobody waits for background refreshes, they would only store outdated values
+        for key in self._background:
+            self._tasks.pop(key).cancel()
+        self._background.clear()
+
+
+def async_cache(
+    ttl_seconds: float = 10,
+    stale_seconds: float = 0,
+    refresh_ahead_seconds: float = 0,
+    max_size: int = DEFAULT_CACHE_SIZE,
+) -> Callable[[F], F]:
+    """Decorator that caches the results of a coroutine function for specific inputs.
+
+    Values older than `ttl_seconds` but younger than `ttl_seconds + stale_seconds` are still returned immediately,
+    while a single background task refreshes them (stale-while-revalidate). With `refresh_ahead_seconds`, the refresh
+    starts that long before the value expires, so frequently used values are never stale. Concurrent misses for the
+    same inputs wait for a single call of the decorated function. Exceptions are not cached, and failed background
+    refreshes keep the previous value.
+
+    Args:
+        ttl_seconds (float, optional): Time during which values are considered up to date. Defaults to 10.
+        stale_seconds (float, optional): Time after `ttl_seconds` to keep serving outdated values. Defaults to 0.
+        refresh_ahead_seconds (float, optional): Time before `ttl_seconds` to start refreshing values. Defaults to 0.
+        max_size (int, optional): Maximum number of cached inputs. Defaults to 128.
+
+    Returns:
+        Any: Return of the decorated function
+    """
+
+    def inner_function(function: F) -> F:
+        cache = _AsyncCache(function, ttl_seconds, stale_seconds, refresh_ahead_seconds, max_size)
+
+        @wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await cache(*args, **kwargs)
 
+        wrapper.cache_clear = cache.clear  # type: ignore
+        wrapper.cache_stats = cache.stats  # type: ignore
         return wrapper  # type: ignore
 
     return inner_function
@@ -1,12 +1,14 @@
 import asyncio
 import os
 import subprocess
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from enum import Enum
 from functools import cache
 from pathlib import Path
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, List, Optional, Set, Tuple
 
 import psutil
 from loguru import logger
@@ -14,6 +16,10 @@ from loguru import logger
 from commonwealth.utils.commands import load_file
 from commonwealth.utils.decorators import temporary_cache
 
+# Files deleted by each task of the deletion thread pool
+DELETION_BATCH_SIZE = 64
+DELETION_WORKERS = 4
+
 
 class CpuType(str, Enum):
     PI3 = "Raspberry Pi 3 (BCM2837)"
@@ -56,20 +62,50 @@ def get_host_os() -> HostOs:
     return HostOs.Other
 
 
-def delete_everything(path: Path) -> None:
-    if path.is_file() and not file_is_open(path):
-        path.unlink()
-        return
+class OpenFileIndex:
+    """Files opened by any process, taken from a single scan of /proc/*/fd.
 
-    for item in path.glob("*"):
+    Files are identified by device and inode, so every path leading to an open file is considered open.
+    If some processes can not be inspected, files not found in the index are checked with `file_is_open`.
+    """
+
+    def __init__(self, proc_path: Path = Path("/proc")) -> None:
+        self._open_files: Set[Tuple[int, int]] = set()
+        self.complete = True
+        with os.scandir(proc_path) as processes:
+            for process in processes:
+                if process.name.isdigit():
+                    self._add_process(Path(process.path, "fd"))
+        if not self.complete:
+            logger.debug("Some processes could not be inspected for open files, falling back to lsof for them.")
+
+    def _add_process(self, fd_path: Path) -> None:
         try:
-            if item.is_file() and not file_is_open(item):
-                item.unlink()
-            if item.is_dir() and not item.is_symlink():
-                # Delete folder contents
-                delete_everything(item)
-        except Exception as exception:
-            logger.warning(f"Failed to delete: {item}, {exception}")
+            with os.scandir(fd_path) as descriptors:
+                for descriptor in descriptors:
+                    try:
+                        stat = os.stat(descriptor.path)
+                    except OSError:
+                        # Closed in the meantime, or not a file
+                        continue
+                    self._open_files.add((stat.st_dev, stat.st_ino))
+        except FileNotFoundError:
+            # The process is already gone
+            pass
+        except PermissionError:
+            self.complete = False
+
+    def __len__(self) -> int:
+        return len(self._open_files)
+
+    def is_open(self, path: Path) -> bool:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        if (stat.st_dev, stat.st_ino) in self._open_files:
+            return True
+        return not self.complete and file_is_open(path)
 
 
 @dataclass
@@ -78,11 +114,75 @@ class DeletionInfo:
     size: int
     type: str
     success: bool
+    # Throughput of the whole deletion so far
+    files_per_second: float = 0.0
+    bytes_per_second: float = 0.0
 
     def to_dict(self) -> dict[str, Any]:
         return asdict(self)
 
 
+def _files_to_delete(path: Path, open_files: OpenFileIndex) -> Tuple[List[Path], List[DeletionInfo]]:
+    """Files to delete in a path, and the failures of the items that could not be inspected."""
+    if path.is_file():
+        return [] if open_files.is_open(path) else [path], []
+
+    files: List[Path] = []
+    failures: List[DeletionInfo] = []
+    for item in path.glob("*"):
+        try:
+            if item.is_file() and not open_files.is_open(item):
+                files.append(item)
+            if item.is_dir() and not item.is_symlink():
+                # Delete folder contents
+                folder_files, folder_failures = _files_to_delete(item, open_files)
+                files.extend(folder_files)
+                failures.extend(folder_failures)
+        except Exception as exception:
+            logger.warning(f"Failed to delete: {item}, {exception}")
+            failures.append(
+                DeletionInfo(path=str(item), size=0, type="directory" if item.is_dir() else "file", success=False)
+            )
+    return files, failures
+
+
+def _batches(files: List[Path]) -> List[List[Path]]:
+    return [files[start : start + DELETION_BATCH_SIZE] for start in range(0, len(files), DELETION_BATCH_SIZE)]
+
+
+def _delete_file(path: Path) -> DeletionInfo:
+    try:
+        size = path.stat().st_size
+        path.unlink()
+        return DeletionInfo(path=str(path), size=size, type="file", success=True)
+    except Exception as exception:
+        logger.warning(f"Failed to delete: {path}, {exception}")
+        return DeletionInfo(path=str(path), size=0, type="file", success=False)
+
+
+def _delete_files(files: List[Path]) -> List[DeletionInfo]:
+    return [_delete_file(file) for file in files]
+
+
+def delete_everything(path: Path, open_files: Optional[OpenFileIndex] = None) -> None:
+    """Delete all files that are not open in a path, keeping the folders.
+
+    Args:
+        path: Path to delete
+        open_files: Open files index to be used, when deleting several paths in a row
+    """
+    # Failures are only logged, while looking for the files and by each deletion
+    files, _ = _files_to_delete(path, open_files or OpenFileIndex())
+    batches = _batches(files)
+    if len(batches) <= 1:
+        # Not worth starting threads, like when a single file is deleted
+        for batch in batches:
+            _delete_files(batch)
+        return
+    with ThreadPoolExecutor(max_workers=min(DELETION_WORKERS, len(batches))) as executor:
+        list(executor.map(_delete_files, batches))
+
+
 async def delete_everything_stream(path: Path) -> AsyncGenerator[dict[str, Any], None]:
     """Delete everything in a path and yield information about each file being deleted.
 
@@ -94,64 +194,39 @@ async def delete_everything_stream(path: Path) -> AsyncGenerator[dict[str, Any],
         {
             'path': str,  # Path of the file being deleted
             'size': int,  # Size of the file in bytes
-            'type': str,  # 'file' or 'directory'
-            'success': bool  # Whether deletion was successful
+            'type': str,  # 'file', or 'directory' for folders that could not be walked
+            'success': bool,  # Whether deletion was successful
+            'files_per_second': float,  # Files deleted per second so far
+            'bytes_per_second': float,  # Bytes deleted per second so far
         }
     """
 
-    if path.is_file() and not file_is_open(path):
-        try:
-            size = path.stat().st_size
-            await asyncio.to_thread(path.unlink)
-            # fmt: off
-            yield DeletionInfo(
-                path=str(path),
-                size=size,
-                type="file",
-                success=True
-            ).to_dict()
-            # fmt: on
-        except Exception as exception:
-            logger.warning(f"Failed to delete: {path}, {exception}")
-            # fmt: off
-            yield DeletionInfo(
-                path=str(path),
-                size=0,
-                type="file",
-                success=False
-            ).to_dict()
-            # fmt: on
-        return
-
-    items = await asyncio.to_thread(lambda: list(path.glob("*")))
-
-    for item in items:
-        try:
-            if item.is_file() and not file_is_open(item):
-                size = item.stat().st_size
-                await asyncio.to_thread(item.unlink)
-                # fmt: off
-                yield DeletionInfo(
-                    path=str(item),
-                    size=size,
-                    type="file",
-                    success=True
-                ).to_dict()
-                # fmt: on
-            if item.is_dir() and not item.is_symlink():
-                # Delete folder contents
-                async for info in delete_everything_stream(item):
-                    yield info
-        except Exception as exception:
-            logger.warning(f"Failed to delete: {item}, {exception}")
-            # fmt: off
-            yield DeletionInfo(
-                path=str(item),
-                size=0,
-                type="directory" if item.is_dir() else "file",
-                success=False
-            ).to_dict()
-            # fmt: on
+    open_files = await asyncio.to_thread(OpenFileIndex)
+    files, failures = await asyncio.to_thread(_files_to_delete, path, open_files)
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=DELETION_WORKERS)
+    start = time.monotonic()
+    deleted_files = 0
+    deleted_bytes = 0
+    # Items that could not be walked are reported first, as failures
+    for info in failures:
+        yield info.to_dict()
+    try:
+        batches = [loop.run_in_executor(executor, _delete_files, batch) for batch in _batches(files)]
+        for batch in asyncio.as_completed(batches):
+            for info in await batch:
+                if info.success:
+                    deleted_files += 1
+                    deleted_bytes += info.size
+                elapsed = max(time.monotonic() - start, 1e-6)
+                info.files_per_second = deleted_files / elapsed
+                info.bytes_per_second = deleted_bytes / elapsed
+                yield info.to_dict()
+        logger.info(f"Deleted {deleted_files} files ({deleted_bytes} bytes) in {time.monotonic() - start:.2f} seconds.")
+    finally:
+        # Stop deleting if the stream is abandoned
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def file_is_open(path: Path) -> bool:
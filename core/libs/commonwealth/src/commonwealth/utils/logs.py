@@ -1,10 +1,14 @@
+import atexit
 import json
 import logging
+import queue
 from datetime import datetime, timezone
+from enum import Enum
 from logging import LogRecord
 from pathlib import Path
+from threading import Lock, Thread
 from types import FrameType
-from typing import Any, Optional, TextIO, Union, Callable
+from typing import Any, Dict, Optional, TextIO, Union
 
 import zenoh
 from loguru import logger, _handler
@@ -64,15 +68,6 @@ def get_new_log_path(service_name: str) -> Path:
     return service_log_folder.joinpath(f"logfile_{datetime_now}.log")
 
 
-def init_logger(service_name: str) -> None:
-    try:
-        validate_service_name(service_name)
-        logger.add(get_new_log_path(service_name), rotation="10 MB")
-        logger.add(create_log_sink(service_name), serialize=True)
-    except Exception as e:
-        print(f"Error: unable to set logging path: {e}")
-
-
 def stack_trace_message(error: BaseException) -> str:
     """Get string containing joined messages from all exceptions in stack trace, beginning with the most recent one."""
     message = str(error)
@@ -83,51 +78,187 @@ def stack_trace_message(error: BaseException) -> str:
     return message
 
 
-def create_log_sink(service_name: str) -> Callable[[_handler.Message], None]:
+class LogOverloadPolicy(str, Enum):
+    # Discard new records while the queue is full
+    DROP = "drop"
+    # Once the queue is half full, keep only one of every `sample_rate` records below WARNING level
+    SAMPLE = "sample"
+
+
+# Transform the message to the Foxglove log format
+# https://docs.foxglove.dev/docs/visualization/message-schemas/log
+# fmt: off
+LEVEL_MAP = {
+    "UNKNOWN": 0, # Foxglove value
+    "TRACE": 0,
+    "DEBUG": 1,
+    "INFO": 2, # Foxglove value
+    "SUCCESS": 2,
+    "WARNING": 3,
+    "ERROR": 4,
+    "FATAL": 5, # Foxglove value
+    "CRITICAL": 5,
+}
+# fmt: on
+
+LOG_QUEUE_SIZE = 1000
+LOG_BATCH_SIZE = 100
+LOG_SAMPLE_RATE = 10
+
+
+def foxglove_log(timestamp: datetime, level: int, message: str, name: str, file: str, line: int) -> Dict[str, Any]:
+    total_ns = timestamp.timestamp() * 1e9
+    return {
+        "timestamp": {"sec": total_ns // 1_000_000_000, "nsec": total_ns % 1_000_000_000},
+        "level": level,
+        "message": message,
+        "name": name,
+        "file": file,
+        "line": line,
+    }
+
+
+class ZenohLogSink:
+    """Loguru sink that publishes logs to a zenoh topic without blocking the logging code.
+
+    Records are handed to a bounded queue and drained in batches by a background thread, which publishes each one as
+    a Foxglove log. When the queue overflows, records are discarded following the overload policy and counted. After
+    that, a warning with the number of discarded records is published with the next batch.
+    """
+
+    def __init__(
+        self,
+        service_name: str,
+        max_queue_size: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        overload_policy: LogOverloadPolicy = LogOverloadPolicy.DROP,
+        sample_rate: int = LOG_SAMPLE_RATE,
+    ) -> None:
+        self.service_name = service_name
+        self.topic = f"services/{service_name}/log"
+        self.batch_size = batch_size
+        self.overload_policy = overload_policy
+        self.sample_rate = sample_rate
+        self.session = zenoh.open(zenoh.Config())
+        self.publisher = self.session.declare_publisher(self.topic)
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue_size)
+        self._sample_counter = 0
+        self._counters_lock = Lock()
+        self._counters = {"published": 0, "dropped": 0, "sampled_out": 0, "failed": 0}
+        self._unreported_discards = 0
+        self._worker = Thread(target=self._publish_loop, name=f"{service_name}-log-sink", daemon=True)
+        self._worker.start()
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._counters_lock:
+            self._counters[counter] += amount
+            if counter in ("dropped", "sampled_out"):
+                self._unreported_discards += amount
+
+    def _should_sample_out(self, level: int) -> bool:
+        if self.overload_policy != LogOverloadPolicy.SAMPLE or level >= LEVEL_MAP["WARNING"]:
+            return False
+        if self._queue.qsize() < self._queue.maxsize // 2:
+            return False
+        self._sample_counter = (self._sample_counter + 1) % self.sample_rate
+        return self._sample_counter != 0
+
+    def __call__(self, message: _handler.Message) -> None:
+        record = message.record
+        level = LEVEL_MAP.get(record["level"].name.upper(), LEVEL_MAP["UNKNOWN"])
+        if self._should_sample_out(level):
+            self._count("sampled_out")
+            return
+        log = foxglove_log(
+            record["time"], level, record["message"], record["name"], record["file"].name, record["line"]
+        )
+        try:
+            self._queue.put_nowait(log)
+        except queue.Full:
+            self._count("dropped")
+
+    def _discard_report(self) -> Optional[Dict[str, Any]]:
+        with self._counters_lock:
+            discarded = self._unreported_discards
+            self._unreported_discards = 0
+        if not discarded:
+            return None
+        return foxglove_log(
+            datetime.now(timezone.utc),
+            LEVEL_MAP["WARNING"],
+            f"{discarded} log records were discarded, log sink was overloaded.",
+            __name__,
+            Path(__file__).name,
+            0,
+        )
+
+    def _publish_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            logs = [log for log in batch if log is not None]
+            report = self._discard_report()
+            if report is not None:
+                logs.append(report)
+            # Records are drained in batches but published one by one, as subscribers expect a Foxglove log per sample
+            for log in logs:
+                try:
+                    self.publisher.put(json.dumps(log))
+                    self._count("published")
+                except Exception:
+                    self._count("failed")
+
+            if None in batch:
+                return
+
+    def stats(self) -> Dict[str, int]:
+        with self._counters_lock:
+            return {**self._counters, "queued": self._queue.qsize()}
+
+    def close(self, timeout: float = 1.0) -> None:
+        """Publish the queued records and stop the background thread."""
+        if not self._worker.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+
+
+def create_log_sink(
+    service_name: str,
+    overload_policy: LogOverloadPolicy = LogOverloadPolicy.DROP,
+    max_queue_size: int = LOG_QUEUE_SIZE,
+) -> ZenohLogSink:
     """Create a loguru sink that publishes logs to a zenoh topic.
 
     Args:
         service_name: The name of the service to use in the topic path
+        overload_policy: How records are discarded when they are logged faster than they can be published
+        max_queue_size: Number of records waiting to be published before the overload policy applies
 
     Returns:
-        A function that can be used as a loguru sink
+        A callable that can be used as a loguru sink
     """
-    session = zenoh.open(zenoh.Config())
-    topic = f"services/{service_name}/log"
-
-    def sink(message: _handler.Message) -> None:
-        # Transform the message to the Foxglove log format
-        # https://docs.foxglove.dev/docs/visualization/message-schemas/log
-
-        # fmt: off
-        LEVEL_MAP = {
-            "UNKNOWN": 0, # Foxglove value
-            "TRACE": 0,
-            "DEBUG": 1,
-            "INFO": 2, # Foxglove value
-            "SUCCESS": 2,
-            "WARNING": 3,
-            "ERROR": 4,
-            "FATAL": 5, # Foxglove value
-            "CRITICAL": 5,
-        }
+    sink = ZenohLogSink(service_name, max_queue_size=max_queue_size, overload_policy=overload_policy)
+    atexit.register(sink.close)
+    return sink
 
-        record = message.record
-        total_ns = record["time"].timestamp() * 1e9
-
-        foxglove_log = {
-            "timestamp": {
-                "sec": total_ns // 1_000_000_000,
-                "nsec": total_ns % 1_000_000_000
-            },
-            "level": LEVEL_MAP.get(record["level"].name.upper(), LEVEL_MAP["UNKNOWN"]),
-            "message": record["message"],
-            "name": record["name"],
-            "file": record["file"].name,
-            "line": record["line"],
-        }
-        # fmt: on
-
-        session.put(topic, json.dumps(foxglove_log))
 
-    return sink
+def init_logger(
+    service_name: str,
+    overload_policy: LogOverloadPolicy = LogOverloadPolicy.DROP,
+    max_queue_size: int = LOG_QUEUE_SIZE,
+) -> None:
+    try:
+        validate_service_name(service_name)
+        logger.add(get_new_log_path(service_name), rotation="10 MB")
+        logger.add(create_log_sink(service_name, overload_policy, max_queue_size), serialize=True)
+    except Exception as e:
+        print(f"Error: unable to set logging path: {e}")
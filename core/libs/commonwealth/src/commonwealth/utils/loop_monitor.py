@@ -0,0 +1,158 @@
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_BLOCK_THRESHOLD = 0.25
+# Upper bounds of the lag histogram buckets, in milliseconds, followed by an unbounded one
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_OFFENDERS = 20
+# Innermost frames of a stack identifying an offender
+OFFENDER_KEY_FRAMES = 3
+
+
+@dataclass
+class BlockingOffender:
+    stack: List[str]
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+class LoopMonitor:
+    """Measure the lag of an asyncio event loop and capture the stack of the code blocking it.
+
+    A task sleeping for `interval` measures how late it wakes up. A watchdog thread checks that this task keeps
+    running; when it does not for more than `block_threshold` seconds, the stack of the loop thread is captured,
+    as it shows what is blocking the loop at that moment.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, block_threshold: float = DEFAULT_BLOCK_THRESHOLD) -> None:
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self._lock = threading.Lock()
+        self._buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self._samples = 0
+        self._lag_total_ms = 0.0
+        self._lag_max_ms = 0.0
+        self._offenders: Dict[Tuple[str, ...], BlockingOffender] = {}
+        # Offender of the block happening right now
+        self._blocking: Optional[Tuple[str, ...]] = None
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._record_lag(max(now - expected, 0.0), now)
+
+    def _record_lag(self, lag: float, now: float) -> None:
+        lag_ms = lag * 1000
+        with self._lock:
+            self._last_tick = now
+            self._buckets[bisect.bisect_left(LAG_BUCKETS_MS, lag_ms)] += 1
+            self._samples += 1
+            self._lag_total_ms += lag_ms
+            self._lag_max_ms = max(self._lag_max_ms, lag_ms)
+            offender = self._offenders.get(self._blocking) if self._blocking else None
+            self._blocking = None
+            if offender is not None:
+                offender.total_ms += lag_ms
+                offender.max_ms = max(offender.max_ms, lag_ms)
+        if offender is not None:
+            logger.warning(f"Event loop was blocked for {lag_ms:.0f} ms at {offender.stack[-1].strip()}")
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                blocked_for = time.monotonic() - self._last_tick - self.interval
+                if blocked_for < self.block_threshold or self._blocking is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id or 0)
+                if frame is None:
+                    continue
+                stack = traceback.format_stack(frame)
+                offender = self._register_offender(stack)
+            logger.warning(
+                f"Event loop blocked for more than {blocked_for * 1000:.0f} ms, "
+                f"seen {offender.count} times, at:\n{''.join(stack)}"
+            )
+
+    def _register_offender(self, stack: List[str]) -> BlockingOffender:
+        key = tuple(stack[-OFFENDER_KEY_FRAMES:])
+        if key not in self._offenders and len(self._offenders) >= MAX_OFFENDERS:
+            least_harmful = min(self._offenders, key=lambda offender_key: self._offenders[offender_key].max_ms)
+            del self._offenders[least_harmful]
+        offender = self._offenders.setdefault(key, BlockingOffender(stack=stack))
+        offender.stack = stack
+        offender.count += 1
+        self._blocking = key
+        return offender
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histogram = [
+                {"le_ms": bound, "count": count} for bound, count in zip([*LAG_BUCKETS_MS, None], self._buckets)
+            ]
+            offenders = sorted(self._offenders.values(), key=lambda offender: offender.max_ms, reverse=True)
+            return {
+                "interval_ms": self.interval * 1000,
+                "block_threshold_ms": self.block_threshold * 1000,
+                "lag": {
+                    "samples": self._samples,
+                    "total_ms": self._lag_total_ms,
+                    "max_ms": self._lag_max_ms,
+                    "avg_ms": self._lag_total_ms / self._samples if self._samples else 0.0,
+                    "histogram": histogram,
+                },
+                "offenders": [asdict(offender) for offender in offenders],
+            }
+
+
+_MONITOR: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor(
+    interval: float = DEFAULT_INTERVAL, block_threshold: float = DEFAULT_BLOCK_THRESHOLD
+) -> LoopMonitor:
+    """Start monitoring the running event loop, statistics are available on /debug/loop."""
+    global _MONITOR  # pylint: disable=global-statement
+    if _MONITOR is None:
+        _MONITOR = LoopMonitor(interval, block_threshold)
+    _MONITOR.start()
+    return _MONITOR
+
+
+def loop_monitor_stats() -> Optional[Dict[str, Any]]:
+    return _MONITOR.stats() if _MONITOR is not None else None
@@ -0,0 +1,202 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from commonwealth.utils.loop_monitor import LAG_BUCKETS_MS, loop_monitor_stats
+
+# Upper bounds of the request duration histogram buckets, in seconds
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Route label of requests not handled by an API route (e.g. static files or not found), to keep the number of series
+# bounded
+UNMATCHED_ROUTE = "unmatched"
+
+# (method, route, status code)
+SeriesKey = Tuple[str, str, str]
+
+
+@dataclass
+class _RequestSeries:
+    count: int = 0
+    duration_sum: float = 0.0
+    # Not cumulative, with a last unbounded bucket
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(REQUEST_DURATION_BUCKETS) + 1))
+
+
+class RequestMetrics:
+    """Count, duration and status of the HTTP requests handled by the service."""
+
+    def __init__(self) -> None:
+        self._series: Dict[SeriesKey, _RequestSeries] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status_code: int, duration: float) -> None:
+        series = self._series.setdefault((method, route, str(status_code)), _RequestSeries())
+        series.count += 1
+        series.duration_sum += duration
+        for index, bound in enumerate(REQUEST_DURATION_BUCKETS):
+            if duration <= bound:
+                series.buckets[index] += 1
+                break
+        else:
+            series.buckets[-1] += 1
+
+    def series(self) -> Dict[SeriesKey, _RequestSeries]:
+        return dict(self._series)
+
+
+REQUEST_METRICS = RequestMetrics()
+
+
+def _route_label(scope: Scope) -> str:
+    # Set by FastAPI when a route matches, templates are used instead of paths to keep the number of series bounded
+    path: Optional[str] = getattr(scope.get("route"), "path", None)
+    if path is None:
+        return UNMATCHED_ROUTE
+    return f"{scope.get('root_path', '')}{path}"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the requests handled by an application in REQUEST_METRICS."""
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = REQUEST_METRICS) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Requests failing before a response is started end up as internal errors
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            self.metrics.observe(scope["method"], _route_label(scope), status_code, time.perf_counter() - start)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _metric(lines: List[str], name: str, metric_type: str, description: str) -> None:
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def _histogram(
+    lines: List[str], name: str, bounds: List[float], buckets: List[int], total: float, **labels: Any
+) -> None:
+    cumulative = 0
+    for bound, count in zip([*bounds, "+Inf"], buckets):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels) if labels else ''} {total}")
+    lines.append(f"{name}_count{_labels(**labels) if labels else ''} {cumulative}")
+
+
+def _process_metrics(lines: List[str]) -> None:
+    process = psutil.Process()
+    with process.oneshot():
+        cpu_times = process.cpu_times()
+        values = [
+            (
+                "process_cpu_seconds_total",
+                "counter",
+                "Total user and system CPU time in seconds.",
+                cpu_times.user + cpu_times.system,
+            ),
+            ("process_resident_memory_bytes", "gauge", "Resident memory size in bytes.", process.memory_info().rss),
+            ("process_open_fds", "gauge", "Number of open file descriptors.", process.num_fds()),
+            ("process_threads", "gauge", "Number of OS threads.", process.num_threads()),
+            (
+                "process_start_time_seconds",
+                "gauge",
+                "Start time of the process since unix epoch.",
+                process.create_time(),
+            ),
+        ]
+    for name, metric_type, description, value in values:
+        _metric(lines, name, metric_type, description)
+        lines.append(f"{name} {value}")
+
+
+def render_metrics(metrics: RequestMetrics = REQUEST_METRICS) -> str:
+    """Request, process and event loop metrics in Prometheus text format."""
+    lines: List[str] = []
+    series = sorted(metrics.series().items())
+
+    _metric(lines, "blueos_http_requests_total", "counter", "HTTP requests handled.")
+    for (method, route, status_code), values in series:
+        lines.append(
+            f"blueos_http_requests_total{_labels(method=method, route=route, status=status_code)} {values.count}"
+        )
+
+    _metric(lines, "blueos_http_request_duration_seconds", "histogram", "Time to handle HTTP requests in seconds.")
+    for (method, route, status_code), values in series:
+        _histogram(
+            lines,
+            "blueos_http_request_duration_seconds",
+            list(REQUEST_DURATION_BUCKETS),
+            values.buckets,
+            values.duration_sum,
+            method=method,
+            route=route,
+            status=status_code,
+        )
+
+    _metric(lines, "blueos_http_requests_in_flight", "gauge", "HTTP requests being handled.")
+    lines.append(f"blueos_http_requests_in_flight {metrics.in_flight}")
+
+    _process_metrics(lines)
+
+    loop_stats = loop_monitor_stats()
+    if loop_stats is not None:
+        lag = loop_stats["lag"]
+        _metric(lines, "blueos_event_loop_lag_seconds", "histogram", "Event loop lag in seconds.")
+        _histogram(
+            lines,
+            "blueos_event_loop_lag_seconds",
+            [bound / 1000 for bound in LAG_BUCKETS_MS],
+            [bucket["count"] for bucket in lag["histogram"]],
+            lag["total_ms"] / 1000,
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+metrics_router = APIRouter(tags=["metrics"])
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, summary="Service metrics in Prometheus format.")
+def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+def setup_metrics(app: FastAPI) -> None:
+    """Record the requests of a service application and serve its metrics on /metrics.
+
+    Should be called on the application served, after versioning.
+    """
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
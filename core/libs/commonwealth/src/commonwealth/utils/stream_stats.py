@@ -0,0 +1,24 @@
+from dataclasses import dataclass, replace
+
+
+@dataclass
+class StreamingStats:
+    # Streams being sent right now
+    active: int = 0
+    # Streams sent until their end
+    completed: int = 0
+    # Streams whose client went away before their end
+    abandoned: int = 0
+    # Times a producer had to wait for its client to consume the queued responses
+    producer_suspensions: int = 0
+    # Responses waiting to be sent, over all active streams
+    queued: int = 0
+    max_queue_depth: int = 0
+
+
+# Updated by the streaming responses of the service
+STREAMING_STATS = StreamingStats()
+
+
+def streaming_stats() -> StreamingStats:
+    return replace(STREAMING_STATS)
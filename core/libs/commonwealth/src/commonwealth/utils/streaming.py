@@ -1,12 +1,16 @@
 import asyncio
 import base64
 import json
+import struct
+from collections import deque
 from dataclasses import asdict, dataclass
-from typing import AsyncGenerator, Optional, Tuple
+from enum import Enum
+from typing import Any, AsyncGenerator, Deque, Generic, Optional, Tuple, TypeVar
 
 from fastapi import status
 
 from commonwealth.utils.apis import StackedHTTPException
+from commonwealth.utils.stream_stats import STREAMING_STATS
 
 
 @dataclass
@@ -17,112 +21,259 @@ class StreamingResponse:
     error: Optional[str] = None
 
 
+class StreamFraming(str, Enum):
+    # JSON objects with base64 encoded data, separated by "|\n\n|"
+    JSON = "json"
+    # Records with a big-endian header (fragment: int32, status: uint16, length: uint32) followed by the raw data,
+    # or by the UTF-8 encoded error message when status is not 200
+    BINARY = "binary"
+
+
+BINARY_STREAM_MEDIA_TYPE = "application/vnd.blueos.stream"
+BINARY_RECORD_HEADER = struct.Struct(">iHI")
+# Responses buffered for a client before suspending the stream producer
+DEFAULT_HIGH_WATER_MARK = 64
+
+T = TypeVar("T")
+
+
+def stream_framing(accept: Optional[str]) -> StreamFraming:
+    """Framing requested by a client 'Accept' header, the JSON framing is used unless binary is explicitly accepted."""
+    if accept and BINARY_STREAM_MEDIA_TYPE in accept:
+        return StreamFraming.BINARY
+    return StreamFraming.JSON
+
+
+def stream_media_type(framing: StreamFraming, default: Optional[str] = None) -> Optional[str]:
+    """Media type of a stream response, `default` being the one used for the JSON framing."""
+    return BINARY_STREAM_MEDIA_TYPE if framing == StreamFraming.BINARY else default
+
+
 def response_line(response: StreamingResponse) -> str:
     return json.dumps(asdict(response)) + "|\n\n|"
 
 
-def streaming_timeout_exception(fragment: int) -> str:
-    return response_line(
-        StreamingResponse(fragment=fragment, data=None, status=status.HTTP_408_REQUEST_TIMEOUT, error="Timeout reached")
-    )
+def response_record(fragment: int, status_code: int, payload: bytes) -> bytes:
+    return BINARY_RECORD_HEADER.pack(fragment, status_code, len(payload)) + payload
+
 
+def streaming_error(
+    fragment: int, status_code: int, error: str, framing: StreamFraming = StreamFraming.JSON
+) -> str | bytes:
+    if framing == StreamFraming.BINARY:
+        return response_record(fragment, status_code, error.encode("utf-8"))
+    return response_line(StreamingResponse(fragment=fragment, data=None, status=status_code, error=error))
 
-def streaming_error_exception(fragment: int, error: Exception) -> str:
-    return response_line(
-        StreamingResponse(fragment=fragment, data=None, status=status.HTTP_500_INTERNAL_SERVER_ERROR, error=str(error))
-    )
 
+def streaming_timeout_exception(fragment: int, framing: StreamFraming = StreamFraming.JSON) -> str | bytes:
+    return streaming_error(fragment, status.HTTP_408_REQUEST_TIMEOUT, "Timeout reached", framing)
 
-def streaming_stack_exception(fragment: int, error: StackedHTTPException) -> str:
-    return response_line(StreamingResponse(fragment=fragment, data=None, status=error.status_code, error=error.detail))
 
+def streaming_error_exception(
+    fragment: int, error: Exception, framing: StreamFraming = StreamFraming.JSON
+) -> str | bytes:
+    return streaming_error(fragment, status.HTTP_500_INTERNAL_SERVER_ERROR, str(error), framing)
 
-def streaming_response(fragment: int, data: str | bytes) -> str:
+
+def streaming_stack_exception(
+    fragment: int, error: StackedHTTPException, framing: StreamFraming = StreamFraming.JSON
+) -> str | bytes:
+    return streaming_error(fragment, error.status_code, error.detail, framing)
+
+
+def streaming_response(fragment: int, data: str | bytes, framing: StreamFraming = StreamFraming.JSON) -> str | bytes:
     buffer = data.encode("utf-8") if isinstance(data, str) else data
+    if framing == StreamFraming.BINARY:
+        return response_record(fragment, status.HTTP_200_OK, buffer)
     data_encoded = base64.b64encode(buffer).decode()
     return response_line(StreamingResponse(fragment=fragment, data=data_encoded, status=status.HTTP_200_OK))
 
 
-async def streamer(gen: AsyncGenerator[str | bytes, None], heartbeats: float = -1.0) -> AsyncGenerator[str, None]:
+class _StreamBuffer(Generic[T]):
+    """Responses waiting to be sent to a client.
+
+    Producers are suspended once the buffer reaches its high-water mark, until the client consumes it down to the
+    low-water mark. After closing, everything put in the buffer is discarded.
+    """
+
+    def __init__(self, high_water_mark: int, low_water_mark: Optional[int] = None) -> None:
+        if low_water_mark is None:
+            low_water_mark = high_water_mark // 2
+        if high_water_mark < 1 or not 0 <= low_water_mark < high_water_mark:
+            raise ValueError(f"Invalid water marks: high {high_water_mark}, low {low_water_mark}.")
+        self.high_water_mark = high_water_mark
+        self.low_water_mark = low_water_mark
+        self._items: Deque[T] = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def put(self, item: T) -> None:
+        if not self._writable.is_set():
+            STREAMING_STATS.producer_suspensions += 1
+            await self._writable.wait()
+        self.put_nowait(item)
+
+    def put_nowait(self, item: T) -> None:
+        """Put an item ignoring the high-water mark, used for items that should never wait (e.g. end of stream)."""
+        if self._closed:
+            return
+        self._items.append(item)
+        STREAMING_STATS.queued += 1
+        STREAMING_STATS.max_queue_depth = max(STREAMING_STATS.max_queue_depth, len(self._items))
+        if len(self._items) >= self.high_water_mark:
+            self._writable.clear()
+        self._readable.set()
+
+    async def get(self) -> T:
+        while not self._items:
+            self._readable.clear()
+            await self._readable.wait()
+        item = self._items.popleft()
+        STREAMING_STATS.queued -= 1
+        if len(self._items) <= self.low_water_mark:
+            self._writable.set()
+        return item
+
+    def close(self) -> None:
+        self._closed = True
+        STREAMING_STATS.queued -= len(self._items)
+        self._items.clear()
+        self._writable.set()
+
+
+def _finish_stream(completed: bool, buffer: _StreamBuffer[Any], *tasks: Optional["asyncio.Task[None]"]) -> None:
+    STREAMING_STATS.active -= 1
+    if completed:
+        STREAMING_STATS.completed += 1
+    else:
+        STREAMING_STATS.abandoned += 1
+    for task in tasks:
+        if task is not None:
+            task.cancel()
+    buffer.close()
+
+
+async def streamer(
+    gen: AsyncGenerator[str | bytes, None],
+    heartbeats: float = -1.0,
+    framing: StreamFraming = StreamFraming.JSON,
+    high_water_mark: int = DEFAULT_HIGH_WATER_MARK,
+    low_water_mark: Optional[int] = None,
+    cancel_on_disconnect: bool = True,
+) -> AsyncGenerator[str | bytes, None]:
     """
     Streamer wrapper for async generators and provide a consistent response format
-    with error handling. Data is encoded in base64 to avoid any new line jsons conflicts.
+    with error handling. With the default JSON framing, data is encoded in base64 to
+    avoid any new line jsons conflicts, the binary framing sends it as is.
+
+    The generator is consumed ahead of the client up to `high_water_mark` responses, then
+    suspended until the client catches up to `low_water_mark` (half of the high one by default).
+    If the client goes away, the generator is closed, unless `cancel_on_disconnect` is False,
+    for operations that should run until the end anyway (e.g. an installation).
     """
 
-    async def send_heartbeat(period: float, queue: asyncio.Queue[Optional[str]]) -> None:
+    buffer: _StreamBuffer[Optional[str | bytes]] = _StreamBuffer(high_water_mark, low_water_mark)
+
+    async def send_heartbeat(period: float) -> None:
         while True:
             await asyncio.sleep(period)
-            await queue.put(streaming_response(-1, "heartbeat"))
-
-    queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+            # Queued responses keep the connection alive as well
+            if not buffer:
+                buffer.put_nowait(streaming_response(-1, "heartbeat", framing))
 
     if heartbeats > 0:
-        heartbeat_task = asyncio.create_task(send_heartbeat(heartbeats, queue))
+        heartbeat_task = asyncio.create_task(send_heartbeat(heartbeats))
     else:
         heartbeat_task = None
 
-    async def generator_wrapper(gen: AsyncGenerator[str | bytes, None], queue: asyncio.Queue[Optional[str]]) -> None:
+    async def generator_wrapper(gen: AsyncGenerator[str | bytes, None]) -> None:
         fragment = 0
         try:
             async for data in gen:
-                await queue.put(streaming_response(fragment, data))
+                await buffer.put(streaming_response(fragment, data, framing))
                 fragment += 1
         except StackedHTTPException as e:
-            await queue.put(streaming_stack_exception(fragment, e))
+            buffer.put_nowait(streaming_stack_exception(fragment, e, framing))
         except Exception as e:
-            await queue.put(streaming_error_exception(fragment, e))
+            buffer.put_nowait(streaming_error_exception(fragment, e, framing))
         finally:
             if heartbeat_task:
                 heartbeat_task.cancel()
-            await queue.put(None)
+            buffer.put_nowait(None)
+            await gen.aclose()
 
-    asyncio.create_task(generator_wrapper(gen, queue))
+    producer_task = asyncio.create_task(generator_wrapper(gen))
+    STREAMING_STATS.active += 1
 
-    while True:
-        item = await queue.get()
-        if item is None:
-            break
-        yield item
+    completed = False
+    try:
+        while True:
+            item = await buffer.get()
+            if item is None:
+                break
+            yield item
+        completed = True
+    finally:
+        _finish_stream(completed, buffer, heartbeat_task, producer_task if cancel_on_disconnect else None)
 
 
 async def _fetch_stream(
-    gen: AsyncGenerator[str | bytes, None], queue: asyncio.Queue[Optional[Tuple[str | bytes | None, Exception | None]]]
+    gen: AsyncGenerator[str | bytes, None],
+    buffer: _StreamBuffer[Tuple[str | bytes | None, Exception | None]],
 ) -> None:
     try:
         async for data in gen:
-            await queue.put((data, None))
+            await buffer.put((data, None))
     except Exception as e:
-        await queue.put((None, e))
+        buffer.put_nowait((None, e))
     finally:
-        await queue.put((None, None))
+        buffer.put_nowait((None, None))
+        await gen.aclose()
 
 
-async def timeout_streamer(gen: AsyncGenerator[str | bytes, None], timeout: int = 3) -> AsyncGenerator[str, None]:
+async def timeout_streamer(
+    gen: AsyncGenerator[str | bytes, None],
+    timeout: int = 3,
+    framing: StreamFraming = StreamFraming.JSON,
+    high_water_mark: int = DEFAULT_HIGH_WATER_MARK,
+    low_water_mark: Optional[int] = None,
+) -> AsyncGenerator[str | bytes, None]:
     """
     Streamer wrapper for async generators and provide a consistent response format
     with error handling with additional timeout limit for each item iteration.
-    Data is encoded in base64 to avoid any new line jsons conflicts.
+    Data is framed and buffered like in `streamer`.
     """
 
-    queue: asyncio.Queue[Optional[Tuple[str | bytes | None, Exception | None]]] = asyncio.Queue()
-    task = asyncio.create_task(_fetch_stream(gen, queue))
+    buffer: _StreamBuffer[Tuple[str | bytes | None, Exception | None]] = _StreamBuffer(high_water_mark, low_water_mark)
+    task = asyncio.create_task(_fetch_stream(gen, buffer))
+    STREAMING_STATS.active += 1
 
     fragment = 0
+    completed = False
     try:
         while True:
-            item = await asyncio.wait_for(queue.get(), timeout=timeout)
-            data, error = item if item else (None, None)
-            if error:
-                raise error
+            try:
+                data, error = await asyncio.wait_for(buffer.get(), timeout=timeout)
+                if error:
+                    raise error
+            except asyncio.TimeoutError:
+                yield streaming_timeout_exception(fragment, framing)
+                break
+            except StackedHTTPException as e:
+                yield streaming_stack_exception(fragment, e, framing)
+                break
+            except Exception as e:
+                yield streaming_error_exception(fragment, e, framing)
+                break
             if data is None:
                 break
-            yield streaming_response(fragment, data)
+            yield streaming_response(fragment, data, framing)
             fragment += 1
-    except asyncio.TimeoutError:
-        yield streaming_timeout_exception(fragment)
-    except StackedHTTPException as e:
-        yield streaming_stack_exception(fragment, e)
-    except Exception as e:
-        yield streaming_error_exception(fragment, e)
+        completed = True
     finally:
-        task.cancel()
+        _finish_stream(completed, buffer, task)
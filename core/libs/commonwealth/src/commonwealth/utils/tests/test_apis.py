@@ -0,0 +1,74 @@
+import json
+from typing import Any, Dict, List, MutableMapping
+
+import pytest
+from fastapi import Request
+
+from ..apis import ConditionalRoute, FastJSONResponse, StateVersion, conditional
+
+CONTENT = {"name": "ação", "ports": [80, 8080], "enabled": True, "extra": None}
+
+
+async def send_response(response: FastJSONResponse, query_string: bytes) -> Dict[str, Any]:
+    messages: List[MutableMapping[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request"}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        messages.append(message)
+
+    await response({"type": "http", "query_string": query_string}, receive, send)
+    return {"headers": dict(messages[0]["headers"]), "body": messages[1]["body"]}
+
+
+@pytest.mark.asyncio
+async def test_fast_json_response() -> None:
+    compact = await send_response(FastJSONResponse(CONTENT), b"")
+    assert compact["body"] == json.dumps(CONTENT, ensure_ascii=False, separators=(",", ":")).encode()
+    assert compact["headers"][b"content-length"] == str(len(compact["body"])).encode()
+
+    for query_string in [b"pretty", b"pretty=true", b"offset=2&pretty=1"]:
+        pretty = await send_response(FastJSONResponse(CONTENT), query_string)
+        assert pretty["body"].startswith(b'{\n  "name": "a\xc3\xa7\xc3\xa3o"')
+        assert json.loads(pretty["body"]) == CONTENT
+        assert pretty["headers"][b"content-length"] == str(len(pretty["body"])).encode()
+
+    not_pretty = await send_response(FastJSONResponse(CONTENT), b"pretty=false")
+    assert not_pretty["body"] == compact["body"]
+
+
+async def get(route: ConditionalRoute, if_none_match: str | None = None) -> Any:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    scope = {"type": "http", "method": "GET", "path": route.path, "query_string": b"", "headers": headers}
+    return await route.get_route_handler()(Request(scope))
+
+
+@pytest.mark.asyncio
+async def test_conditional_route() -> None:
+    calls: List[int] = []
+
+    def services() -> Any:
+        calls.append(1)
+        return CONTENT
+
+    route = ConditionalRoute("/services", services, response_class=FastJSONResponse)
+    response = await get(route)
+    etag = response.headers["etag"]
+    assert response.status_code == 200 and etag.startswith('W/"')
+    not_modified = await get(route, f'"other", {etag}')
+    assert not_modified.status_code == 304 and not not_modified.body and not_modified.headers["etag"] == etag
+
+    # Endpoints depending on a state version are not called while it does not change
+    state_version = StateVersion()
+    versioned_route = ConditionalRoute(
+        "/versioned", conditional(state_version)(services), response_class=FastJSONResponse
+    )
+    calls.clear()
+    etag = (await get(versioned_route)).headers["etag"]
+    assert (await get(versioned_route, etag)).status_code == 304
+    assert len(calls) == 1
+    state_version.bump()
+    changed = await get(versioned_route, etag)
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert len(calls) == 2
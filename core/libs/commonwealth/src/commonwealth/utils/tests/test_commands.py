@@ -0,0 +1,110 @@
+import re
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from .. import commands
+
+
+def test_batch_output_is_split_by_command() -> None:
+    batch = ["echo first", "printf 'no newline'; echo error >&2; exit 3", "cd /; pwd", "pwd >&2"]
+    marker = "__test_marker__"
+    # The batch script runs on a local shell, as it would on the host through SSH
+    ret = subprocess.run(
+        ["sh"],
+        input=commands.batch_script(batch, marker),
+        check=False,
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd="/tmp",
+    )
+    results = commands.split_batch_output(batch, marker, ret)
+    assert [result.args for result in results] == batch
+    assert [result.returncode for result in results] == [0, 3, 0, 0]
+    assert [result.stdout for result in results] == ["first\n", "no newline", "/\n", ""]
+    # Commands run isolated from each other, like in separate sessions
+    assert [result.stderr for result in results] == ["", "error\n", "", "/tmp\n"]
+
+    interrupted = subprocess.CompletedProcess(["sh"], 255, f"first\n\n{marker} 0\nno", "Connection closed")
+    results = commands.split_batch_output(batch, marker, interrupted)
+    assert [result.returncode for result in results] == [0, 255, 255, 255]
+
+
+def test_batch_commands_do_not_read_the_script() -> None:
+    # The shell reads its script in chunks, so the following commands must not fit in the first one
+    batch = ["cat", "echo after # " + "padding" * 10000]
+    marker = "__test_marker__"
+    ret = subprocess.run(
+        ["sh"],
+        input=commands.batch_script(batch, marker),
+        check=False,
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    results = commands.split_batch_output(batch, marker, ret)
+    assert [result.returncode for result in results] == [0, 0]
+    assert [result.stdout for result in results] == ["", "after\n"]
+
+
+def test_batch_is_only_sent_again_when_no_command_ran(monkeypatch: pytest.MonkeyPatch) -> None:
+    batch = ["echo first", "echo second"]
+    calls: List[str] = []
+    outputs: Dict[str, str] = {}
+
+    def run(args: List[str], **kwargs: Any) -> "subprocess.CompletedProcess[str]":
+        calls.append(args[0])
+        marker = re.findall(r"__blueos_batch_\w+__", kwargs["input"])[0]
+        if args[0] == "sshpass":
+            return subprocess.CompletedProcess(args, 0, f"first\n\n{marker} 0\nsecond\n\n{marker} 0\n", "")
+        return subprocess.CompletedProcess(args, 255, outputs["ssh"].format(marker=marker), "Connection closed")
+
+    monkeypatch.setattr(commands, "ssh_with_key", lambda: ["ssh"])
+    monkeypatch.setattr(commands, "ssh_with_password", lambda: ["sshpass"])
+    monkeypatch.setattr(subprocess, "run", run)
+
+    # The connection drops after the first command, which must not run twice
+    outputs["ssh"] = "first\n\n{marker} 0\n"
+    results = commands.run_commands(batch, check=False, log_output=False)
+    assert calls == ["ssh"]
+    assert [result.returncode for result in results] == [0, 255]
+
+    # The connection fails before running anything
+    calls.clear()
+    outputs["ssh"] = ""
+    results = commands.run_commands(batch, check=False, log_output=False)
+    assert calls == ["ssh", "sshpass"]
+    assert [result.returncode for result in results] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_commands_exiting_like_ssh_are_not_run_again(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: List[str] = []
+    connection_up = True
+
+    async def run_process(args: List[str], _input_text: Optional[str] = None) -> "subprocess.CompletedProcess[str]":
+        calls.append(args[0])
+        if args[0] == "check":
+            return subprocess.CompletedProcess(args, 0 if connection_up else 255, "", "")
+        if args[0] == "sshpass":
+            return subprocess.CompletedProcess(args, 0, "", "")
+        return subprocess.CompletedProcess(args, 255, "", "")
+
+    monkeypatch.setattr(commands, "ssh_with_key", lambda channel: ["ssh"])
+    monkeypatch.setattr(commands, "ssh_with_password", lambda channel: ["sshpass"])
+    monkeypatch.setattr(commands, "ssh_check_connection", lambda channel: ["check"])
+    monkeypatch.setattr(commands, "run_process", run_process)
+
+    # The command exited with 255 over a working connection
+    ret = await commands.run_on_host_async(["exit 255"])
+    assert ret.returncode == 255
+    assert calls == ["ssh", "check"]
+
+    # The connection failed
+    calls.clear()
+    connection_up = False
+    ret = await commands.run_on_host_async(["true"])
+    assert ret.returncode == 0
+    assert calls == ["ssh", "check", "sshpass"]
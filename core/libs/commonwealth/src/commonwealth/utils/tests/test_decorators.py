@@ -1,6 +1,11 @@
+import asyncio
+import gc
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import pytest
+
 from .. import decorators
 
 CACHE_TIME = 0.3
@@ -24,3 +29,106 @@ def test_nested_settings_save_load() -> None:
 
     # Check if all cache values are invalid after waiting for a long time
     assert all(original_output[key] != cached_function(key) for key in inputs)
+
+
+def test_temporary_cache_size_and_kwargs() -> None:
+    calls = []
+
+    @decorators.temporary_cache(timeout_seconds=10, max_size=2)
+    def add(first: int, second: int = 0) -> int:
+        calls.append((first, second))
+        return first + second
+
+    assert add(1) == 1
+    assert add(1, second=2) == 3
+    assert add(1, second=2) == 3
+    assert calls == [(1, 0), (1, 2)]
+
+    # Least recently used input is discarded when the cache is full
+    add(1)
+    add(2)
+    add(1, second=2)
+    assert calls[-1] == (1, 2)
+
+
+def test_temporary_cache_single_flight() -> None:
+    calls = []
+
+    @decorators.temporary_cache(timeout_seconds=10)
+    def slow_function(entry: str) -> str:
+        calls.append(entry)
+        time.sleep(0.2)
+        return entry.upper()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(slow_function, ["entry"] * 4))
+
+    assert results == ["ENTRY"] * 4
+    assert calls == ["entry"]
+
+
+@pytest.mark.asyncio
+async def test_async_cache_stale_while_revalidate() -> None:
+    calls = []
+
+    @decorators.async_cache(ttl_seconds=CACHE_TIME, stale_seconds=10)
+    async def slow_function(entry: str) -> int:
+        calls.append(entry)
+        await asyncio.sleep(0.1)
+        return len(calls)
+
+    # Concurrent misses wait for a single call
+    assert await asyncio.gather(*[slow_function("entry") for _ in range(4)]) == [1] * 4
+
+    # Outdated values are returned immediately while they are refreshed in background
+    await asyncio.sleep(CACHE_WAIT_TIME)
+    assert await slow_function("entry") == 1
+    assert await slow_function("entry") == 1
+    await asyncio.sleep(0.2)
+    assert await slow_function("entry") == 2
+    assert calls == ["entry", "entry"]
+
+
+@pytest.mark.asyncio
+async def test_async_cache_clear_and_abandoned_failures() -> None:
+    errors = []
+    asyncio.get_running_loop().set_exception_handler(lambda _loop, context: errors.append(context))
+    values = iter(range(100))
+
+    @decorators.async_cache(ttl_seconds=CACHE_TIME, refresh_ahead_seconds=CACHE_TIME)
+    async def refreshed_function() -> int:
+        await asyncio.sleep(0.1)
+        return next(values)
+
+    # Every use starts a refresh, which is cancelled by a clear instead of storing an outdated value
+    assert await refreshed_function() == 0
+    assert await refreshed_function() == 0
+    refreshed_function.cache_clear()  # type: ignore
+    await asyncio.sleep(0.2)
+    assert await refreshed_function() == 1
+
+    @decorators.async_cache(ttl_seconds=CACHE_TIME)
+    async def failing_function() -> None:
+        await asyncio.sleep(0.05)
+        raise RuntimeError("failed")
+
+    # The computation fails after its only caller was cancelled
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(failing_function(), 0.01)
+    await asyncio.sleep(0.1)
+    gc.collect()
+    assert not errors
+
+
+def test_cache_stats() -> None:
+    @decorators.temporary_cache(timeout_seconds=10, max_size=1)
+    def square(value: int) -> int:
+        return value * value
+
+    for value in [1, 1, 2, 1]:
+        square(value)
+
+    stats = square.cache_stats()  # type: ignore
+    assert (stats.hits, stats.misses, stats.evictions, stats.computations, stats.size) == (1, 3, 2, 3, 1)
+    assert stats.to_dict()["hit_rate"] == 0.25
+    assert any(cache.name.endswith("test_cache_stats.<locals>.square") for cache in decorators.cache_stats())
@@ -0,0 +1,70 @@
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from .. import general
+
+
+def create_tree(root: Path) -> List[Path]:
+    files = []
+    for folder in ["", "a", "a/b", "c"]:
+        (root / folder).mkdir(parents=True, exist_ok=True)
+        for index in range(50):
+            file = root / folder / f"{index}.log"
+            file.write_text("x" * index)
+            files.append(file)
+    return files
+
+
+@pytest.mark.asyncio
+async def test_delete_everything_stream(tmp_path: Path) -> None:
+    files = create_tree(tmp_path)
+    (tmp_path / "link").symlink_to(tmp_path / "c", target_is_directory=True)
+
+    with open(files[7], "rb"):
+        open_files = general.OpenFileIndex()
+        assert open_files.is_open(files[7]) and not open_files.is_open(files[8])
+
+        infos: List[Dict[str, Any]] = [info async for info in general.delete_everything_stream(tmp_path)]
+
+    assert len(infos) == len(files) - 1 and all(info["success"] for info in infos)
+    assert sum(info["size"] for info in infos) == 4 * sum(range(50)) - 7
+    assert infos[-1]["files_per_second"] > 0 and infos[-1]["bytes_per_second"] > 0
+    # Open files, folders and symbolic links to folders are kept
+    assert [file for file in files if file.exists()] == [files[7]]
+    assert (tmp_path / "a" / "b").is_dir() and (tmp_path / "link").is_symlink()
+
+    general.delete_everything(tmp_path)
+    assert not files[7].exists()
+
+
+@pytest.mark.asyncio
+async def test_delete_everything_stream_reports_folders_not_walked(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    files = create_tree(tmp_path)
+    glob = Path.glob
+
+    def unreadable_glob(path: Path, pattern: str) -> Any:
+        if path.name == "b":
+            raise PermissionError("Permission denied")
+        return glob(path, pattern)
+
+    monkeypatch.setattr(Path, "glob", unreadable_glob)
+    infos: List[Dict[str, Any]] = [info async for info in general.delete_everything_stream(tmp_path)]
+
+    failures = [info for info in infos if not info["success"]]
+    assert failures == [
+        {
+            "path": str(tmp_path / "a" / "b"),
+            "size": 0,
+            "type": "directory",
+            "success": False,
+            "files_per_second": 0.0,
+            "bytes_per_second": 0.0,
+        }
+    ]
+    # Everything else is still deleted
+    assert len(infos) == len(files) - 50 + 1
+    assert [file for file in files if file.exists()] == [file for file in files if file.parent.name == "b"]
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+import pytest
+
+from ..loop_monitor import LoopMonitor
+
+
+def blocking_call() -> None:
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor() -> None:
+    monitor = LoopMonitor(interval=0.02, block_threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        blocking_call()
+        await asyncio.sleep(0.1)
+    finally:
+        monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["lag"]["samples"] > 0
+    assert stats["lag"]["max_ms"] >= 250
+    assert sum(bucket["count"] for bucket in stats["lag"]["histogram"]) == stats["lag"]["samples"]
+    [offender] = stats["offenders"]
+    assert offender["count"] == 1 and offender["max_ms"] >= 250
+    assert "blocking_call" in offender["stack"][-1]
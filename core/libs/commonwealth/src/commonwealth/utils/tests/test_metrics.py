@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, MutableMapping
+
+import pytest
+from fastapi import FastAPI
+
+from ..metrics import RequestMetrics, render_metrics, setup_metrics
+
+
+async def request(app: FastAPI, path: str) -> List[MutableMapping[str, Any]]:
+    messages: List[MutableMapping[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("localhost", 80),
+    }
+    await app(scope, receive, send)
+    return messages
+
+
+@pytest.mark.asyncio
+async def test_metrics() -> None:
+    app = FastAPI()
+
+    @app.get("/items/{item}")
+    def get_item(item: int) -> int:
+        return item
+
+    setup_metrics(app)
+    for path in ["/items/1", "/items/2", "/items/three", "/unknown"]:
+        await request(app, path)
+
+    messages = await request(app, "/metrics")
+    assert messages[0]["status"] == 200
+    text = messages[1]["body"].decode()
+    assert 'blueos_http_requests_total{method="GET",route="/items/{item}",status="200"} 2' in text
+    assert 'blueos_http_requests_total{method="GET",route="/items/{item}",status="422"} 1' in text
+    assert 'blueos_http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert (
+        'blueos_http_request_duration_seconds_bucket{method="GET",route="/items/{item}",status="200",le="+Inf"} 2'
+        in text
+    )
+    assert "blueos_http_requests_in_flight 1" in text
+    assert "process_resident_memory_bytes " in text and "process_open_fds " in text
+
+
+def test_render_metrics_escapes_labels() -> None:
+    metrics = RequestMetrics()
+    metrics.observe("GET", 'a"b\\c', 200, 20.0)
+    text = render_metrics(metrics)
+    assert 'route="a\\"b\\\\c"' in text
+    assert 'le="10.0"} 0' in text and 'le="+Inf"} 1' in text
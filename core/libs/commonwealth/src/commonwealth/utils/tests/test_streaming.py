@@ -0,0 +1,75 @@
+import asyncio
+import base64
+import json
+from typing import AsyncGenerator, List
+
+import pytest
+
+from .. import streaming
+from ..stream_stats import streaming_stats
+
+
+async def generate() -> AsyncGenerator[str | bytes, None]:
+    yield "first"
+    yield b"\x00second\n"
+    raise ValueError("broken")
+
+
+async def collect(stream: AsyncGenerator[str | bytes, None]) -> List[str | bytes]:
+    return [item async for item in stream]
+
+
+@pytest.mark.asyncio
+async def test_streamer_json_framing() -> None:
+    items = await collect(streaming.streamer(generate()))
+    responses = [json.loads(str(item).removesuffix("|\n\n|")) for item in items]
+    assert [base64.b64decode(response["data"]) for response in responses[:2]] == [b"first", b"\x00second\n"]
+    assert responses[2] == {"fragment": 2, "status": 500, "data": None, "error": "broken"}
+
+
+@pytest.mark.asyncio
+async def test_streamer_binary_framing() -> None:
+    framing = streaming.stream_framing(f"{streaming.BINARY_STREAM_MEDIA_TYPE}, */*")
+    assert framing == streaming.StreamFraming.BINARY
+    assert streaming.stream_framing("*/*") == streaming.StreamFraming.JSON
+
+    items = await collect(streaming.timeout_streamer(generate(), framing=framing))
+    assert all(isinstance(item, bytes) for item in items)
+    data = b"".join(item for item in items if isinstance(item, bytes))
+    records = []
+    while data:
+        fragment, status, length = streaming.BINARY_RECORD_HEADER.unpack_from(data)
+        start = streaming.BINARY_RECORD_HEADER.size
+        records.append((fragment, status, data[start : start + length]))
+        data = data[start + length :]
+    assert records == [(0, 200, b"first"), (1, 200, b"\x00second\n"), (2, 500, b"broken")]
+
+
+@pytest.mark.asyncio
+async def test_streamer_back_pressure_and_disconnect() -> None:
+    produced: List[int] = []
+    closed = asyncio.Event()
+
+    async def follow() -> AsyncGenerator[str | bytes, None]:
+        try:
+            while True:
+                produced.append(len(produced))
+                yield "line"
+        finally:
+            closed.set()
+
+    before = streaming_stats()
+    stream = streaming.streamer(follow(), high_water_mark=4, low_water_mark=1)
+    await stream.__anext__()
+    await asyncio.sleep(0.01)
+    # The producer is suspended once the client has enough responses waiting
+    assert len(produced) <= 6
+    assert streaming_stats().producer_suspensions > before.producer_suspensions
+
+    # Closing the response, as done when the client disconnects, stops the producer
+    await stream.aclose()
+    await asyncio.wait_for(closed.wait(), 1)
+    stats = streaming_stats()
+    assert stats.abandoned == before.abandoned + 1
+    assert stats.active == before.active
+    assert stats.queued == before.queued
@@ -1,6 +1,11 @@
 from os import path
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
+from commonwealth.utils.apis import (
+    FastJSONResponse,
+    GenericErrorHandlingRoute,
+    debug_router,
+)
+from commonwealth.utils.metrics import setup_metrics
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -13,7 +18,7 @@ from api.v2.routers import index_router_v2
 application = FastAPI(
     title="AutoPilot Manager API",
     description="AutoPilot Manager is responsible for managing AutoPilot devices connected to BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
     debug=True,  # TODO - Add debug after based on args
 )
 application.router.route_class = GenericErrorHandlingRoute
@@ -26,6 +31,8 @@ application.include_router(endpoints_router_v1)
 application.include_router(index_router_v2)
 
 application = VersionedFastAPI(application, prefix_format="/v{major}.{minor}", enable_latest=True)
+application.include_router(debug_router)
+setup_metrics(application)
 
 
 @application.get("/", status_code=200)
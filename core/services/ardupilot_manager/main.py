@@ -4,6 +4,7 @@ import logging
 
 from commonwealth.utils.general import is_running_as_root
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.loop_monitor import start_loop_monitor
 from commonwealth.utils.sentry_config import init_sentry_async
 from loguru import logger
 from uvicorn import Config, Server
@@ -27,6 +28,7 @@ if not is_running_as_root():
 
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    start_loop_monitor()
 
     args = CommandLineArgs.from_args()
     if args.debug:
@@ -49,6 +51,7 @@ async def main() -> None:
 
     await server.serve()
     await autopilot.kill_ardupilot()
+    await autopilot.vehicle_manager.close()
 
 
 if __name__ == "__main__":
@@ -8,8 +8,9 @@ from typing import Any, Dict
 import appdirs
 import dpath
 from uvicorn import Config, Server
-from commonwealth.utils.apis import GenericErrorHandlingRoute
+from commonwealth.utils.apis import GenericErrorHandlingRoute, debug_router
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import Body, FastAPI, HTTPException
 from fastapi import Path as FastPath
@@ -96,6 +97,8 @@ async def read_data(path: str) -> JSONResponse:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -9,8 +9,15 @@ from typing import Any, Dict, List, Optional
 
 import psutil
 from commonwealth.settings.manager import Manager
-from commonwealth.utils.apis import PrettyJSONResponse
+from commonwealth.utils.apis import (
+    ConditionalRoute,
+    FastJSONResponse,
+    StateVersion,
+    conditional,
+    debug_router,
+)
 from commonwealth.utils.logs import init_logger
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
@@ -78,6 +85,7 @@ class Beacon:
 
     def __init__(self) -> None:
         self.runners: Dict[str, AsyncRunner] = {}
+        self.runners_version = StateVersion()
         try:
             self.manager = Manager(SERVICE_NAME, SettingsV4)
         except Exception as e:
@@ -234,9 +242,9 @@ class Beacon:
         """
         while True:
             # re-load settings in case something changed
-            self.manager.load()
-            self.settings = self.manager.settings
-            self.service_types = self.load_service_types()
+            if self.manager.reload():
+                self.settings = self.manager.settings
+                self.service_types = self.load_service_types()
 
             default_runners = self.create_default_runners()
             user_runners = self.create_user_runners()
@@ -250,6 +258,7 @@ class Beacon:
                     try:
                         await runner.register_services()
                         self.runners[runner_name] = runner
+                        self.runners_version.bump()
                     except Exception as e:
                         logger.warning(e)
                 elif self.runners[runner_name] != runner:
@@ -257,6 +266,7 @@ class Beacon:
                     logger.info(f"runner {runner_name} has changed, updating runner...")
                     await self.runners[runner_name].unregister_services()
                     self.runners[runner_name] = runner
+                    self.runners_version.bump()
                     await runner.register_services()
 
             await asyncio.sleep(10)
@@ -271,15 +281,17 @@ init_logger(SERVICE_NAME)
 app = FastAPI(
     title="Beacon API",
     description="Beacon is responsible for publishing mDNS domains.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
     debug=True,
 )
+app.router.route_class = ConditionalRoute
 
 beacon = Beacon()
 
 
 @app.get("/services", response_model=List[MdnsEntry], summary="Current domains broadcasted.")
 @version(1, 0)
+@conditional(beacon.runners_version)
 def get_services() -> Any:
     return list(itertools.chain.from_iterable([runner.get_services() for runner in beacon.runners.values()]))
 
@@ -320,6 +332,8 @@ def get_ip(request: Request) -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -4,8 +4,14 @@ import logging
 from typing import Any, List
 
 from uvicorn import Config, Server
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
+from commonwealth.utils.apis import (
+    FastJSONResponse,
+    GenericErrorHandlingRoute,
+    debug_router,
+)
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.loop_monitor import start_loop_monitor
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import FastAPI, status
 from fastapi.responses import HTMLResponse
@@ -22,7 +28,7 @@ init_logger(SERVICE_NAME)
 app = FastAPI(
     title="Bridget API",
     description="Bridget is a BlueOS service responsible for managing 'bridges' links.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
 )
 app.router.route_class = GenericErrorHandlingRoute
 logger.info("Starting Bridget!.")
@@ -63,6 +69,8 @@ def remove_bridge(bridge: BridgeFrontendSpec) -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -79,6 +87,7 @@ async def read_items() -> Any:
 
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    start_loop_monitor()
 
     # Running uvicorn with log disabled so loguru can handle it
     config = Config(app=app, host="0.0.0.0", port=27353, log_config=None)
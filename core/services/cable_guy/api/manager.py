@@ -57,7 +57,8 @@ class EthernetManager:
 
     result: List[NetworkInterface] = []
 
-    _manager: PydanticManager = PydanticManager(SERVICE_NAME, settings.SettingsV2)
+    # Interface changes come in bursts, write them to disk together
+    _manager: PydanticManager = PydanticManager(SERVICE_NAME, settings.SettingsV2, write_delay=1.0)
 
     @property
     def _settings(self) -> settings.SettingsV2:
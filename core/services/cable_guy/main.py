@@ -5,9 +5,15 @@ import os
 import sys
 from typing import Any, List
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
+from commonwealth.utils.apis import (
+    ConditionalRoute,
+    FastJSONResponse,
+    debug_router,
+)
 from commonwealth.utils.decorators import temporary_cache
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.loop_monitor import start_loop_monitor
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import Body, FastAPI
 from fastapi.responses import HTMLResponse
@@ -28,10 +34,10 @@ manager = EthernetManager()
 app = FastAPI(
     title="Cable Guy API",
     description="Cable Guy is responsible for managing internet interfaces on BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
     debug=True,
 )
-app.router.route_class = GenericErrorHandlingRoute
+app.router.route_class = ConditionalRoute
 
 
 @app.get("/ethernet", response_model=List[NetworkInterface], summary="Retrieve ethernet interfaces.")
@@ -149,6 +155,8 @@ app = VersionedFastAPI(
     prefix_format="/v{major}.{minor}",
     enable_latest=True,
 )
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -165,6 +173,7 @@ async def root() -> HTMLResponse:
 
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    start_loop_monitor()
 
     config = Config(app=app, host="0.0.0.0", port=9090, log_config=None)
     server = Server(config)
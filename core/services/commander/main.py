@@ -12,10 +12,15 @@ from typing import Any, AsyncGenerator
 
 import appdirs
 from uvicorn import Config, Server
-from commonwealth.utils.apis import GenericErrorHandlingRoute
-from commonwealth.utils.commands import run_command
+from commonwealth.utils.apis import (
+    FastJSONResponse,
+    GenericErrorHandlingRoute,
+    debug_router,
+)
+from commonwealth.utils.commands import run_command, run_command_async
 from commonwealth.utils.general import delete_everything, delete_everything_stream
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from commonwealth.utils.streaming import streamer
 from fastapi import FastAPI, HTTPException, status
@@ -33,6 +38,7 @@ init_logger(SERVICE_NAME)
 app = FastAPI(
     title="Commander API",
     description="Commander is a BlueOS service responsible to abstract simple commands to the frontend.",
+    default_response_class=FastJSONResponse,
 )
 app.router.route_class = GenericErrorHandlingRoute
 logger.info("Starting Commander!")
@@ -60,7 +66,7 @@ def check_what_i_am_doing(i_know_what_i_am_doing: bool = False) -> None:
 async def command_host(command: str, i_know_what_i_am_doing: bool = False) -> Any:
     check_what_i_am_doing(i_know_what_i_am_doing)
     logger.debug(f"Running command: {command}")
-    output = run_command(command, False)
+    output = await run_command_async(command, False)
     logger.debug(f"Output: {output}")
     message = {
         "stdout": f"{output.stdout!r}",
@@ -196,7 +202,8 @@ async def remove_log_services_stream(i_know_what_i_am_doing: bool = False) -> St
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)) from error
 
     return StreamingResponse(
-        streamer(generate(), heartbeats=1.0),
+        # A client going away must not leave the logs half deleted
+        streamer(generate(), heartbeats=1.0, cancel_on_disconnect=False),
         media_type="application/x-ndjson",
         headers={
             "Content-Type": "application/x-ndjson",
@@ -237,6 +244,8 @@ async def environment_variables() -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
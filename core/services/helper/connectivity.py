@@ -0,0 +1,162 @@
+import asyncio
+import http.client
+import ssl
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+# Delay before trying the next address of a host, as recommended by RFC 8305
+HAPPY_EYEBALLS_DELAY = 0.25
+
+
+class ConnectivityTarget(NamedTuple):
+    hostname: str
+    port: int
+    path: str
+    # Only probed while clients are asking for the connectivity, not on the background schedule
+    on_demand: bool = False
+
+
+class ConnectivitySample(BaseModel):
+    # Since epoch
+    time: float
+    online: bool
+    # Time to connect, including the TLS handshake
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ConnectivityHistory(BaseModel):
+    # Fraction of the samples where the target was online
+    availability: float
+    average_latency_ms: Optional[float]
+    samples: List[ConnectivitySample]
+
+
+class ConnectivityMonitor:
+    """Probe internet targets on a schedule, keeping the last `history_size` samples of each one.
+
+    Targets are probed every `interval` seconds in the background. While clients ask for the connectivity, every
+    `demand_interval` seconds instead, including the targets that are only probed on demand, until `demand_window`
+    seconds after the last time they asked.
+
+    Each probe connects to the target with happy eyeballs, so a broken IPv6 route does not delay the IPv4 one, and
+    sends an HTTP GET request to its path. Targets answering anything are online.
+    """
+
+    def __init__(
+        self,
+        targets: Dict[str, ConnectivityTarget],
+        interval: float = 60.0,
+        demand_interval: float = 20.0,
+        demand_window: float = 60.0,
+        timeout: float = 5.0,
+        history_size: int = 360,
+    ) -> None:
+        self.targets = targets
+        self.interval = interval
+        self.demand_interval = demand_interval
+        self.demand_window = demand_window
+        self.timeout = timeout
+        self._history: Dict[str, Deque[ConnectivitySample]] = {name: deque(maxlen=history_size) for name in targets}
+        # Set once all targets were probed since clients started asking
+        self._ready = asyncio.Event()
+        self._wake_up = asyncio.Event()
+        self._demanded_until = 0.0
+        self._ssl_context = ssl.create_default_context()
+
+    async def _request(self, target: ConnectivityTarget) -> float:
+        start = time.monotonic()
+        reader, writer = await asyncio.open_connection(
+            target.hostname,
+            target.port,
+            ssl=self._ssl_context if target.port == http.client.HTTPS_PORT else None,
+            happy_eyeballs_delay=HAPPY_EYEBALLS_DELAY,
+        )
+        latency = time.monotonic() - start
+        try:
+            writer.write(
+                f"GET {target.path} HTTP/1.1\r\nHost: {target.hostname}\r\nUser-Agent: python\r\n"
+                "Connection: close\r\n\r\n".encode()
+            )
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        if not status_line.startswith(b"HTTP/"):
+            raise ConnectionError(f"Invalid HTTP response: {status_line[:64]!r}")
+        return latency
+
+    async def probe(self, name: str) -> ConnectivitySample:
+        target = self.targets[name]
+        sample = ConnectivitySample(time=time.time(), online=False)
+        try:
+            latency = await asyncio.wait_for(self._request(target), self.timeout)
+            sample.online = True
+            sample.latency_ms = latency * 1000
+        except asyncio.TimeoutError:
+            sample.error = f"Timed out after {self.timeout} seconds"
+        except (OSError, ssl.SSLError, ConnectionError) as error:
+            sample.error = str(error) or type(error).__name__
+        except Exception as error:
+            # A failing probe must not stop the monitor, the target is only considered offline
+            logger.exception(f"Unexpected error probing {target.hostname}:{target.port}: {error}")
+            sample.error = str(error) or type(error).__name__
+        if not sample.online:
+            logger.debug(f"{target.hostname}:{target.port} is offline: {sample.error}")
+        self._history[name].append(sample)
+        return sample
+
+    def demanded(self) -> bool:
+        return time.monotonic() < self._demanded_until
+
+    def demand(self) -> None:
+        """Signal that a client is asking for the connectivity, probing all targets right away if nobody was."""
+        if not self.demanded():
+            self._ready.clear()
+            self._wake_up.set()
+        self._demanded_until = time.monotonic() + self.demand_window
+
+    async def run(self) -> None:
+        while True:
+            start = time.monotonic()
+            self._wake_up.clear()
+            demanded = self.demanded()
+            await asyncio.gather(
+                *[self.probe(name) for name, target in self.targets.items() if demanded or not target.on_demand]
+            )
+            if demanded:
+                self._ready.set()
+            interval = self.demand_interval if self.demanded() else self.interval
+            try:
+                await asyncio.wait_for(self._wake_up.wait(), max(interval - (time.monotonic() - start), 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for samples of all targets taken since clients are asking, returning immediately once they exist.
+
+        Waits at most `timeout` seconds, the probe timeout by default, returning False if the samples are not there.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def latest(self) -> Dict[str, Optional[ConnectivitySample]]:
+        return {name: history[-1] if history else None for name, history in self._history.items()}
+
+    def history(self, since: Optional[float] = None) -> Dict[str, ConnectivityHistory]:
+        result = {}
+        for name, history in self._history.items():
+            samples = [sample for sample in history if since is None or sample.time > since]
+            latencies = [sample.latency_ms for sample in samples if sample.latency_ms is not None]
+            result[name] = ConnectivityHistory(
+                availability=sum(sample.online for sample in samples) / len(samples) if samples else 0.0,
+                average_latency_ms=sum(latencies) / len(latencies) if latencies else None,
+                samples=samples,
+            )
+        return result
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import re
+import socket
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+
+from loguru import logger
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+TCP_LISTEN = 10
+# struct nlmsghdr: length, type, flags, sequence, port id
+NLMSG_HEADER = struct.Struct("=IHHII")
+# struct inet_diag_req_v2: family, protocol, extensions, padding, states, followed by an inet_diag_sockid that is
+# left empty, as all sockets are dumped
+INET_DIAG_REQUEST = struct.Struct("=BBBBI48x")
+# Start of struct inet_diag_msg: family and state, followed by the inet_diag_sockid with the source port in network
+# order at offset 4 and the source address at offset 8, the socket inode is at offset 68
+INET_DIAG_MESSAGE = struct.Struct("=BB")
+INET_DIAG_SOURCE_PORT = struct.Struct("!H")
+INET_DIAG_INODE = struct.Struct("=I")
+PROC_NET_TCP = {socket.AF_INET: "/proc/net/tcp", socket.AF_INET6: "/proc/net/tcp6"}
+PROC_NET_TCP_LISTEN = "0A"
+CONTAINER_ID = re.compile(r"[0-9a-f]{64}")
+
+# (address, port, socket inode)
+Listener = Tuple[str, int, int]
+# Receives the ports opened and closed
+PortsCallback = Callable[[Set[int], Set[int]], Awaitable[None]]
+
+
+def _netlink_align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _netlink_listeners(family: socket.AddressFamily) -> List[Listener]:
+    """Dump the TCP sockets of a family that are listening, filtered by the kernel through sock_diag."""
+    request = INET_DIAG_REQUEST.pack(family, socket.IPPROTO_TCP, 0, 0, 1 << TCP_LISTEN)
+    header = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request), SOCK_DIAG_BY_FAMILY, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+    address_length = 4 if family == socket.AF_INET else 16
+    listeners: List[Listener] = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG) as netlink:
+        netlink.sendto(header + request, (0, 0))
+        while True:
+            data = netlink.recv(65536)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, message_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+                if message_type == NLMSG_DONE:
+                    return listeners
+                payload = offset + NLMSG_HEADER.size
+                if message_type == NLMSG_ERROR:
+                    (error,) = struct.unpack_from("=i", data, payload)
+                    raise OSError(-error, "sock_diag dump failed")
+                message_family, state = INET_DIAG_MESSAGE.unpack_from(data, payload)
+                if message_family == family and state == TCP_LISTEN:
+                    (port,) = INET_DIAG_SOURCE_PORT.unpack_from(data, payload + 4)
+                    address = socket.inet_ntop(family, data[payload + 8 : payload + 8 + address_length])
+                    (inode,) = INET_DIAG_INODE.unpack_from(data, payload + 68)
+                    listeners.append((address, port, inode))
+                offset += _netlink_align(length)
+
+
+def _proc_address(family: socket.AddressFamily, hex_address: str) -> str:
+    # Addresses are written as 32 bits words in host order
+    raw = bytes.fromhex(hex_address)
+    words = b"".join(raw[index : index + 4][::-1] for index in range(0, len(raw), 4))
+    return socket.inet_ntop(family, words)
+
+
+def _proc_listeners(family: socket.AddressFamily) -> List[Listener]:
+    """Listening TCP sockets of a family from procfs, where every socket of the namespace is listed."""
+    listeners: List[Listener] = []
+    try:
+        with open(PROC_NET_TCP[family], "r", encoding="utf-8") as file:
+            next(file)
+            for line in file:
+                fields = line.split()
+                if fields[3] != PROC_NET_TCP_LISTEN:
+                    continue
+                hex_address, hex_port = fields[1].split(":")
+                listeners.append((_proc_address(family, hex_address), int(hex_port, 16), int(fields[9])))
+    except FileNotFoundError:
+        pass
+    return listeners
+
+
+@dataclass(frozen=True)
+class SocketOwner:
+    # Container or command line of the process
+    identity: str
+    # Since epoch
+    started_at: float
+
+
+def _boot_time(proc_path: Path) -> float:
+    with open(proc_path / "stat", "r", encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("btime "):
+                return float(line.split()[1])
+    return 0.0
+
+
+def _process_owner(process_path: Path, boot_time: float) -> SocketOwner:
+    container = CONTAINER_ID.search((process_path / "cgroup").read_text(encoding="utf-8"))
+    if container:
+        identity = f"container:{container.group()}"
+    else:
+        command = (process_path / "cmdline").read_bytes().replace(b"\0", b" ").decode(errors="replace").strip()
+        identity = f"command:{command}"
+    # The command name may contain spaces and parentheses, the start time is the 22nd field
+    stat = (process_path / "stat").read_text(encoding="utf-8").rsplit(")", 1)[1].split()
+    started_at = boot_time + int(stat[19]) / os.sysconf("SC_CLK_TCK")
+    return SocketOwner(identity=identity, started_at=started_at)
+
+
+def socket_owners(inodes: Set[int], proc_path: Path = Path("/proc")) -> Dict[int, SocketOwner]:
+    """Owners of sockets, taken from a single scan of /proc/*/fd.
+
+    Sockets of processes that can not be inspected, like the ones from other PID namespaces, are owned by the socket
+    itself, so they only keep the same owner while the socket is not reopened.
+    """
+    boot_time = _boot_time(proc_path)
+    wanted = {f"socket:[{inode}]": inode for inode in inodes}
+    owners: Dict[int, SocketOwner] = {}
+    with os.scandir(proc_path) as processes:
+        for process in processes:
+            if len(owners) == len(wanted):
+                break
+            if not process.name.isdigit():
+                continue
+            try:
+                with os.scandir(Path(process.path, "fd")) as descriptors:
+                    found = {wanted.get(os.readlink(descriptor.path)) for descriptor in descriptors} - {None}
+                if found:
+                    owner = _process_owner(Path(process.path), boot_time)
+                    owners.update({inode: owner for inode in found if inode is not None})
+            except OSError:
+                # The process is already gone or can not be inspected
+                continue
+    for inode in inodes - owners.keys():
+        owners[inode] = SocketOwner(identity=f"socket:{inode}", started_at=boot_time)
+    return owners
+
+
+class ListeningPortsWatcher:
+    """Keep the set of TCP ports listening on some addresses, notifying subscribers when ports are opened or closed.
+
+    Listening sockets are dumped with netlink sock_diag, where the kernel filters out every socket that is not
+    listening, falling back to procfs when netlink is not available. As sock_diag does not announce new listeners,
+    the dump is repeated every `interval` seconds and compared with the previous one. Ports listening on a different
+    socket, like when their service restarted between dumps, are considered opened again.
+    """
+
+    def __init__(self, addresses: Iterable[str], interval: float = 1.0) -> None:
+        self.addresses = set(addresses)
+        self.interval = interval
+        # Port to the inode of its listening socket
+        self.sockets: Dict[int, int] = {}
+        self._subscribers: List[PortsCallback] = []
+        self._use_netlink = True
+
+    def subscribe(self, callback: PortsCallback) -> None:
+        self._subscribers.append(callback)
+
+    def listeners(self) -> List[Listener]:
+        if self._use_netlink:
+            try:
+                return [listener for family in PROC_NET_TCP for listener in _netlink_listeners(family)]
+            except OSError as error:
+                logger.warning(f"sock_diag not available, falling back to procfs: {error}")
+                self._use_netlink = False
+        return [listener for family in PROC_NET_TCP for listener in _proc_listeners(family)]
+
+    def refresh(self) -> Tuple[Set[int], Set[int]]:
+        """Update the listening ports, returning the ones opened and closed since the last refresh."""
+        sockets: Dict[int, int] = {}
+        for address, port, inode in self.listeners():
+            if address in self.addresses:
+                # Ports listening on multiple addresses are identified by their first socket
+                sockets[port] = min(inode, sockets.get(port, inode))
+        opened = {port for port, inode in sockets.items() if self.sockets.get(port) != inode}
+        closed = self.sockets.keys() - sockets.keys()
+        self.sockets = sockets
+        return opened, closed
+
+    @property
+    def ports(self) -> Set[int]:
+        return set(self.sockets)
+
+    async def run(self) -> None:
+        while True:
+            opened, closed = self.refresh()
+            if opened or closed:
+                for callback in self._subscribers:
+                    try:
+                        await callback(opened, closed)
+                    except Exception as exception:
+                        logger.exception(f"Failed to handle listening ports change: {exception}")
+            await asyncio.sleep(self.interval)
@@ -1,27 +1,27 @@
 #! /usr/bin/env python3
 
 import asyncio
-import gzip
 import http.client
 import json
 import logging
 import re
-import socket
-import subprocess
-from concurrent import futures
 from datetime import datetime
 from enum import Enum
 from functools import cache
-from io import BytesIO
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Set, Union
-from urllib.parse import urlparse
 from uuid import UUID
 
-import psutil
+import aiohttp
+import appdirs
 from bs4 import BeautifulSoup
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
-from commonwealth.utils.decorators import temporary_cache
+from commonwealth.settings.persistence import atomic_write
+from commonwealth.utils.apis import (
+    ConditionalRoute,
+    FastJSONResponse,
+    debug_router,
+)
+from commonwealth.utils.decorators import async_cache
 from commonwealth.utils.general import (
     blueos_version,
     CpuType,
@@ -30,6 +30,8 @@ from commonwealth.utils.general import (
     local_unique_identifier,
 )
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.loop_monitor import start_loop_monitor
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import HTMLResponse
@@ -39,7 +41,10 @@ from pydantic import BaseModel
 from speedtest import Speedtest
 from uvicorn import Config, Server
 
+from connectivity import ConnectivityHistory, ConnectivityMonitor, ConnectivityTarget
+from listeners import ListeningPortsWatcher, SocketOwner, socket_owners
 from nginx_parser import parse_nginx_file
+from nginx_routes import NginxRoutes
 
 SERVICE_NAME = "helper"
 SPEED_TEST: Optional[Speedtest] = None
@@ -176,6 +181,52 @@ class SimpleHttpResponse(BaseModel):
     as_json: Optional[Union[List[Any], Dict[Any, Any]]]
     error: Optional[str]
     timeout: bool
+    etag: Optional[str] = None
+
+
+class CachedService(BaseModel):
+    # Owner of the port when the service was detected
+    identity: str
+    started_at: float
+    service: ServiceInfo
+    # Of the service metadata, to revalidate it
+    etag: Optional[str] = None
+
+
+class DiscoveryCache:
+    """Services detected on each port, persisted to not detect them again while the port owner stays the same."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[int, CachedService] = {}
+        try:
+            content = json.loads(path.read_text(encoding="utf-8"))
+            self.entries = {int(port): CachedService.parse_obj(entry) for port, entry in content.items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to load the discovery cache, starting with an empty one: {e}")
+
+    def get(self, port: int, owner: SocketOwner) -> Optional[ServiceInfo]:
+        entry = self.entries.get(port)
+        if entry is None or (entry.identity, entry.started_at) != (owner.identity, owner.started_at):
+            return None
+        return entry.service
+
+    def put(self, service: ServiceInfo, owner: SocketOwner) -> None:
+        self.entries[service.port] = CachedService(
+            identity=owner.identity, started_at=owner.started_at, service=service
+        )
+
+    def discard(self, ports: Set[int]) -> bool:
+        discarded = ports & self.entries.keys()
+        for port in discarded:
+            del self.entries[port]
+        return bool(discarded)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(self.path, json.dumps({port: entry.dict() for port, entry in self.entries.items()}))
 
 
 class Helper:
@@ -216,6 +267,30 @@ class Helper:
         2770,  # NGINX
     }
     KNOWN_SERVICES: Set[ServiceInfo] = set()
+    # Listening ports that can be accessed by external users (like server in 0.0.0.0, as described by the
+    # LOCALSERVER_CANDIDATES), services are scanned when they change
+    LISTENING_PORTS = ListeningPortsWatcher(LOCALSERVER_CANDIDATES)
+    # Avoid detecting the same ports from concurrent scans
+    SCAN_LOCK = asyncio.Lock()
+    DISCOVERY_CACHE = DiscoveryCache(Path(appdirs.user_config_dir(SERVICE_NAME), "services.json"))
+    # Websites used to check internet access, probed in the background. The BlueOS telemetry ping carries the vehicle
+    # identifiers, so it is only sent while clients are asking for the internet access
+    CONNECTIVITY = ConnectivityMonitor(
+        {
+            site.name: ConnectivityTarget(
+                hostname=str(site.value["hostname"]),
+                port=int(str(site.value["port"])),
+                path=str(site.value["path"]),
+                on_demand=site == Website.BlueOS,
+            )
+            for site in Website
+        }
+    )
+    NGINX_ROUTES = NginxRoutes(Path("/home/pi/tools/nginx/extensions/"), Path("/var/run/nginx.pid"))
+    # Listening socket of each routed port when its route was last confirmed
+    ROUTED_SOCKETS: Dict[int, int] = {}
+    # Ports where the detection deadline was reached or a probe got no response, their services are not cached
+    INCOMPLETE_DETECTIONS: Set[int] = set()
     # Whether we should or not keep a BlueOS system service when it's TCP port is not alive.
     # If 'False', when a service dies, it is not returned as an available service
     KEEP_BLUEOS_SERVICES_ALIVE = False
@@ -223,108 +298,154 @@ class Helper:
     PERIODICALLY_RESCAN_ALL_SERVICES = False
     # Wether or not we should rescan periodically just the 3rdparty services (extensions)
     PERIODICALLY_RESCAN_3RDPARTY_SERVICES = True
+    # Requests running at once over all the ports being probed, lower on slower boards to avoid CPU usage peaks
+    PROBE_CONCURRENCY = 32
+    PROBE_CONCURRENCY_PI3 = 8
+    # Connections kept to each port, shared by the probes of a service
+    PROBE_CONNECTIONS_PER_PORT = 2
+    # Shorter than the keep-alive timeout of most servers, so idle connections are never used after being closed by them
+    PROBE_KEEPALIVE_TIMEOUT = 2.0
+    PROBE_TIMEOUT = 1.0
+    # Time allowed to detect a service, including all of its probes
+    DETECTION_DEADLINE = 3.0
+    PROBE_SESSION: Optional[aiohttp.ClientSession] = None
+    # Limits the detections running at once, so the connections of each one are free while its deadline runs
+    DETECTION_SLOTS: Optional[asyncio.Semaphore] = None
 
     @staticmethod
-    # pylint: disable=too-many-arguments,too-many-branches,too-many-locals
-    def simple_http_request(
-        host: str,
-        port: int = http.client.HTTP_PORT,
-        path: str = "/",
-        timeout: Optional[float] = None,
-        method: str = "GET",
-        try_json: bool = False,
-        follow_redirects: int = 0,
-    ) -> SimpleHttpResponse:
-        """This function is a simple wrappper around http.client to make convenient requests and get the answer
-        knowing that it will never raise"""
+    def probe_concurrency() -> int:
+        return Helper.PROBE_CONCURRENCY_PI3 if get_cpu_type() == CpuType.PI3 else Helper.PROBE_CONCURRENCY
 
-        conn: Optional[Union[http.client.HTTPConnection, http.client.HTTPSConnection]] = None
-        request_response = SimpleHttpResponse(status=None, decoded_data=None, as_json=None, timeout=False, error=None)
-
-        # Based on requests library
-        headers = {
-            "User-Agent": "python",
-            "Accept-Encoding": "gzip, deflate",
-            "Accept": "*/*",
-        }
-        # Prepare the header for json request
-        if try_json:
-            headers["Accept"] = "application/json"
+    @staticmethod
+    def probe_session() -> aiohttp.ClientSession:
+        """Session shared by all service probes, keeping connections to each port alive between its probes."""
+        if Helper.PROBE_SESSION is None or Helper.PROBE_SESSION.closed:
+            # The connections limit is the concurrency budget of all probes
+            connector = aiohttp.TCPConnector(
+                limit=Helper.probe_concurrency(),
+                limit_per_host=Helper.PROBE_CONNECTIONS_PER_PORT,
+                keepalive_timeout=Helper.PROBE_KEEPALIVE_TIMEOUT,
+            )
+            # Timeouts do not include the time waiting for a free connection, which is bounded by the detection slots
+            timeout = aiohttp.ClientTimeout(sock_connect=Helper.PROBE_TIMEOUT, sock_read=Helper.PROBE_TIMEOUT)
+            Helper.PROBE_SESSION = aiohttp.ClientSession(
+                connector=connector, timeout=timeout, headers={"User-Agent": "python"}
+            )
+        return Helper.PROBE_SESSION
 
+    @staticmethod
+    async def probe(
+        port: int, path: str, try_json: bool = False, if_none_match: Optional[str] = None
+    ) -> SimpleHttpResponse:
+        """Request a path of a local service, following redirects and knowing that it will never raise."""
+        request_response = SimpleHttpResponse(status=None, decoded_data=None, as_json=None, timeout=False, error=None)
+        headers = {"Accept": "application/json"} if try_json else {"Accept": "*/*"}
+        if if_none_match is not None:
+            headers["If-None-Match"] = if_none_match
         try:
-            # Make the connection and the request
-            if port == http.client.HTTPS_PORT:
-                conn = http.client.HTTPSConnection(host, port, timeout=timeout)
-            else:
-                conn = http.client.HTTPConnection(host, port, timeout=timeout)
-
-            conn.request(method, path, headers=headers)
-            response = conn.getresponse()
-
-            # Follow redirects if required
-            location_header = response.getheader("location")
-            if follow_redirects > 0 and location_header is not None:
-                url = urlparse(location_header)
-                return Helper.simple_http_request(
-                    host=url.hostname or host,
-                    port=url.port or port,
-                    path=url.path or path,  # note: ignoring params, query and fragment
-                    timeout=timeout,
-                    method=method,
-                    try_json=try_json,
-                    follow_redirects=follow_redirects - 1,
-                )
-
-            # Decode the data
-            request_response.status = response.status
-            if response.status == http.client.OK:
-                encoding = response.headers.get_content_charset() or "utf-8"
-                if response.getheader("Content-Encoding") == "gzip":
-                    buffer = BytesIO(response.read())
-                    with gzip.GzipFile(fileobj=buffer) as file:
-                        decompressed_data = file.read()
-                else:
-                    decompressed_data = response.read()
-
-                request_response.decoded_data = decompressed_data.decode(encoding)
-
-                # Interpret it as json
-                if try_json:
-                    request_response.as_json = json.loads(request_response.decoded_data)
-
-        except socket.timeout as e:
-            logger.warning(e)
+            async with Helper.probe_session().get(
+                f"http://127.0.0.1:{port}{path}", headers=headers, max_redirects=10
+            ) as response:
+                request_response.status = response.status
+                request_response.etag = response.headers.get("ETag")
+                if response.status == http.client.OK:
+                    data = await response.read()
+                    request_response.decoded_data = data.decode(response.charset or "utf-8")
+                    if try_json:
+                        request_response.as_json = json.loads(request_response.decoded_data)
+
+        except asyncio.TimeoutError as e:
+            logger.warning(f"Timeout probing {path} at port {port}")
             request_response.timeout = True
             request_response.error = str(e)
 
-        except (http.client.HTTPException, socket.error, json.JSONDecodeError) as e:
+        except (aiohttp.ClientError, UnicodeDecodeError, json.JSONDecodeError) as e:
             logger.warning(e)
             request_response.error = str(e)
 
-        except Exception as e:
-            logger.exception(e)
-            request_response.error = str(e)
-
-        finally:
-            if conn:
-                conn.close()
-
         return request_response
 
     @staticmethod
-    @temporary_cache(timeout_seconds=1)  # a temporary cache helps us deal with changes in metadata
-    def detect_service(port: int) -> ServiceInfo:
-        path = port_to_service_map.get(port)
-        info = ServiceInfo(valid=False, title="Unknown", documentation_url="", versions=[], port=port, path=path)
+    def parse_metadata(response: SimpleHttpResponse) -> Optional[ServiceMetadata]:
+        response_as_json = response.as_json
+        if response.status != http.client.OK or response_as_json is None or not isinstance(response_as_json, dict):
+            return None
+        try:
+            metadata = ServiceMetadata.parse_obj(response_as_json)
+            metadata.sanitized_name = re.sub(r"[^a-z0-9]", "", metadata.name.lower())
+            return metadata
+        except Exception as e:
+            logger.warning(f"Failed parsing the received JSON as ServiceMetadata object: {e}")
+            return None
+
+    @staticmethod
+    async def probe_metadata(info: ServiceInfo) -> bool:
+        response = await Helper.probe(info.port, "/register_service", try_json=True)
+        info.metadata = Helper.parse_metadata(response)
+        if info.metadata is None:
+            logger.debug(f"No metadata received from {info.title} (port {info.port})")
+        # Server errors are treated like missing responses, as the service may still be starting
+        return response.status is not None and response.status < http.client.INTERNAL_SERVER_ERROR
 
-        response = Helper.simple_http_request(
-            "127.0.0.1", port=port, path="/", timeout=1.0, method="GET", follow_redirects=10
+    @staticmethod
+    async def probe_documentation(info: ServiceInfo) -> bool:
+        # The documentation and API candidates are probed together, the API ones are only used if a documentation is
+        # found
+        responses = await asyncio.gather(
+            *[Helper.probe(info.port, path) for path in Helper.DOCS_CANDIDATE_URLS],
+            *[Helper.probe(info.port, path, try_json=True) for path in Helper.API_CANDIDATE_URLS],
+        )
+        documentation_responses = responses[: len(Helper.DOCS_CANDIDATE_URLS)]
+        api_responses = responses[len(Helper.DOCS_CANDIDATE_URLS) :]
+
+        # The first valid documentation path is used
+        documentation_path = next(
+            (
+                path
+                for path, response in zip(Helper.DOCS_CANDIDATE_URLS, documentation_responses)
+                if response.status == http.client.OK
+            ),
+            None,
         )
-        log_msg = f"Detecting service at port {port}"
+        if documentation_path is None:
+            return all(response.status is not None for response in responses)
+        info.documentation_url = documentation_path
+
+        # Get main openapi json description files, the expected data is like:
+        # {
+        #     "paths": {
+        #         "v1.0.0": ...,
+        #         "v2.0.0": ...,
+        #     }
+        # }
+        version_paths = [
+            str(version_path)
+            for response in api_responses
+            if response.status == http.client.OK and isinstance(response.as_json, dict)
+            for version_path in response.as_json.get("paths", {}).keys()
+        ]
+
+        # Check all available versions for the ones that provide a swagger-ui
+        version_responses = await asyncio.gather(*[Helper.probe(info.port, path) for path in version_paths])
+        info.versions += [
+            version_path
+            for version_path, response in zip(version_paths, version_responses)
+            if response.status == http.client.OK
+            and response.decoded_data is not None
+            and "swagger-ui" in response.decoded_data
+        ]
+        return all(response.status is not None for response in [*responses, *version_responses])
+
+    @staticmethod
+    async def probe_service(info: ServiceInfo) -> bool:
+        """Detect the service of a port, returning False if some probe got no response, as it may have been starting."""
+        response = await Helper.probe(info.port, "/")
+        log_msg = f"Detecting service at port {info.port}"
         if response.status == http.client.BAD_REQUEST or response.decoded_data is None:
             # If not valid web server, documentation will not be available
             logger.debug(f"{log_msg}: Invalid: {response.status} - {response.decoded_data!r}")
-            return info
+            # Servers that do not talk HTTP fail right away, only the ones that timed out may still be starting
+            return not response.timeout
 
         info.valid = True
         try:
@@ -335,85 +456,43 @@ class Helper:
         except Exception as e:
             logger.warning(f"Failed parsing the service title: {e}")
 
-        # Try to get the metadata from the service
-        response = Helper.simple_http_request(
-            "127.0.0.1",
-            port=port,
-            path="/register_service",
-            timeout=1.0,
-            method="GET",
-            try_json=True,
-            follow_redirects=10,
-        )
-        response_as_json = response.as_json
-        if response.status == http.client.OK and response_as_json is not None and isinstance(response_as_json, dict):
-            try:
-                info.metadata = ServiceMetadata.parse_obj(response_as_json)
-                info.metadata.sanitized_name = re.sub(r"[^a-z0-9]", "", info.metadata.name.lower())
-            except Exception as e:
-                logger.warning(f"Failed parsing the received JSON as ServiceMetadata object: {e}")
-        else:
-            logger.debug(f"No metadata received from {info.title} (port {port})")
+        complete = await asyncio.gather(Helper.probe_metadata(info), Helper.probe_documentation(info))
+        logger.debug(f"{log_msg}: Valid.")
+        return all(complete)
 
-        # Try to get the documentation links
-        for documentation_path in Helper.DOCS_CANDIDATE_URLS:
-            # Skip until we find a valid documentation path
-            response = Helper.simple_http_request(
-                "127.0.0.1", port=port, path=documentation_path, timeout=1.0, method="GET", follow_redirects=10
-            )
-            if response.status != http.client.OK:
-                continue
-            info.documentation_url = documentation_path
-
-            # Get main openapi json description file
-            for api_path in Helper.API_CANDIDATE_URLS:
-                response = Helper.simple_http_request(
-                    "127.0.0.1", port=port, path=api_path, timeout=1.0, method="GET", try_json=True, follow_redirects=10
+    @staticmethod
+    @async_cache(ttl_seconds=1)  # a temporary cache helps us deal with changes in metadata
+    async def detect_service(port: int) -> ServiceInfo:
+        path = port_to_service_map.get(port)
+        info = ServiceInfo(valid=False, title="Unknown", documentation_url="", versions=[], port=port, path=path)
+        if Helper.DETECTION_SLOTS is None:
+            # Each detection uses up to the connections allowed per port
+            slots = Helper.probe_concurrency() // Helper.PROBE_CONNECTIONS_PER_PORT
+            Helper.DETECTION_SLOTS = asyncio.Semaphore(max(slots, 1))
+        # The deadline only starts once the detection has its connections, not while waiting for other detections
+        async with Helper.DETECTION_SLOTS:
+            Helper.INCOMPLETE_DETECTIONS.discard(port)
+            try:
+                complete = await asyncio.wait_for(Helper.probe_service(info), Helper.DETECTION_DEADLINE)
+            except asyncio.TimeoutError:
+                complete = False
+                logger.warning(
+                    f"Detection of service at port {port} took more than {Helper.DETECTION_DEADLINE} seconds."
                 )
-
-                # Skip until we find the expected data. The expected data is like:
-                # {
-                #     "paths": {
-                #         "v1.0.0": ...,
-                #         "v2.0.0": ...,
-                #     }
-                # }
-                response_as_json = response.as_json
-                if (
-                    response.status != http.client.OK
-                    or response_as_json is None
-                    or not isinstance(response_as_json, dict)
-                ):
-                    continue
-                version_paths = response_as_json.get("paths", {}).keys()
-
-                # Check all available versions for the ones that provide a swagger-ui
-                for version_path in version_paths:
-                    response = Helper.simple_http_request(
-                        "127.0.0.1", port=port, path=str(version_path), timeout=1.0, method="GET", follow_redirects=10
-                    )
-                    if (
-                        response.status == http.client.OK
-                        and response.decoded_data is not None
-                        and "swagger-ui" in response.decoded_data
-                    ):
-                        info.versions += [version_path]
-
-            # Since we have at least found one info.documentation_path, we finish here
-            break
-
-        logger.debug(f"{log_msg}: Valid.")
+            if not complete:
+                # Whatever was found until now is kept, the port is detected again by the next scan
+                Helper.INCOMPLETE_DETECTIONS.add(port)
         return info
 
     @staticmethod
-    @temporary_cache(timeout_seconds=3)
-    def scan_ports() -> List[ServiceInfo]:
-        # Get TCP ports that are listen and can be accessed by external users (like server in 0.0.0.0, as described by the LOCALSERVER_CANDIDATES)
-        ports = {
-            connection.laddr.port
-            for connection in psutil.net_connections("tcp")
-            if connection.status == psutil.CONN_LISTEN and connection.laddr.ip in Helper.LOCALSERVER_CANDIDATES
-        }
+    async def scan_ports() -> List[ServiceInfo]:
+        async with Helper.SCAN_LOCK:
+            return await Helper._scan_ports()
+
+    @staticmethod
+    async def _scan_ports() -> List[ServiceInfo]:
+        sockets = dict(Helper.LISTENING_PORTS.sockets)
+        ports = set(sockets)
 
         # If a known service is not within the detected ports, we remove it from the known services
         if Helper.KEEP_BLUEOS_SERVICES_ALIVE:
@@ -426,104 +505,121 @@ class Helper:
             Helper.KNOWN_SERVICES = {service for service in Helper.KNOWN_SERVICES if service.port in ports}
 
         # Filter out ports we want to skip, as well as the ports from services we already know, assuming the services don't change,
-        known_ports = {service.port for service in Helper.KNOWN_SERVICES}
+        # except the ones whose detection was incomplete, including system services kept alive
+        known_ports = {
+            service.port for service in Helper.KNOWN_SERVICES if service.port not in Helper.INCOMPLETE_DETECTIONS
+        }
         ports.difference_update(Helper.SKIP_PORTS, known_ports)
 
-        # The detect_services run several of requests sequentially, so we are capping the amount of executors to lower the peaks on the CPU usage
-        if get_cpu_type() == CpuType.PI3 or len(ports) == 0:
-            max_workers = 2
-        else:
-            max_workers = len(ports)
-
-        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            tasks = [executor.submit(Helper.detect_service, port) for port in ports]
-            services = {task.result() for task in futures.as_completed(tasks)}
-
-        # Update our known services cache
-        Helper.KNOWN_SERVICES.update(services)
-        Helper.update_nginx(services)
-        return [service for service in Helper.KNOWN_SERVICES if service.valid]
+        # Services are only detected again when the process owning their port changed
+        owners = await asyncio.to_thread(socket_owners, {sockets[port] for port in ports})
+        cached_services = {port: Helper.DISCOVERY_CACHE.get(port, owners[sockets[port]]) for port in ports}
+        services = {service for service in cached_services.values() if service is not None}
+
+        # All ports are probed at once, within the concurrency budget of the probe session
+        undetected_ports = {port for port, service in cached_services.items() if service is None}
+        detected_services = await asyncio.gather(*[Helper.detect_service(port) for port in undetected_ports])
+        for service in detected_services:
+            if service.port not in Helper.INCOMPLETE_DETECTIONS:
+                Helper.DISCOVERY_CACHE.put(service, owners[sockets[service.port]])
+        services.update(detected_services)
+
+        # Ports that are closed can only have a different owner when opened again
+        discarded = Helper.DISCOVERY_CACHE.discard(Helper.DISCOVERY_CACHE.entries.keys() - sockets.keys())
+        if detected_services or discarded:
+            await asyncio.to_thread(Helper.DISCOVERY_CACHE.save)
+
+        # Update our known services cache, services detected again replace the incomplete ones
+        Helper.KNOWN_SERVICES = services | Helper.KNOWN_SERVICES
+        await Helper.update_nginx()
+        return Helper.web_services()
 
     @staticmethod
-    @temporary_cache(timeout_seconds=1)
-    def check_website(site: Website) -> WebsiteStatus:
-        hostname = str(site.value["hostname"])
-        port = int(str(site.value["port"]))
-        path = str(site.value["path"])
-
-        response = Helper.simple_http_request(hostname, port=port, path=path, timeout=10, method="GET")
-        website_status = WebsiteStatus(site=site, online=False)
-
-        log_msg = f"Running check_website for '{hostname}:{port}'"
-        if response.error is None:
-            logger.debug(f"{log_msg}: Online.")
-            website_status.online = True
-        else:
-            logger.warning(f"{log_msg}: Offline: {website_status.error}.")
-            website_status.error = response.error
-
-        return website_status
+    async def on_listening_ports_changed(opened: Set[int], closed: Set[int]) -> None:
+        logger.info(f"Listening ports changed, opened: {sorted(opened)}, closed: {sorted(closed)}")
+        # Ports opened again may belong to a new process, they are checked against the discovery cache
+        Helper.KNOWN_SERVICES = {service for service in Helper.KNOWN_SERVICES if service.port not in opened}
+        await Helper.scan_ports()
 
     @staticmethod
-    def reload_nginx() -> None:
-        with open("/var/run/nginx.pid", "r", encoding="utf-8") as f:
-            pid = int(f.readline())
-            # kill -HUP is the right way of doing a graceful reload in Nginx
-            subprocess.run(["kill", "-HUP", f"{pid}"], check=False)
+    async def revalidate_service(service: ServiceInfo) -> bool:
+        """Check with a single request if the metadata of a service is still the same."""
+        entry = Helper.DISCOVERY_CACHE.entries.get(service.port)
+        etag = entry.etag if entry is not None else None
+        response = await Helper.probe(service.port, "/register_service", try_json=True, if_none_match=etag)
+        if response.status is None or response.status == http.client.NOT_MODIFIED:
+            # Services that do not answer are kept, closed ports are handled by the listening ports watcher
+            return True
+        if entry is not None:
+            entry.etag = response.etag
+        return Helper.parse_metadata(response) == service.metadata
 
     @staticmethod
-    def update_nginx(services: Set[ServiceInfo]) -> None:
-        changed = 0
-        for service in services:
-            if service.metadata:
-                if Helper.setup_nginx_route(service.metadata, service.port):
-                    changed += 1
-        if changed:
-            Helper.reload_nginx()
+    async def revalidate_services(ports: Set[int]) -> None:
+        """Detect again the services of the ports that are invalid, incomplete or have a different metadata."""
+        async with Helper.SCAN_LOCK:
+            services = [
+                service
+                for service in Helper.KNOWN_SERVICES
+                if service.port in ports and service.valid and service.port not in Helper.INCOMPLETE_DETECTIONS
+            ]
+            etags = {port: entry.etag for port, entry in Helper.DISCOVERY_CACHE.entries.items()}
+            still_valid = await asyncio.gather(*[Helper.revalidate_service(service) for service in services])
+            kept = {service.port for service, valid in zip(services, still_valid) if valid}
+            Helper.KNOWN_SERVICES = {
+                service for service in Helper.KNOWN_SERVICES if service.port not in ports or service.port in kept
+            }
+            Helper.DISCOVERY_CACHE.discard(ports - kept)
+            # New ETags are persisted, so services keep being revalidated with a single request after a restart
+            if any(
+                entry.etag != etags.get(port) for port, entry in Helper.DISCOVERY_CACHE.entries.items() if port in kept
+            ):
+                await asyncio.to_thread(Helper.DISCOVERY_CACHE.save)
+        await Helper.scan_ports()
 
     @staticmethod
-    @temporary_cache(timeout_seconds=5)
-    def check_internet_access() -> Dict[str, WebsiteStatus]:
-        # 10 concurrent executors is fine here because its a very short/light task
-        with futures.ThreadPoolExecutor(max_workers=10) as executor:
-            tasks = [executor.submit(Helper.check_website, site) for site in Website]
-            status_list = [task.result() for task in futures.as_completed(tasks)]
+    def web_services() -> List[ServiceInfo]:
+        return [service for service in Helper.KNOWN_SERVICES if service.valid]
 
-        return {status.site.name: status for status in status_list}
+    @staticmethod
+    async def update_nginx() -> None:
+        # Routes are generated from all known services, so the ones of services that are gone are removed
+        routes = {
+            service.metadata.sanitized_name: service.port
+            for service in Helper.KNOWN_SERVICES
+            if service.metadata and service.metadata.sanitized_name
+        }
+        # Removing a route reloads nginx, dropping the proxied connections, so the routes of services that could not
+        # be detected completely are kept, unless their port was closed or opened again by a new owner
+        sockets = Helper.LISTENING_PORTS.sockets
+        kept_ports = {
+            port
+            for port in Helper.INCOMPLETE_DETECTIONS
+            if port in sockets and Helper.ROUTED_SOCKETS.get(port, sockets[port]) == sockets[port]
+        }
+        Helper.ROUTED_SOCKETS = {port: sockets[port] for port in {*routes.values(), *kept_ports} if port in sockets}
+        changes = await asyncio.to_thread(Helper.NGINX_ROUTES.sync, routes, kept_ports)
+        if changes:
+            Helper.NGINX_ROUTES.schedule_reload(changes)
 
     @staticmethod
-    def setup_nginx_route(metadata: ServiceMetadata, port: int) -> bool:
-        name = metadata.sanitized_name
-        text = f"""
-        location /extensionv2/{name}/ {{
-        proxy_pass http://127.0.0.1:{port}/;
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-        }}
-        """
-        filename = f"/home/pi/tools/nginx/extensions/{name}.conf"
-        Path.mkdir(Path("/home/pi/tools/nginx/extensions/"), parents=True, exist_ok=True)
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                if f.read() == text:
-                    return False
-        except Exception as e:
-            logging.info(f"file '{filename}' not found ({e}):, a new one will be created")
-        with open(filename, "w", encoding="utf-8") as f:
-            logging.info(f"updating nginx route for {name}")
-            f.write(text)
-            logging.info(f"file updated: {filename}")
-        return True
+    async def check_internet_access() -> Dict[str, WebsiteStatus]:
+        Helper.CONNECTIVITY.demand()
+        if not await Helper.CONNECTIVITY.wait_ready():
+            logger.warning("Internet connectivity is still being probed, returning the targets probed so far.")
+        return {
+            name: WebsiteStatus(site=Website[name], online=sample.online, error=sample.error)
+            for name, sample in Helper.CONNECTIVITY.latest().items()
+            if sample is not None
+        }
 
 
 fast_api_app = FastAPI(
     title="Helper API",
     description="Everybody's helper to find web services that are running in BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
 )
-fast_api_app.router.route_class = GenericErrorHandlingRoute
+fast_api_app.router.route_class = ConditionalRoute
 
 
 @fast_api_app.get(
@@ -534,7 +630,7 @@ fast_api_app.router.route_class = GenericErrorHandlingRoute
 @version(1, 0)
 def web_services() -> Any:
     """REST API endpoint to retrieve web services running."""
-    return Helper.scan_ports()
+    return Helper.web_services()
 
 
 @fast_api_app.get(
@@ -543,8 +639,20 @@ def web_services() -> Any:
     summary="Used to check if some websites are available or if there is internet access.",
 )
 @version(1, 0)
-def check_internet_access() -> Any:
-    return Helper.check_internet_access()
+async def check_internet_access() -> Any:
+    return await Helper.check_internet_access()
+
+
+@fast_api_app.get(
+    "/internet_access_history",
+    response_model=Dict[str, ConnectivityHistory],
+    summary="Latency and availability history of the websites used to check internet access.",
+)
+@version(1, 0)
+async def internet_access_history(since: Optional[float] = None) -> Any:
+    """Samples taken after `since`, in seconds since epoch, or all the samples kept if not defined."""
+    Helper.CONNECTIVITY.demand()
+    return Helper.CONNECTIVITY.history(since)
 
 
 @fast_api_app.get(
@@ -651,16 +759,19 @@ async def ping(host: str, interface_addr: Optional[str] = None) -> bool:
 async def periodic() -> None:
     while True:
         await asyncio.sleep(60)
-        Helper.check_internet_access()
 
         # Clear the known ports cache and re-scan it
         if Helper.PERIODICALLY_RESCAN_ALL_SERVICES:
             Helper.KNOWN_SERVICES.clear()
-        # To get changes in the metadata of extensions, we clear the cache for them to force a rescan
+            Helper.DISCOVERY_CACHE.discard(set(Helper.DISCOVERY_CACHE.entries))
+            await Helper.scan_ports()
+        # To get changes in the metadata of extensions, we revalidate them
         elif Helper.PERIODICALLY_RESCAN_3RDPARTY_SERVICES:
-            Helper.KNOWN_SERVICES = {
-                service for service in Helper.KNOWN_SERVICES if service.port in Helper.BLUEOS_SYSTEM_SERVICES_PORTS
-            }
+            await Helper.revalidate_services(
+                {service.port for service in Helper.KNOWN_SERVICES} - Helper.BLUEOS_SYSTEM_SERVICES_PORTS
+            )
+        else:
+            await Helper.scan_ports()
 
 
 app = VersionedFastAPI(
@@ -669,6 +780,8 @@ app = VersionedFastAPI(
     prefix_format="/v{major}.{minor}",
     enable_latest=True,
 )
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -688,10 +801,14 @@ port_to_service_map: Dict[int, str] = parse_nginx_file("/home/pi/tools/nginx/ngi
 
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    start_loop_monitor()
 
     config = Config(app=app, host="0.0.0.0", port=Helper.PORT, log_config=None)
     server = Server(config)
 
+    Helper.LISTENING_PORTS.subscribe(Helper.on_listening_ports_changed)
+    asyncio.create_task(Helper.LISTENING_PORTS.run())
+    asyncio.create_task(Helper.CONNECTIVITY.run())
     asyncio.create_task(periodic())
 
     await server.serve()
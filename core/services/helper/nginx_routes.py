@@ -0,0 +1,99 @@
+import asyncio
+import os
+import re
+import signal
+import time
+from pathlib import Path
+from typing import AbstractSet, Dict, Optional
+
+from commonwealth.settings.persistence import atomic_write
+from loguru import logger
+
+ROUTE_TEMPLATE = """
+        location /extensionv2/{name}/ {{
+        proxy_pass http://127.0.0.1:{port}/;
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        }}
+        """
+ROUTE_PORT = re.compile(r"proxy_pass http://127\.0\.0\.1:(\d+)/;")
+
+
+class NginxRoutes:
+    """Routes of the extensions in nginx, one configuration file per extension.
+
+    The routes are always updated as a whole: the configuration files are compared with the desired ones, changed files
+    are replaced atomically and the ones of extensions that are gone are removed. Nginx is reloaded once the routes
+    stop changing for `reload_delay` seconds, or `max_reload_delay` seconds after the first change, so a burst of
+    changes, like extensions starting together at boot, results in a single reload.
+    """
+
+    def __init__(self, folder: Path, pid_file: Path, reload_delay: float = 2.0, max_reload_delay: float = 10.0) -> None:
+        self.folder = folder
+        self.pid_file = pid_file
+        self.reload_delay = reload_delay
+        self.max_reload_delay = max_reload_delay
+        self._reload_handle: Optional[asyncio.TimerHandle] = None
+        self._first_change = 0.0
+        self._changes = 0
+
+    @staticmethod
+    def route_config(name: str, port: int) -> str:
+        return ROUTE_TEMPLATE.format(name=name, port=port)
+
+    @staticmethod
+    def route_port(config: str) -> Optional[int]:
+        match = ROUTE_PORT.search(config)
+        return int(match.group(1)) if match else None
+
+    def _current(self) -> Dict[str, str]:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        return {path.name: path.read_text(encoding="utf-8") for path in self.folder.glob("*.conf")}
+
+    def sync(self, routes: Dict[str, int], kept_ports: AbstractSet[int] = frozenset()) -> int:
+        """Make the configuration files match the routes, by name to port, returning the number of files changed.
+
+        Files of other routes are removed, unless they lead to one of `kept_ports`.
+        """
+        desired = {f"{name}.conf": self.route_config(name, port) for name, port in routes.items()}
+        current = self._current()
+        changed = [filename for filename, config in desired.items() if current.get(filename) != config]
+        stale = {
+            filename
+            for filename in current.keys() - desired.keys()
+            if self.route_port(current[filename]) not in kept_ports
+        }
+        for filename in changed:
+            logger.info(f"Updating nginx route file {filename}")
+            atomic_write(self.folder / filename, desired[filename])
+        for filename in stale:
+            logger.info(f"Removing stale nginx route file {filename}")
+            (self.folder / filename).unlink(missing_ok=True)
+        return len(changed) + len(stale)
+
+    def schedule_reload(self, changes: int = 1) -> None:
+        """Reload nginx after the routes stop changing, should be called from the event loop."""
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        if self._reload_handle is None:
+            self._first_change = now
+        else:
+            self._reload_handle.cancel()
+        self._changes += changes
+        delay = min(self.reload_delay, self._first_change + self.max_reload_delay - now)
+        self._reload_handle = loop.call_later(max(delay, 0.0), self.reload)
+
+    def reload(self) -> None:
+        if self._reload_handle is not None:
+            self._reload_handle.cancel()
+            self._reload_handle = None
+        changes, self._changes = self._changes, 0
+        try:
+            pid = int(self.pid_file.read_text(encoding="utf-8").split()[0])
+            logger.info(f"Reloading nginx after {changes} route changes.")
+            # SIGHUP is the right way of doing a graceful reload in Nginx
+            os.kill(pid, signal.SIGHUP)
+        except (OSError, ValueError, IndexError) as error:
+            logger.warning(f"Failed to reload nginx: {error}")
@@ -0,0 +1,147 @@
+import asyncio
+import socket
+from typing import AsyncIterator, List
+
+import pytest
+
+from connectivity import ConnectivityMonitor, ConnectivityTarget
+
+# All test coroutines will be treated as marked.
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(name="server_port")
+async def fixture_server_port() -> AsyncIterator[int]:
+    """Local HTTP server, answering every request with an empty page."""
+
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(answer, "127.0.0.1", 0)
+    async with server:
+        yield server.sockets[0].getsockname()[1]
+
+
+@pytest.fixture(name="invalid_server_port")
+async def fixture_invalid_server_port() -> AsyncIterator[int]:
+    """Local server answering something that is not HTTP."""
+
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"SSH-2.0-OpenSSH\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(answer, "127.0.0.1", 0)
+    async with server:
+        yield server.sockets[0].getsockname()[1]
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+async def test_probe(server_port: int, invalid_server_port: int) -> None:
+    monitor = ConnectivityMonitor(
+        {
+            "online": ConnectivityTarget("127.0.0.1", server_port, "/"),
+            "closed": ConnectivityTarget("127.0.0.1", closed_port(), "/"),
+            "invalid": ConnectivityTarget("127.0.0.1", invalid_server_port, "/"),
+        },
+        timeout=1.0,
+    )
+    online = await monitor.probe("online")
+    assert online.online and online.error is None
+    assert online.latency_ms is not None and online.latency_ms >= 0
+
+    closed = await monitor.probe("closed")
+    assert not closed.online and closed.latency_ms is None
+    assert closed.error
+
+    invalid = await monitor.probe("invalid")
+    assert not invalid.online
+    assert invalid.error is not None and "Invalid HTTP response" in invalid.error
+
+    assert monitor.latest() == {"online": online, "closed": closed, "invalid": invalid}
+
+
+async def test_probe_unexpected_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    monitor = ConnectivityMonitor({"broken": ConnectivityTarget("127.0.0.1", 80, "/")})
+
+    async def request(_target: ConnectivityTarget) -> float:
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(monitor, "_request", request)
+    sample = await monitor.probe("broken")
+    assert not sample.online
+    assert sample.error == "unexpected"
+
+
+async def test_history(server_port: int) -> None:
+    port = closed_port()
+    monitor = ConnectivityMonitor(
+        {
+            "online": ConnectivityTarget("127.0.0.1", server_port, "/"),
+            "closed": ConnectivityTarget("127.0.0.1", port, "/"),
+        },
+        history_size=3,
+    )
+    history = monitor.history()
+    assert history["online"].availability == 0.0
+    assert history["online"].average_latency_ms is None
+    assert not history["online"].samples
+
+    for _ in range(4):
+        await monitor.probe("online")
+        await monitor.probe("closed")
+    history = monitor.history()
+    # Only the last samples are kept
+    assert len(history["online"].samples) == 3
+    assert history["online"].availability == 1.0
+    assert history["online"].average_latency_ms is not None
+    assert history["closed"].availability == 0.0
+    assert history["closed"].average_latency_ms is None
+
+    since = history["online"].samples[-2].time
+    assert monitor.history(since)["online"].samples == history["online"].samples[-1:]
+
+
+async def test_targets_probed_on_demand(server_port: int) -> None:
+    monitor = ConnectivityMonitor(
+        {
+            "scheduled": ConnectivityTarget("127.0.0.1", server_port, "/"),
+            "on_demand": ConnectivityTarget("127.0.0.1", server_port, "/", on_demand=True),
+        },
+        interval=60.0,
+        demand_interval=0.05,
+        demand_window=0.3,
+        timeout=1.0,
+    )
+    task = asyncio.create_task(monitor.run())
+    try:
+        await asyncio.sleep(0.1)
+        # Without clients, only the scheduled targets are probed and no faster than the interval
+        assert len(monitor.history()["scheduled"].samples) == 1
+        assert not monitor.history()["on_demand"].samples
+        assert not await monitor.wait_ready(0.1)
+
+        # Clients asking wake the monitor up, all targets are probed right away and then more often
+        monitor.demand()
+        assert await monitor.wait_ready()
+        assert monitor.history()["on_demand"].samples
+        await asyncio.sleep(0.2)
+        counts: List[int] = [len(history.samples) for history in monitor.history().values()]
+        assert all(count >= 3 for count in counts)
+
+        # Once clients stop asking, the monitor goes back to the interval
+        await asyncio.sleep(0.3)
+        counts = [len(history.samples) for history in monitor.history().values()]
+        await asyncio.sleep(0.2)
+        assert [len(history.samples) for history in monitor.history().values()] == counts
+    finally:
+        task.cancel()
@@ -0,0 +1,310 @@
+import asyncio
+import socket
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+from unittest import mock
+
+import pytest
+from aiohttp import web
+
+from nginx_routes import NginxRoutes
+
+# The ports of the system services are read from the nginx configuration of the vehicle
+with mock.patch("nginx_parser.parse_nginx_file", return_value={}):
+    from main import DiscoveryCache, Helper, ServiceInfo, ServiceMetadata
+
+# All test coroutines will be treated as marked.
+pytestmark = pytest.mark.asyncio
+
+
+def service_info(port: int, name: Optional[str] = None) -> ServiceInfo:
+    metadata = None
+    if name is not None:
+        metadata = ServiceMetadata(
+            name=name,
+            description="",
+            icon="",
+            company="",
+            version="1.0.0",
+            webpage="",
+            api="",
+            sanitized_name=name,
+        )
+    return ServiceInfo(
+        valid=True, title=name or "Unknown", documentation_url="", versions=[], port=port, metadata=metadata
+    )
+
+
+@pytest.fixture(name="helper")
+def fixture_helper(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Any:
+    monkeypatch.setattr(Helper, "KNOWN_SERVICES", set())
+    monkeypatch.setattr(Helper, "INCOMPLETE_DETECTIONS", set())
+    monkeypatch.setattr(Helper, "ROUTED_SOCKETS", {})
+    monkeypatch.setattr(Helper, "DISCOVERY_CACHE", DiscoveryCache(tmp_path / "services.json"))
+    monkeypatch.setattr(Helper, "NGINX_ROUTES", NginxRoutes(tmp_path / "extensions", tmp_path / "nginx.pid"))
+    monkeypatch.setattr(Helper.LISTENING_PORTS, "sockets", {})
+    monkeypatch.setattr(NginxRoutes, "schedule_reload", lambda self, changes=1: None)
+    return Helper
+
+
+class FakeService:
+    """Local HTTP service answering the probes of the helper, with paths that can be made slow or failing."""
+
+    METADATA = {
+        "name": "Fake Service",
+        "description": "Service answering probes",
+        "icon": "mdi-test-tube",
+        "company": "Blue Robotics",
+        "version": "1.0.0",
+        "webpage": "",
+        "api": "",
+    }
+
+    def __init__(self) -> None:
+        self.port = 0
+        # Path to the seconds its response is delayed
+        self.delays: Dict[str, float] = {}
+        self.failing: List[str] = []
+        # Requests being answered at once, over all the fake services
+        self.active: List[int] = [0]
+        self.max_active = 0
+
+    def respond(self, path: str) -> web.Response:
+        if path in self.failing:
+            return web.Response(status=500)
+        if path == "/":
+            return web.Response(
+                text="<html><head><title> Fake Service </title></head></html>", content_type="text/html"
+            )
+        if path == "/register_service":
+            return web.json_response(self.METADATA)
+        if path == "/old_docs":
+            raise web.HTTPFound("/docs")
+        if path == "/docs":
+            return web.Response(text="<html>docs</html>", content_type="text/html")
+        if path == "/openapi.json":
+            return web.json_response({"paths": {"/v1.0/ui/": {}, "/v2.0/ui/": {}}})
+        if path == "/v2.0/ui/":
+            return web.Response(text="<div id='swagger-ui'></div>", content_type="text/html")
+        if path == "/invalid.json":
+            return web.Response(text="{", content_type="application/json")
+        return web.Response(status=404)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.active[0] += 1
+        self.max_active = max(self.max_active, self.active[0])
+        try:
+            await asyncio.sleep(self.delays.get(request.path, 0.0))
+            return self.respond(request.path)
+        finally:
+            self.active[0] -= 1
+
+
+@pytest.fixture(name="probing")
+async def fixture_probing(helper: Any, monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[Any]:
+    monkeypatch.setattr(helper, "PROBE_TIMEOUT", 0.2)
+    monkeypatch.setattr(helper, "PROBE_SESSION", None)
+    monkeypatch.setattr(helper, "DETECTION_SLOTS", None)
+    monkeypatch.setattr(helper, "probe_concurrency", staticmethod(lambda: 8))
+    helper.detect_service.cache_clear()
+    yield helper
+    if helper.PROBE_SESSION is not None:
+        await helper.PROBE_SESSION.close()
+    helper.detect_service.cache_clear()
+
+
+async def start_services(count: int) -> AsyncIterator[List[FakeService]]:
+    services = [FakeService() for _ in range(count)]
+    runners = []
+    for service in services:
+        service.active = services[0].active
+        app = web.Application()
+        app.router.add_get("/{path:.*}", service.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        service.port = runner.addresses[0][1]
+        runners.append(runner)
+    yield services
+    for runner in runners:
+        await runner.cleanup()
+
+
+@pytest.fixture(name="service")
+async def fixture_service() -> AsyncIterator[FakeService]:
+    async for services in start_services(1):
+        yield services[0]
+
+
+@pytest.fixture(name="services")
+async def fixture_services() -> AsyncIterator[List[FakeService]]:
+    async for services in start_services(2):
+        yield services
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def routes(tmp_path: Path) -> List[str]:
+    return sorted(path.name for path in (tmp_path / "extensions").glob("*.conf"))
+
+
+async def test_routes_of_incomplete_detections_are_kept(helper: Any, tmp_path: Path) -> None:
+    helper.LISTENING_PORTS.sockets = {8001: 1, 8002: 2}
+    helper.KNOWN_SERVICES = {service_info(8001, "first"), service_info(8002, "second")}
+    await helper.update_nginx()
+    assert routes(tmp_path) == ["first.conf", "second.conf"]
+
+    # The metadata of both services could not be probed, only the one of the complete detection is gone
+    helper.KNOWN_SERVICES = {service_info(8001), service_info(8002)}
+    helper.INCOMPLETE_DETECTIONS = {8001}
+    await helper.update_nginx()
+    assert routes(tmp_path) == ["first.conf"]
+
+    # Routes are removed once their port is opened by a new owner
+    helper.LISTENING_PORTS.sockets = {8001: 3, 8002: 2}
+    await helper.update_nginx()
+    assert routes(tmp_path) == []
+
+
+async def test_routes_of_closed_ports_are_removed(helper: Any, tmp_path: Path) -> None:
+    helper.LISTENING_PORTS.sockets = {8001: 1}
+    helper.KNOWN_SERVICES = {service_info(8001, "first")}
+    await helper.update_nginx()
+    assert routes(tmp_path) == ["first.conf"]
+
+    helper.LISTENING_PORTS.sockets = {}
+    helper.KNOWN_SERVICES = {service_info(8001)}
+    helper.INCOMPLETE_DETECTIONS = {8001}
+    await helper.update_nginx()
+    assert routes(tmp_path) == []
+
+
+async def test_probe(probing: Any, service: FakeService) -> None:
+    response = await probing.probe(service.port, "/register_service", try_json=True)
+    assert response.status == 200 and response.as_json == FakeService.METADATA
+    assert not response.timeout and response.error is None
+
+    # Redirects are followed
+    response = await probing.probe(service.port, "/old_docs")
+    assert response.status == 200 and response.decoded_data == "<html>docs</html>"
+
+    response = await probing.probe(service.port, "/missing")
+    assert response.status == 404 and response.decoded_data is None
+
+    response = await probing.probe(service.port, "/invalid.json", try_json=True)
+    assert response.status == 200 and response.as_json is None and response.error
+
+    service.delays["/"] = 1.0
+    response = await probing.probe(service.port, "/")
+    assert response.status is None and response.timeout
+
+    # Ports without a server fail right away
+    response = await probing.probe(closed_port(), "/")
+    assert response.status is None and not response.timeout and response.error
+
+
+async def test_probe_documentation(probing: Any, service: FakeService) -> None:
+    info = service_info(service.port)
+    assert await probing.probe_documentation(info)
+    assert info.documentation_url == "/docs"
+    # Only the versions providing a swagger-ui are used
+    assert info.versions == ["/v2.0/ui/"]
+
+    # Documentation not found is complete as long as every candidate answered
+    service.failing.append("/docs")
+    info = service_info(service.port)
+    assert await probing.probe_documentation(info)
+    assert info.documentation_url == "" and not info.versions
+
+    # Versions are not complete when one of them got no response
+    service.failing.clear()
+    service.delays["/v1.0/ui/"] = 1.0
+    info = service_info(service.port)
+    assert not await probing.probe_documentation(info)
+    assert info.documentation_url == "/docs" and info.versions == ["/v2.0/ui/"]
+
+
+async def test_detect_service(probing: Any, service: FakeService) -> None:
+    info = await probing.detect_service(service.port)
+    assert info.valid and info.title == "Fake Service"
+    assert info.metadata is not None and info.metadata.sanitized_name == "fakeservice"
+    assert info.documentation_url == "/docs" and info.versions == ["/v2.0/ui/"]
+    assert service.port not in probing.INCOMPLETE_DETECTIONS
+    # Slots are created by the first detection, which only uses the connections allowed per port
+    assert probing.DETECTION_SLOTS is not None and not probing.DETECTION_SLOTS.locked()
+    assert service.max_active <= probing.PROBE_CONNECTIONS_PER_PORT
+
+
+@pytest.mark.parametrize("path", ["/register_service", "/openapi.json"])
+async def test_detect_service_with_probes_without_response(probing: Any, service: FakeService, path: str) -> None:
+    service.delays[path] = 1.0
+    info = await probing.detect_service(service.port)
+    # What was found is kept, but the detection is repeated by the next scan
+    assert info.valid and info.title == "Fake Service"
+    assert service.port in probing.INCOMPLETE_DETECTIONS
+
+    service.delays.clear()
+    probing.detect_service.cache_clear()
+    await probing.detect_service(service.port)
+    assert service.port not in probing.INCOMPLETE_DETECTIONS
+
+
+async def test_detect_service_with_failing_metadata(probing: Any, service: FakeService) -> None:
+    # Server errors are handled like probes without response, as the service may still be starting
+    service.failing.append("/register_service")
+    info = await probing.detect_service(service.port)
+    assert info.valid and info.metadata is None
+    assert service.port in probing.INCOMPLETE_DETECTIONS
+
+
+async def test_detect_service_not_http(probing: Any) -> None:
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"SSH-2.0-OpenSSH\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(answer, "127.0.0.1", 0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        info = await probing.detect_service(port)
+    # Services that do not talk HTTP are detected completely, they are not going to answer later
+    assert not info.valid
+    assert port not in probing.INCOMPLETE_DETECTIONS
+
+
+async def test_detect_service_deadline(probing: Any, service: FakeService, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(probing, "PROBE_TIMEOUT", 1.0)
+    monkeypatch.setattr(probing, "DETECTION_DEADLINE", 0.2)
+    # Each probe answers in time, but not all of them
+    for path in ["/", "/register_service", "/docs", "/openapi.json"]:
+        service.delays[path] = 0.15
+
+    start = time.monotonic()
+    info = await probing.detect_service(service.port)
+    assert time.monotonic() - start < 0.5
+    assert info.valid and info.title == "Fake Service"
+    assert service.port in probing.INCOMPLETE_DETECTIONS
+
+
+async def test_detection_slots(probing: Any, services: List[FakeService], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(probing, "DETECTION_SLOTS", asyncio.Semaphore(1))
+    monkeypatch.setattr(probing, "PROBE_TIMEOUT", 1.0)
+    monkeypatch.setattr(probing, "DETECTION_DEADLINE", 0.3)
+    for service in services:
+        service.delays["/"] = 0.2
+
+    # Both detections take longer than the deadline together, but it only runs while each one has its slot
+    start = time.monotonic()
+    infos = await asyncio.gather(*[probing.detect_service(service.port) for service in services])
+    assert time.monotonic() - start >= 0.4
+    assert all(info.valid for info in infos)
+    assert not probing.INCOMPLETE_DETECTIONS
+    # Requests are counted over both services, so only one detection was running at once
+    assert max(service.max_active for service in services) <= probing.PROBE_CONNECTIONS_PER_PORT
@@ -0,0 +1,124 @@
+import os
+import socket
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+import listeners
+from listeners import ListeningPortsWatcher, SocketOwner, socket_owners
+
+PROC_NET_TCP_HEADER = (
+    "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+)
+CONTAINER = "4f3c1b6e0d2a9f8e7c6b5a4d3e2f1a0b9c8d7e6f5a4b3c2d1e0f9a8b7c6d5e4f"
+
+
+def proc_net_tcp(*sockets: str) -> str:
+    """Content of a /proc/net/tcp{,6} file, from sockets given as 'address:port state inode'."""
+    lines = [PROC_NET_TCP_HEADER]
+    for index, entry in enumerate(sockets):
+        local, state, inode = entry.split()
+        remote = "0" * len(local.split(":")[0]) + ":0000"
+        lines.append(
+            f"{index:4}: {local} {remote} {state} 00000000:00000000 00:00000000 00000000  1000        0 {inode} 1"
+            " 0000000000000000 100 0 0 10 0\n"
+        )
+    return "".join(lines)
+
+
+@pytest.fixture(name="proc_net")
+def fixture_proc_net(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Dict[socket.AddressFamily, Path]:
+    paths = {socket.AF_INET: tmp_path / "tcp", socket.AF_INET6: tmp_path / "tcp6"}
+    for family, path in paths.items():
+        monkeypatch.setitem(listeners.PROC_NET_TCP, family, str(path))
+    return paths
+
+
+def test_proc_listeners(proc_net: Dict[socket.AddressFamily, Path]) -> None:
+    proc_net[socket.AF_INET].write_text(
+        proc_net_tcp(
+            # 0.0.0.0:80 and 127.0.0.1:8080 listening, the connection to 127.0.0.1:8080 is ignored
+            "00000000:0050 0A 1001",
+            "0100007F:1F90 0A 1002",
+            "0100007F:1F90 01 1003",
+        ),
+        encoding="utf-8",
+    )
+    proc_net[socket.AF_INET6].write_text(
+        # [::]:80 and [::1]:6040 listening
+        proc_net_tcp("00000000000000000000000000000000:0050 0A 1004", "00000000000000000000000001000000:1798 0A 1005"),
+        encoding="utf-8",
+    )
+    assert listeners._proc_listeners(socket.AF_INET) == [("0.0.0.0", 80, 1001), ("127.0.0.1", 8080, 1002)]
+    assert listeners._proc_listeners(socket.AF_INET6) == [("::", 80, 1004), ("::1", 6040, 1005)]
+
+
+def test_proc_listeners_without_procfs(proc_net: Dict[socket.AddressFamily, Path]) -> None:
+    # Kernels without IPv6 do not have /proc/net/tcp6
+    assert not proc_net[socket.AF_INET6].exists()
+    assert not listeners._proc_listeners(socket.AF_INET6)
+
+
+def test_refresh(proc_net: Dict[socket.AddressFamily, Path], monkeypatch: pytest.MonkeyPatch) -> None:
+    def unavailable(_family: socket.AddressFamily) -> List[listeners.Listener]:
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr(listeners, "_netlink_listeners", unavailable)
+    watcher = ListeningPortsWatcher(["0.0.0.0", "::"])
+
+    proc_net[socket.AF_INET].write_text(
+        # Ports listening only on other addresses are ignored
+        proc_net_tcp("00000000:0050 0A 1001", "00000000:1F90 0A 1002", "0100007F:1798 0A 1003"),
+        encoding="utf-8",
+    )
+    proc_net[socket.AF_INET6].write_text(
+        proc_net_tcp("00000000000000000000000000000000:0050 0A 1000"), encoding="utf-8"
+    )
+    assert watcher.refresh() == ({80, 8080}, set())
+    # Ports listening on multiple addresses are identified by their first socket
+    assert watcher.sockets == {80: 1000, 8080: 1002}
+    assert not watcher._use_netlink
+
+    # Nothing changed
+    assert watcher.refresh() == (set(), set())
+
+    # 8080 is listening on a new socket, 80 is closed and 6040 opened
+    proc_net[socket.AF_INET].write_text(
+        proc_net_tcp("00000000:1F90 0A 1012", "00000000:1798 0A 1013"), encoding="utf-8"
+    )
+    proc_net[socket.AF_INET6].write_text(proc_net_tcp(), encoding="utf-8")
+    assert watcher.refresh() == ({8080, 6040}, {80})
+    assert watcher.ports == {8080, 6040}
+
+
+def create_process(proc: Path, pid: int, sockets: List[int], cgroup: str, cmdline: bytes, start_ticks: int) -> None:
+    process = proc / str(pid)
+    (process / "fd").mkdir(parents=True)
+    (process / "fd" / "0").symlink_to("/dev/null")
+    for descriptor, inode in enumerate(sockets, start=3):
+        (process / "fd" / str(descriptor)).symlink_to(f"socket:[{inode}]")
+    (process / "cgroup").write_text(cgroup, encoding="utf-8")
+    (process / "cmdline").write_bytes(cmdline)
+    # The command name has spaces and parentheses, the start time is the 22nd field
+    fields = ["S", *["0"] * 18, str(start_ticks), *["0"] * 30]
+    (process / "stat").write_text(f"{pid} (my (weird) name) {' '.join(fields)}\n", encoding="utf-8")
+
+
+def test_socket_owners(tmp_path: Path) -> None:
+    (tmp_path / "stat").write_text("cpu  1 2 3 4\nbtime 1000\nprocesses 42\n", encoding="utf-8")
+    (tmp_path / "self").mkdir()
+    create_process(tmp_path, 10, [101, 102], f"0::/system.slice/docker-{CONTAINER}.scope\n", b"python3\0main.py\0", 0)
+    create_process(tmp_path, 20, [201], "0::/init.scope\n", b"nginx: master process\0", 250)
+    # Process that is gone or in another namespace
+    (tmp_path / "30").mkdir()
+
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    owners = socket_owners({101, 102, 201, 301}, tmp_path)
+    assert owners == {
+        101: SocketOwner(identity=f"container:{CONTAINER}", started_at=1000.0),
+        102: SocketOwner(identity=f"container:{CONTAINER}", started_at=1000.0),
+        201: SocketOwner(identity="command:nginx: master process", started_at=1000.0 + 250 / clock_ticks),
+        # Sockets that could not be found are their own owners
+        301: SocketOwner(identity="socket:301", started_at=1000.0),
+    }
@@ -0,0 +1,64 @@
+import asyncio
+import signal
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from nginx_routes import NginxRoutes
+
+# All test coroutines will be treated as marked.
+pytestmark = pytest.mark.asyncio
+
+
+def test_sync(tmp_path: Path) -> None:
+    routes = NginxRoutes(tmp_path / "extensions", tmp_path / "nginx.pid")
+    assert routes.sync({"first": 8001, "second": 8002}) == 2
+    assert sorted(path.name for path in (tmp_path / "extensions").iterdir()) == ["first.conf", "second.conf"]
+    assert (tmp_path / "extensions" / "first.conf").read_text(encoding="utf-8") == routes.route_config("first", 8001)
+    assert NginxRoutes.route_port(routes.route_config("first", 8001)) == 8001
+
+    # Nothing is written when the routes are the same
+    assert routes.sync({"first": 8001, "second": 8002}) == 0
+
+    # Routes that changed are replaced and the ones that are gone are removed
+    assert routes.sync({"first": 8003}) == 2
+    assert [path.name for path in (tmp_path / "extensions").iterdir()] == ["first.conf"]
+    assert NginxRoutes.route_port((tmp_path / "extensions" / "first.conf").read_text(encoding="utf-8")) == 8003
+
+
+def test_sync_keeps_routes_of_kept_ports(tmp_path: Path) -> None:
+    routes = NginxRoutes(tmp_path, tmp_path / "nginx.pid")
+    routes.sync({"first": 8001, "second": 8002})
+    assert routes.sync({}, kept_ports={8002}) == 1
+    assert [path.name for path in tmp_path.glob("*.conf")] == ["second.conf"]
+
+
+async def test_reloads_are_coalesced(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "nginx.pid").write_text("1234\n", encoding="utf-8")
+    kills: List[Tuple[int, int]] = []
+    monkeypatch.setattr("os.kill", lambda pid, sig: kills.append((pid, sig)))
+    routes = NginxRoutes(tmp_path, tmp_path / "nginx.pid", reload_delay=0.05, max_reload_delay=0.2)
+
+    # Changes in a burst result in a single reload, once they stop
+    for _ in range(3):
+        routes.schedule_reload()
+        await asyncio.sleep(0.01)
+    assert not kills
+    await asyncio.sleep(0.1)
+    assert kills == [(1234, signal.SIGHUP)]
+
+    # Changes that never stop are not delayed more than the maximum
+    kills.clear()
+    for _ in range(10):
+        routes.schedule_reload()
+        await asyncio.sleep(0.03)
+    assert len(kills) == 1
+
+
+async def test_reload_without_nginx(tmp_path: Path) -> None:
+    routes = NginxRoutes(tmp_path, tmp_path / "missing.pid", reload_delay=0.0)
+    routes.schedule_reload()
+    await asyncio.sleep(0.01)
+    # Failures are only logged
+    routes.reload()
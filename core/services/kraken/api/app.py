@@ -1,6 +1,11 @@
 from os import path
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute
+from commonwealth.utils.apis import (
+    FastJSONResponse,
+    GenericErrorHandlingRoute,
+    debug_router,
+)
+from commonwealth.utils.metrics import setup_metrics
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
@@ -19,6 +24,7 @@ from api.v2.routers import (
 application = FastAPI(
     title="Kraken API",
     description="Kraken is the BlueOS service responsible for installing and managing extensions.",
+    default_response_class=FastJSONResponse,
 )
 application.router.route_class = GenericErrorHandlingRoute
 
@@ -34,6 +40,8 @@ application.include_router(jobs_router_v2)
 application.include_router(manifest_router_v2)
 
 application = VersionedFastAPI(application, prefix_format="/v{major}.{minor}", enable_latest=True)
+application.include_router(debug_router)
+setup_metrics(application)
 
 
 @application.get("/", status_code=200)
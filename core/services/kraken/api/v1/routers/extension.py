@@ -22,7 +22,7 @@ extension_router_v1 = APIRouter(
 @extension_to_http_exception
 async def install_extension(body: ExtensionSource) -> StreamingResponse:
     extension = Extension(body)
-    return StreamingResponse(streamer(extension.install(atomic=True)))
+    return StreamingResponse(streamer(extension.install(atomic=True), cancel_on_disconnect=False))
 
 
 @extension_router_v1.post("/uninstall", status_code=status.HTTP_200_OK)
@@ -36,7 +36,7 @@ async def uninstall_extension(extension_identifier: str) -> Any:
 @extension_to_http_exception
 async def update_extension(extension_identifier: str, new_version: str) -> StreamingResponse:
     extension = cast(Extension, await Extension.from_manifest(extension_identifier, new_version))
-    return StreamingResponse(streamer(extension.update(True)))
+    return StreamingResponse(streamer(extension.update(True), cancel_on_disconnect=False))
 
 
 @extension_router_v1.post("/enable", status_code=status.HTTP_200_OK)
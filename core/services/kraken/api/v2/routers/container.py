@@ -1,8 +1,13 @@
 from functools import wraps
 from typing import Any, Callable, Optional, Tuple
 
-from commonwealth.utils.streaming import streamer, timeout_streamer
-from fastapi import APIRouter, HTTPException, status
+from commonwealth.utils.streaming import (
+    stream_framing,
+    stream_media_type,
+    streamer,
+    timeout_streamer,
+)
+from fastapi import APIRouter, Header, HTTPException, status
 from fastapi.responses import StreamingResponse
 from fastapi_versioning import versioned_api_route
 
@@ -51,17 +56,21 @@ async def fetch_container(container_name: str) -> ContainerModel:
 
 @container_router_v2.get("/{container_name}/log", status_code=status.HTTP_200_OK)
 @container_to_http_exception
-async def fetch_log_by_container_name(container_name: str, timeout: Optional[int] = None) -> StreamingResponse:
+async def fetch_log_by_container_name(
+    container_name: str, timeout: Optional[int] = None, accept: Optional[str] = Header(None)
+) -> StreamingResponse:
     """
     Fetch logs of a given container.
     If timeout is provided, the stream will be closed after no log line is received for the given timeout.
     """
     stream = ContainerManager.get_container_log_by_name(container_name)
+    framing = stream_framing(accept)
+    media_type = stream_media_type(framing, "text/plain")
 
     if timeout is not None:
-        return StreamingResponse(timeout_streamer(stream, timeout=timeout), media_type="text/plain")
+        return StreamingResponse(timeout_streamer(stream, timeout=timeout, framing=framing), media_type=media_type)
 
-    return StreamingResponse(streamer(stream, heartbeats=0.1), media_type="text/plain")
+    return StreamingResponse(streamer(stream, heartbeats=0.1, framing=framing), media_type=media_type)
 
 
 @container_router_v2.get("/stats", status_code=status.HTTP_200_OK)
@@ -1,9 +1,10 @@
 import asyncio
 from functools import wraps
-from typing import Any, Callable, List, Tuple, cast
+from typing import Any, Callable, List, Optional, Tuple, cast
 
-from commonwealth.utils.streaming import streamer
-from fastapi import APIRouter, HTTPException, status
+from commonwealth.utils.apis import ConditionalRoute
+from commonwealth.utils.streaming import stream_framing, stream_media_type, streamer
+from fastapi import APIRouter, Header, HTTPException, status
 from fastapi.responses import Response, StreamingResponse
 from fastapi_versioning import versioned_api_route
 
@@ -18,7 +19,7 @@ from extension.models import ExtensionSource
 extension_router_v2 = APIRouter(
     prefix="/extension",
     tags=["extension_v2"],
-    route_class=versioned_api_route(2, 0),
+    route_class=versioned_api_route(2, 0, route_class=ConditionalRoute),
     responses={status.HTTP_404_NOT_FOUND: {"description": "Not found"}},
 )
 
@@ -74,33 +75,49 @@ async def fetch_by_identifier_and_tag(identifier: str, tag: str) -> ExtensionSou
 
 @extension_router_v2.post("/", status_code=status.HTTP_201_CREATED)
 @extension_to_http_exception
-async def install(body: ExtensionSource) -> StreamingResponse:
+async def install(body: ExtensionSource, accept: Optional[str] = Header(None)) -> StreamingResponse:
     """
     Install an extension by a custom source instead of the valid manifests, be careful with this endpoint because it
     can install incompatible extensions. Make sure to check the extension source before installing it.
     """
     extension = Extension(body)
-    return StreamingResponse(streamer(extension.install(atomic=True)))
+    framing = stream_framing(accept)
+    return StreamingResponse(
+        streamer(extension.install(atomic=True), framing=framing, cancel_on_disconnect=False),
+        media_type=stream_media_type(framing),
+    )
 
 
 @extension_router_v2.post("/{identifier}/install", status_code=status.HTTP_201_CREATED)
 @extension_to_http_exception
-async def install_by_identifier(identifier: str, stable: bool = True) -> StreamingResponse:
+async def install_by_identifier(
+    identifier: str, stable: bool = True, accept: Optional[str] = Header(None)
+) -> StreamingResponse:
     """
     Install latest version of an extension by its identifier using one of the current manifests.
     """
     extension: Extension = await Extension.from_latest(identifier, stable)
-    return StreamingResponse(streamer(extension.install()))
+    framing = stream_framing(accept)
+    return StreamingResponse(
+        streamer(extension.install(), framing=framing, cancel_on_disconnect=False),
+        media_type=stream_media_type(framing),
+    )
 
 
 @extension_router_v2.post("/{identifier}/{tag}/install", status_code=status.HTTP_201_CREATED)
 @extension_to_http_exception
-async def install_by_identifier_and_tag(identifier: str, tag: str) -> StreamingResponse:
+async def install_by_identifier_and_tag(
+    identifier: str, tag: str, accept: Optional[str] = Header(None)
+) -> StreamingResponse:
     """
     Install a specific version of an extension by its identifier and tag using one of the current manifests.
     """
     extension = cast(Extension, await Extension.from_manifest(identifier, tag))
-    return StreamingResponse(streamer(extension.install()))
+    framing = stream_framing(accept)
+    return StreamingResponse(
+        streamer(extension.install(), framing=framing, cancel_on_disconnect=False),
+        media_type=stream_media_type(framing),
+    )
 
 
 @extension_router_v2.post("/{identifier}/{tag}/enable", status_code=status.HTTP_204_NO_CONTENT)
@@ -135,24 +152,36 @@ async def restart(identifier: str) -> None:
 
 @extension_router_v2.put("/{identifier}", status_code=status.HTTP_200_OK)
 @extension_to_http_exception
-async def update_to_latest(identifier: str, purge: bool = True, stable: bool = True) -> StreamingResponse:
+async def update_to_latest(
+    identifier: str, purge: bool = True, stable: bool = True, accept: Optional[str] = Header(None)
+) -> StreamingResponse:
     """
     Update a given extension by its identifier to latest (stable or not) version on the higher priority manifest and
     by default purge all other tags, if purge is set to false it will keep all other versions disabled only.
     """
     extension = await Extension.from_latest(identifier, stable)
-    return StreamingResponse(streamer(extension.update(purge)))
+    framing = stream_framing(accept)
+    return StreamingResponse(
+        streamer(extension.update(purge), framing=framing, cancel_on_disconnect=False),
+        media_type=stream_media_type(framing),
+    )
 
 
 @extension_router_v2.put("/{identifier}/{tag}", status_code=status.HTTP_200_OK)
 @extension_to_http_exception
-async def update_to_tag(identifier: str, tag: str, purge: bool = True) -> Response:
+async def update_to_tag(
+    identifier: str, tag: str, purge: bool = True, accept: Optional[str] = Header(None)
+) -> Response:
     """
     Update a given extension by its identifier and tag to latest version on the higher priority manifest and by default
     purge all other tags, if purge is set to false it will keep all other versions disabled only.
     """
     extension = cast(Extension, await Extension.from_manifest(identifier, tag))
-    return StreamingResponse(streamer(extension.update(purge)))
+    framing = stream_framing(accept)
+    return StreamingResponse(
+        streamer(extension.update(purge), framing=framing, cancel_on_disconnect=False),
+        media_type=stream_media_type(framing),
+    )
 
 
 @extension_router_v2.delete("/{identifier}", status_code=status.HTTP_202_ACCEPTED)
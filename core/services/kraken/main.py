@@ -3,6 +3,7 @@ import asyncio
 import logging
 
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.loop_monitor import start_loop_monitor
 from commonwealth.utils.sentry_config import init_sentry_async
 from loguru import logger
 from uvicorn import Config, Server
@@ -23,6 +24,7 @@ jobs = JobsManager()
 
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    start_loop_monitor()
 
     args = CommandLineArgs.from_args()
 
@@ -5,8 +5,8 @@ from typing import Any, Callable, List, Optional, Set, Tuple, cast
 
 import aiohttp
 import semver
-from aiocache import cached
 from commonwealth.settings.manager import Manager
+from commonwealth.utils.decorators import async_cache
 
 from config import DEFAULT_MANIFESTS, SERVICE_NAME
 from manifest.exceptions import (
@@ -34,7 +34,7 @@ class ManifestManager:
     """
 
     _instance: Optional["ManifestManager"] = None
-    _manager: Manager = Manager(SERVICE_NAME, SettingsV2)
+    _manager: Manager = Manager(SERVICE_NAME, SettingsV2, write_delay=1.0)
     _settings = _manager.settings
 
     def __init__(self) -> None:
@@ -84,7 +84,8 @@ class ManifestManager:
 
         return cls._instance
 
-    @cached(ttl=3600, namespace="manifest")
+    # Outdated manifests are still served for a day while being refreshed, so a slow backend does not block requests
+    @async_cache(ttl_seconds=3600, stale_seconds=86400)
     async def _fetch_manifest_data(self, url: str) -> List[RepositoryEntry]:
         try:
             async with aiohttp.ClientSession() as session:
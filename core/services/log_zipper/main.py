@@ -10,7 +10,11 @@ import pathlib
 import time
 from typing import List
 
-from commonwealth.utils.general import available_disk_space_mb, delete_everything
+from commonwealth.utils.general import (
+    OpenFileIndex,
+    available_disk_space_mb,
+    delete_everything,
+)
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from commonwealth.utils.sentry_config import init_sentry
 from loguru import logger
@@ -26,9 +30,10 @@ def zip_files(files: List[str], output_path: str) -> None:
         with open(file, "rb") as f_in, gzip.open(output_path, "wb") as f_out:
             f_out.writelines(f_in)
 
+    open_files = OpenFileIndex()
     for file in files:
         try:
-            delete_everything(pathlib.Path(file))
+            delete_everything(pathlib.Path(file), open_files)
             logger.debug(f"Deleted file: {file}")
         except OSError as e:
             logger.debug(f"Error deleting file: {file} - {e}")
@@ -75,9 +80,10 @@ def main() -> None:
             files = glob.glob(args.path.replace(".log", ".gz"), recursive=True)
             pathlib_files = [pathlib.Path(file) for file in files]
             gz_files = [file for file in pathlib_files if file.is_file() and file.suffix == f".{zip_extension}"]
+            open_files = OpenFileIndex()
             for file in gz_files:
                 logger.warning(f"Deleting {file}: {int(file.stat().st_size / 2**20)} MB")
-                delete_everything(pathlib.Path(file))
+                delete_everything(pathlib.Path(file), open_files)
 
         files = glob.glob(args.path, recursive=True)
         logger.info(f"Scanning {args.path} for files older than {str(datetime.timedelta(seconds=max_age_seconds))}...")
@@ -4,8 +4,13 @@ import asyncio
 import logging
 from typing import Any, List
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
+from commonwealth.utils.apis import (
+    FastJSONResponse,
+    GenericErrorHandlingRoute,
+    debug_router,
+)
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import FastAPI, status
 from fastapi.responses import HTMLResponse
@@ -30,7 +35,7 @@ init_logger(SERVICE_NAME)
 app = FastAPI(
     title="NMEA Injector API",
     description="NMEA Injector is a service responsible for injecting external NMEA data on the Mavlink stream.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
     debug=True,
 )
 app.router.route_class = GenericErrorHandlingRoute
@@ -68,6 +73,8 @@ def remove_sock(sock: NMEASocket) -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -97,6 +104,7 @@ async def main() -> None:
         asyncio.create_task(controller.add_sock(NMEASocket(kind=SocketKind.TCP, port=args.tcp, component_id=221)))
 
     await server.serve()
+    await controller.close()
 
 
 if __name__ == "__main__":
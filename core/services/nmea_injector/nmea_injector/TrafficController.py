@@ -55,9 +55,8 @@ class NMEASocket(BaseModel):
 class TcpNmeaProtocol(asyncio.Protocol):
     """Protocol class used to interface with Python's TCP Transport API."""
 
-    def __init__(self, component_id: int) -> None:
-        self.mavlink2rest = MavlinkMessenger()
-        self.mavlink2rest.set_component_id(component_id)
+    def __init__(self, mavlink2rest: MavlinkMessenger) -> None:
+        self.mavlink2rest = mavlink2rest
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         """Behavior when a new connection is stablished."""
@@ -69,14 +68,13 @@ class TcpNmeaProtocol(asyncio.Protocol):
         message = data.decode()
         logger.info(f"Message received for component {self.mavlink2rest.component_id}: {message}")
         mavlink_package = TrafficController.parse_mavlink_package(message)
-        asyncio.create_task(TrafficController.forward_message(mavlink_package, self.mavlink2rest))
-        logger.info("Successfully forwarded mavlink coordinates package.")
+        TrafficController.forward_message(mavlink_package, self.mavlink2rest)
+        logger.info("Queued mavlink coordinates package for forwarding.")
 
 
 class UdpNmeaProtocol(asyncio.DatagramProtocol):
-    def __init__(self, component_id: int) -> None:
-        self.mavlink2rest = MavlinkMessenger()
-        self.mavlink2rest.set_component_id(component_id)
+    def __init__(self, mavlink2rest: MavlinkMessenger) -> None:
+        self.mavlink2rest = mavlink2rest
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         """Behavior when a new connection is stablished."""
@@ -88,8 +86,8 @@ class UdpNmeaProtocol(asyncio.DatagramProtocol):
         message = data.decode()
         logger.info(f"Message received for component {self.mavlink2rest.component_id}: {message}")
         mavlink_package = TrafficController.parse_mavlink_package(message)
-        asyncio.create_task(TrafficController.forward_message(mavlink_package, self.mavlink2rest))
-        logger.info("Successfully forwarded mavlink coordinates package.")
+        TrafficController.forward_message(mavlink_package, self.mavlink2rest)
+        logger.info("Queued mavlink coordinates package for forwarding.")
 
 
 class TrafficController:
@@ -97,13 +95,23 @@ class TrafficController:
 
     def __init__(self) -> None:
         self._socks: Dict[NMEASocket, Union[asyncio.AbstractServer, asyncio.BaseTransport]] = {}
-        self._settings_manager = Manager("nmea-injector", SettingsV1)
+        # Messengers are shared by all sockets/connections of a component, so they reuse the same connection pool
+        self._messengers: Dict[int, MavlinkMessenger] = {}
+        self._settings_manager = Manager("nmea-injector", SettingsV1, write_delay=1.0)
 
     async def load_socks_from_settings(self) -> None:
         self._settings_manager.load()
         for nmea_settings_spec in self._settings_manager.settings.specs:
             await self.add_sock(NMEASocket.from_settings_spec(nmea_settings_spec))
 
+    def get_messenger(self, component_id: int) -> MavlinkMessenger:
+        """Get the Mavlink messenger responsible for a given component ID."""
+        if component_id not in self._messengers:
+            mavlink2rest = MavlinkMessenger()
+            mavlink2rest.set_component_id(component_id)
+            self._messengers[component_id] = mavlink2rest
+        return self._messengers[component_id]
+
     def get_socks(self) -> List[NMEASocket]:
         """Retrieve information about available server sockets."""
         return list(self._socks)
@@ -112,11 +120,12 @@ class TrafficController:
         """Open a new network server socket and asynchronously wait for connections to arrive."""
         loop = asyncio.get_running_loop()
         server_socket: Union[asyncio.AbstractServer, asyncio.BaseTransport]
+        mavlink2rest = self.get_messenger(sock.component_id)
         if sock.kind == SocketKind.TCP:
-            server_socket = await loop.create_server(lambda: TcpNmeaProtocol(sock.component_id), "0.0.0.0", sock.port)
+            server_socket = await loop.create_server(lambda: TcpNmeaProtocol(mavlink2rest), "0.0.0.0", sock.port)
         elif sock.kind == SocketKind.UDP:
             server_socket, _ = await loop.create_datagram_endpoint(
-                lambda: UdpNmeaProtocol(sock.component_id), local_addr=("0.0.0.0", sock.port)
+                lambda: UdpNmeaProtocol(mavlink2rest), local_addr=("0.0.0.0", sock.port)
             )
         else:
             raise UnsupportedSocketKind(f"Got {sock.kind}. Expected one of: {[kind.value for kind in SocketKind]}.")
@@ -137,6 +146,12 @@ class TrafficController:
         self._settings_manager.save()
         logger.debug(f"Removed sock. Socks now: {self.get_socks()}.")
 
+    async def close(self) -> None:
+        """Release the connection pools used to forward messages to Mavlink2Rest."""
+        for mavlink2rest in self._messengers.values():
+            await mavlink2rest.close()
+        self._messengers.clear()
+
     @staticmethod
     def parse_mavlink_package(nmea_msg: str) -> MavlinkGpsInput:
         """Transform NMEA message into proper Mavlink GPS_INPUT package."""
@@ -144,9 +159,10 @@ class TrafficController:
         return parse_mavlink_from_sentence(nmea_sentence)
 
     @staticmethod
-    async def forward_message(message: MavlinkGpsInput, mavlink2rest: MavlinkMessenger) -> None:
-        """Forward Mavlink message package to Mavlink2Rest, on the specified component ID."""
-        await mavlink2rest.send_mavlink_message(message.dict())
+    def forward_message(message: MavlinkGpsInput, mavlink2rest: MavlinkMessenger) -> None:
+        """Queue Mavlink message package to be forwarded to Mavlink2Rest, on the specified component ID.
+        Only the most recent package is forwarded if Mavlink2Rest is not keeping up."""
+        mavlink2rest.queue_mavlink_message(message.dict())
 
     def __del__(self) -> None:
         for server_socket in self._socks.values():
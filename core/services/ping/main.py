@@ -4,8 +4,13 @@ import asyncio
 import logging
 from typing import Any, List
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
+from commonwealth.utils.apis import (
+    FastJSONResponse,
+    GenericErrorHandlingRoute,
+    debug_router,
+)
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import FastAPI, status
 from fastapi.responses import HTMLResponse
@@ -13,6 +18,7 @@ from fastapi_versioning import VersionedFastAPI, version
 from loguru import logger
 from uvicorn import Config, Server
 
+from ping1d_mavlink import Ping1DMavlinkDriver
 from pingmanager import PingManager
 from pingprober import PingProber
 from portwatcher import PortWatcher
@@ -26,7 +32,7 @@ init_logger(SERVICE_NAME)
 app = FastAPI(
     title="Ping Manager API",
     description="Ping Manager is responsible for managing Ping devices connected to BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
     debug=True,
 )
 app.router.route_class = GenericErrorHandlingRoute
@@ -53,6 +59,8 @@ def set_sensor(sensor_settings: dict[str, Any]) -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 
 
 @app.get("/")
@@ -89,6 +97,7 @@ async def main() -> None:
 
     asyncio.create_task(sensor_manager())
     await server.serve()
+    await Ping1DMavlinkDriver.mavlink2rest.close()
 
 
 if __name__ == "__main__":
@@ -58,10 +58,10 @@ class Ping1DMavlinkDriver:
             "signal_quality": max(1, confidence),  # 0 means undefined per MAVLink spec
         }
 
-    ## Send distance_sensor message to autopilot
-    async def send_distance_data(self, distance: int, deviceid: int, confidence: int) -> None:
+    ## Queue distance_sensor message to autopilot, only the most recent one is sent if Mavlink2Rest is lagging
+    def send_distance_data(self, distance: int, deviceid: int, confidence: int) -> None:
         logger.info(f"sending {distance} ({confidence})")
-        await self.mavlink2rest.send_mavlink_message(
+        self.mavlink2rest.queue_mavlink_message(
             self.distance_message(
                 int((time.time() - self.time_since_boot) * 1000), int(distance / 10), deviceid, confidence
             )
@@ -152,6 +152,6 @@ class Ping1DMavlinkDriver:
                     logger.warning(error)
             if new_data_available:
                 try:
-                    await self.send_distance_data(distance, deviceid, confidence)
+                    self.send_distance_data(distance, deviceid, confidence)
                 except Exception as error:
                     logger.warning(error)
@@ -7,11 +7,14 @@ from pathlib import Path
 from typing import Any, List, Optional
 
 from commonwealth.utils.apis import (
+    FastJSONResponse,
     GenericErrorHandlingRoute,
-    PrettyJSONResponse,
     StackedHTTPException,
+    debug_router,
 )
 from commonwealth.utils.logs import InterceptHandler, init_logger
+from commonwealth.utils.loop_monitor import start_loop_monitor
+from commonwealth.utils.metrics import setup_metrics
 from commonwealth.utils.sentry_config import init_sentry_async
 from fastapi import FastAPI, HTTPException, status
 from fastapi.staticfiles import StaticFiles
@@ -46,7 +49,7 @@ wifi_manager: Optional[AbstractWifiManager] = None
 app = FastAPI(
     title="WiFi Manager API",
     description="WiFi Manager is responsible for managing WiFi connections on BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=FastJSONResponse,
 )
 app.router.route_class = GenericErrorHandlingRoute
 
@@ -165,11 +168,14 @@ def get_hotspot_credentials() -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+app.include_router(debug_router)
+setup_metrics(app)
 app.mount("/", StaticFiles(directory=str(FRONTEND_FOLDER), html=True))
 
 
 async def main() -> None:
     await init_sentry_async(SERVICE_NAME)
+    start_loop_monitor()
 
     parser = argparse.ArgumentParser(description="Abstraction CLI for WifiManager configuration.")
     candidates = [wpa_manager, network_manager]
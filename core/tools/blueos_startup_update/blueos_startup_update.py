@@ -9,7 +9,7 @@ from typing import List, Tuple
 import configparser
 
 import appdirs
-from commonwealth.utils.commands import run_command, save_file, locate_file, load_file
+from commonwealth.utils.commands import run_command, run_commands, save_file, locate_file, load_file
 from commonwealth.utils.general import HostOs, CpuType, get_cpu_type, get_host_os
 from commonwealth.utils.logs import InterceptHandler, init_logger
 from loguru import logger
@@ -468,8 +468,7 @@ def ensure_user_data_structure_is_in_place() -> bool:
         "sudo mkdir -p /usr/blueos/userdata/images/logo",
         "sudo mkdir -p /usr/blueos/userdata/styles",
     ]
-    for command in commands:
-        run_command(command, False)
+    run_commands(commands, False)
 
     # This patch doesn't require restart to take effect
     return False